@@ -0,0 +1,200 @@
+"""
+批量视频比较基准：生成一批合成视频(其中一部分是重新编码的重复视频)，
+对比 tool.compare_videos_batch 两两解码比较(pairwise)与先提取指纹再比较(fingerprint)的耗时，并检查结果一致
+
+--fingerprints N 时不生成视频，直接构造N个视频的指纹，只对比指纹提取之后的比较环节：
+逐对调用 compare_fingerprints(loop)、分块计算相关系数矩阵的 find_similar_pairs(matrix)，
+以及由 --workers 个进程分块计算的 ComparePool.find_similar_pairs(pool)
+
+--new K 时把最后K个视频当作一次请求新下载的视频，其余视频预先记录到指纹索引，对比原来比较整个目录(full，结果只保留涉及新视频的视频对)
+与只解码新视频、只比较涉及新视频的视频对(indexed)的耗时
+
+所有数据写到临时目录，不会修改项目中的 douyin.db 和下载目录
+"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'util'))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import config  # noqa: E402
+
+MODES = ('pairwise', 'fingerprint')
+
+
+def make_videos(video_dir, count, width, height, frames, duplicate_ratio, seed=0):
+    """
+    生成 count 个视频，按 duplicate_ratio 的比例复制已有视频的内容并改变关键帧间隔重新编码
+    """
+    rng = np.random.RandomState(seed)
+    os.makedirs(video_dir, exist_ok=True)
+    contents = []
+    for num in range(count):
+        if contents and rng.random_sample() < duplicate_ratio:
+            content_seed, length = contents[rng.randint(len(contents))]
+        else:
+            content_seed, length = rng.randint(1 << 30), frames + rng.randint(-frames // 4, frames // 4 + 1)
+            contents.append((content_seed, length))
+        content = np.random.RandomState(content_seed)
+        colors = content.randint(0, 255, (8, 3))
+        writer = cv2.VideoWriter(os.path.join(video_dir, f'{num:05d}.mp4'), cv2.VideoWriter_fourcc(*'mp4v'), 30,
+                                 (width, height), [cv2.VIDEOWRITER_PROP_KEY_INTERVAL, int(rng.randint(12, 250))])
+        for index in range(length):
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            frame[:] = colors[(index // 30) % len(colors)]
+            size = height // 3
+            left = (index * 5) % (width - size)
+            cv2.rectangle(frame, (left, size), (left + size, 2 * size), colors[(index // 45 + 3) % 8].tolist(), -1)
+            writer.write(frame)
+        writer.release()
+
+
+def make_fingerprints(count, frames, duplicate_ratio, seed=0):
+    """
+    构造 count 个视频的指纹，帧数在 frames 上下浮动，部分视频的直方图与已有视频接近
+    """
+    from tools.video_fingerprint import VideoFingerprint, needed_indices
+
+    rng = np.random.RandomState(seed)
+    frame_counts = [int(frames + rng.randint(-frames // 4, frames // 4 + 1)) for _ in range(count)]
+    distinct_counts = set(frame_counts)
+    bases = []
+    fingerprints = []
+    for frame_count in frame_counts:
+        if bases and rng.random_sample() < duplicate_ratio:
+            base = bases[rng.randint(len(bases))]
+        else:
+            base = rng.random_sample(512).astype(np.float32)
+            bases.append(base)
+        hists = {}
+        for index in needed_indices(frame_count, distinct_counts):
+            hist = base + rng.random_sample(512).astype(np.float32) * 0.3
+            hist -= hist.min()
+            hists[index] = hist / hist.max()
+        fingerprints.append(VideoFingerprint(f'{len(fingerprints)}.mp4', frame_count, hists))
+    return fingerprints
+
+
+def bench_fingerprints(args):
+    import itertools
+    from tools.video_fingerprint import compare_fingerprints, find_similar_pairs
+    from tools.compare_pool import ComparePool
+
+    print(f"构造 {args.fingerprints} 个视频的指纹...")
+    fingerprints = make_fingerprints(args.fingerprints, args.frames, args.duplicate_ratio)
+    pairs_count = args.fingerprints * (args.fingerprints - 1) // 2
+    results = {}
+    start = time.perf_counter()
+    pairs = [(i, j) for i, j in itertools.combinations(range(len(fingerprints)), 2)
+             if compare_fingerprints(fingerprints[i], fingerprints[j])[0]]
+    results['loop'] = (time.perf_counter() - start, pairs)
+    start = time.perf_counter()
+    pairs = [(i, j) for i, j, _ in find_similar_pairs(fingerprints)]
+    results['matrix'] = (time.perf_counter() - start, pairs)
+    start = time.perf_counter()
+    with ComparePool(args.workers) as pool:
+        pairs = [(i, j) for i, j, _ in pool.find_similar_pairs(fingerprints)]
+    results['pool'] = (time.perf_counter() - start, pairs)
+    return pairs_count, results
+
+
+def bench_incremental(args, work_dir, video_dir):
+    from tool import compare_videos_batch
+    from tools.fingerprint_index import FingerprintIndex
+
+    video_files = sorted(os.listdir(video_dir))
+    targets = [os.path.join(video_dir, file) for file in video_files[-args.new:]]
+    new_ids = set(file.replace('.mp4', '') for file in video_files[-args.new:])
+    index = FingerprintIndex(config.DB_PATH)
+    # 先把新视频移走，用其余视频建立索引
+    hold_dir = os.path.join(work_dir, 'hold')
+    os.makedirs(hold_dir)
+    for target in targets:
+        shutil.move(target, hold_dir)
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        compare_videos_batch(video_dir, workers=args.workers, index=index)
+    for target in targets:
+        shutil.move(os.path.join(hold_dir, os.path.basename(target)), video_dir)
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        start = time.perf_counter()
+        pairs = compare_videos_batch(video_dir, workers=args.workers)
+        results['full'] = (time.perf_counter() - start,
+                           sorted(pair for pair in pairs if pair[0] in new_ids or pair[1] in new_ids))
+        start = time.perf_counter()
+        pairs = compare_videos_batch(video_dir, workers=args.workers, targets=targets, index=index)
+        results['indexed'] = (time.perf_counter() - start, sorted(pairs))
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='对比批量视频比较的两种方式')
+    parser.add_argument('--videos', type=int, default=20, help='视频数，默认20')
+    parser.add_argument('--frames', type=int, default=300, help='每个视频的平均帧数，默认300')
+    parser.add_argument('--width', type=int, default=640, help='视频宽度，默认640')
+    parser.add_argument('--height', type=int, default=360, help='视频高度，默认360')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.3, help='重复视频的比例，默认0.3')
+    parser.add_argument('--modes', default=','.join(MODES), help=f"逗号分隔的比较方式 {'/'.join(MODES)}，默认全部")
+    parser.add_argument('--fingerprints', type=int, default=0, help='只对比指纹的比较环节，构造的视频数')
+    parser.add_argument('--new', type=int, default=0, help='新视频数，对比整个目录比较与按指纹索引增量比较')
+    parser.add_argument('--workers', type=int, default=config.COMPARE_WORKERS,
+                        help=f'fingerprint 方式的进程数，0表示CPU核数，默认{config.COMPARE_WORKERS}')
+    args = parser.parse_args()
+
+    if args.fingerprints:
+        pairs_count, results = bench_fingerprints(args)
+        print_results(args.fingerprints, pairs_count, results)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix='douyin-bench-compare-')
+    config.DB_PATH = os.path.join(work_dir, 'bench.db')
+    video_dir = os.path.join(work_dir, 'videos')
+    try:
+        print(f"生成 {args.videos} 个 {args.width}x{args.height} 的合成视频...")
+        make_videos(video_dir, args.videos, args.width, args.height, args.frames, args.duplicate_ratio)
+        from tool import compare_videos_batch
+
+        results = {}
+        if args.new:
+            results = bench_incremental(args, work_dir, video_dir)
+            pairs_count = args.new * (args.videos - args.new) + args.new * (args.new - 1) // 2
+            print_results(args.videos, pairs_count, results)
+            return
+        for mode in args.modes.split(','):
+            start = time.perf_counter()
+            # 比较过程大量print，压测时丢弃
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                pairs = compare_videos_batch(video_dir, mode=mode, workers=args.workers)
+            results[mode] = (time.perf_counter() - start, sorted(pairs))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(args.videos, args.videos * (args.videos - 1) // 2, results)
+
+
+def print_results(videos, pairs_count, results):
+    print(f"视频数 {videos}, 共 {pairs_count} 对")
+    print(f"{'方式':<14}{'耗时(s)':>10}{'对/秒':>12}{'相似对数':>10}")
+    for mode, (elapsed, pairs) in results.items():
+        print(f"{mode:<14}{elapsed:>10.2f}{pairs_count / elapsed:>12.1f}{len(pairs):>10}")
+    if len(results) > 1:
+        same = len(set(tuple(pairs) for _, pairs in results.values())) == 1
+        print(f"结果一致: {'是' if same else '否'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+抓取吞吐量基准：启动本地模拟服务(stub_server.py)，用不同的抓取方式抓取同一批用户，
+输出每种方式的 pages/s、MB/s 以及单个用户抓取耗时的 p50/p99
+
+所有数据写到临时目录，不会修改项目中的 douyin.db 和下载目录
+"""
+import contextlib
+import io
+import logging
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'util'))
+sys.path.insert(0, BENCH_DIR)
+
+import config  # noqa: E402
+
+from stub_server import StubConfig, StubServer  # noqa: E402
+
+MODES = ('list', 'sync', 'async')
+
+
+def configure(work_dir, api_host, rate, signer, cookies=1, cooldown=1.0):
+    """
+    必须在导入抓取模块之前调用，抓取模块在导入时读取配置
+    """
+    config.SAVE_FOLDER = os.path.join(work_dir, 'data')
+    config.DB_PATH = os.path.join(work_dir, 'bench.db')
+    config.CONTENT_STORE_FOLDER = os.path.join(config.SAVE_FOLDER, '.blobs')
+    config.DOUYIN_API_HOST = api_host
+    if rate:
+        config.RATE_LIMIT_INITIAL = rate
+        config.RATE_LIMIT_MAX = rate
+        config.RATE_LIMIT_BURST = rate
+    if signer:
+        config.XBOGUS_BACKEND = signer
+    # 用假的Cookie组成会话池，模拟服务按Cookie限速
+    config.LOGIN_COOKIE = 'bench_cookie_0'
+    config.LOGIN_COOKIES = [f'bench_cookie_{num}' for num in range(1, cookies)]
+    config.SESSION_COOLDOWN = cooldown
+    # 重试和熔断的等待按比例缩短，压测不必等太久
+    config.PAGE_RETRY_BACKOFF = 0.05
+    config.PAGE_RETRY_MAX_BACKOFF = 0.5
+    config.CIRCUIT_BREAKER_COOLDOWN = cooldown
+    os.makedirs(config.SAVE_FOLDER, exist_ok=True)
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    # nearest-rank
+    values = sorted(values)
+    index = max(0, math.ceil(percent / 100 * len(values)) - 1)
+    return values[index]
+
+
+def crawl_list(sec_uid):
+    from douyin_util import DouYinUtil
+    DouYinUtil(sec_uid=sec_uid).get_all_videos()
+
+
+def crawl_sync(sec_uid):
+    # 与 tool.download_user_videos 相同的流程：边翻页边逐个下载
+    from douyin_util import DouYinUtil
+    dy_util = DouYinUtil(sec_uid=sec_uid)
+    for video_meta in dy_util.iter_videos():
+        video_info = dy_util.get_video_detail_info(video_meta.aweme_id)
+        if video_info['is_video'] is True:
+            dy_util.download_video(video_info['link'], f"{video_meta.aweme_id}.mp4", aweme_id=video_meta.aweme_id)
+        else:
+            dy_util.download_images(video_info['link'], video_meta.aweme_id)
+
+
+def run_threads(func, sec_uid_list, workers):
+    """
+    每个用户一个任务，最多 workers 个线程同时执行，与Flask接口每个用户一个线程的方式一致
+    :return: 每个用户的耗时列表
+    """
+    durations = []
+    lock = threading.Lock()
+    pending = list(sec_uid_list)
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                sec_uid = pending.pop(0)
+            start = time.perf_counter()
+            try:
+                func(sec_uid)
+            except Exception as e:
+                print(f"用户 {sec_uid} 抓取出错: {e}", file=sys.stderr)
+            with lock:
+                durations.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker) for _ in range(min(workers, len(sec_uid_list)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return durations
+
+
+def run_async(sec_uid_list):
+    import asyncio
+    from async_douyin_util import AsyncCrawlEngine
+
+    async def main():
+        durations = []
+        async with AsyncCrawlEngine() as engine:
+            async def crawl_one(sec_uid):
+                start = time.perf_counter()
+                try:
+                    await engine.download_user_videos(sec_uid)
+                except Exception as e:
+                    print(f"用户 {sec_uid} 抓取出错: {e}", file=sys.stderr)
+                durations.append(time.perf_counter() - start)
+
+            await asyncio.gather(*[crawl_one(sec_uid) for sec_uid in sec_uid_list])
+        return durations
+
+    return asyncio.run(main())
+
+
+def run_mode(mode, server, sec_uid_list, workers):
+    server.reset_stats()
+    start = time.perf_counter()
+    # 抓取代码大量print，压测时丢弃
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'list':
+            durations = run_threads(crawl_list, sec_uid_list, workers)
+        elif mode == 'sync':
+            durations = run_threads(crawl_sync, sec_uid_list, workers)
+        else:
+            durations = run_async(sec_uid_list)
+    elapsed = time.perf_counter() - start
+    stats = dict(server.stats)
+    return {
+        'mode': mode,
+        'elapsed': elapsed,
+        'pages': stats['pages'],
+        'downloads': stats['downloads'],
+        'pages_per_sec': stats['pages'] / elapsed,
+        'mb_per_sec': stats['download_bytes'] / 1024 / 1024 / elapsed,
+        'p50': percentile(durations, 50),
+        'p99': percentile(durations, 99),
+        'errors': stats['errors'],
+        'throttled': stats['throttled'] + stats['empty_pages'] + stats['blank_pages'],
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='在本地模拟服务上对比不同抓取方式的吞吐量')
+    parser.add_argument('--modes', default=','.join(MODES), help=f"逗号分隔的抓取方式 {'/'.join(MODES)}，默认全部")
+    parser.add_argument('--users', type=int, default=8, help='用户数，默认8')
+    parser.add_argument('--workers', type=int, default=8, help='同步方式的线程数，默认8')
+    parser.add_argument('--pages', type=int, default=3, help='每个用户的分页数，默认3')
+    parser.add_argument('--page-size', type=int, default=35, help='每页视频数，默认35')
+    parser.add_argument('--latency', type=float, default=0.05, help='模拟服务每个请求的延迟(秒)，默认0.05')
+    parser.add_argument('--bandwidth', type=float, default=0, help='每个下载连接的带宽(MB/s)，默认不限')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟服务返回503的概率，默认0')
+    parser.add_argument('--empty-rate', type=float, default=0.0, help='模拟服务返回空列表的概率，默认0')
+    parser.add_argument('--blank-rate', type=float, default=0.0, help='翻页返回空响应体的概率，默认0')
+    parser.add_argument('--video-size', type=float, default=1, help='合成视频大小(MB)，默认1')
+    parser.add_argument('--image-ratio', type=float, default=0.0, help='图文作品比例，默认0')
+    parser.add_argument('--rate', type=float, default=1000, help='覆盖接口限速(次/秒)，0表示使用配置中的值，默认1000')
+    parser.add_argument('--cookies', type=int, default=1, help='会话池中的Cookie数，默认1')
+    parser.add_argument('--identity-rate', type=float, default=0, help='模拟服务对每个Cookie的限速(次/秒)，默认不限')
+    parser.add_argument('--cooldown', type=float, default=1, help='Cookie被限流后的冷却秒数，默认1')
+    parser.add_argument('--signer', default=None, help='X-Bogus签名方式 node/execjs/native，默认使用配置中的值')
+    args = parser.parse_args()
+
+    stub_config = StubConfig(pages=args.pages, page_size=args.page_size, latency=args.latency,
+                             jitter=args.latency / 4, bandwidth=int(args.bandwidth * 1024 * 1024),
+                             error_rate=args.error_rate, empty_rate=args.empty_rate, blank_rate=args.blank_rate,
+                             video_size=int(args.video_size * 1024 * 1024), image_ratio=args.image_ratio,
+                             identity_rate=args.identity_rate)
+    server = StubServer(stub_config)
+    api_host = server.start()
+
+    logging.disable(logging.INFO)
+    results = []
+    try:
+        for mode in args.modes.split(','):
+            # 每种方式使用独立的目录，避免已下载的文件被跳过
+            work_dir = tempfile.mkdtemp(prefix=f'douyin-bench-{mode}-')
+            try:
+                configure(work_dir, api_host, args.rate, args.signer, args.cookies, args.cooldown)
+                for name in [name for name in sys.modules if name.split('.')[0] in (
+                        'douyin_util', 'async_douyin_util', 'tools')]:
+                    del sys.modules[name]
+                sec_uid_list = [f'bench_{mode}_{num}' for num in range(args.users)]
+                results.append(run_mode(mode, server, sec_uid_list, args.workers))
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        server.stop()
+
+    print(f"用户数 {args.users}, 每用户 {args.pages} 页 x {args.page_size} 条, 视频 {args.video_size}MB, "
+          f"延迟 {args.latency * 1000:.0f}ms, Cookie数 {args.cookies}")
+    print(f"{'方式':<8}{'耗时(s)':>10}{'页数':>8}{'下载数':>8}{'pages/s':>10}{'MB/s':>10}"
+          f"{'p50(s)':>10}{'p99(s)':>10}{'错误':>6}{'限流':>6}")
+    for result in results:
+        print(f"{result['mode']:<8}{result['elapsed']:>10.2f}{result['pages']:>8}{result['downloads']:>8}"
+              f"{result['pages_per_sec']:>10.1f}{result['mb_per_sec']:>10.1f}"
+              f"{result['p50']:>10.2f}{result['p99']:>10.2f}{result['errors']:>6}{result['throttled']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+单连接下载与分段并行下载的对比：在限制了单连接带宽的本地模拟服务上，
+分别下载一批大文件和小文件，输出耗时和 MB/s，并校验两种方式下载的内容一致
+"""
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'util'))
+sys.path.insert(0, BENCH_DIR)
+
+from stub_server import StubConfig, StubServer  # noqa: E402
+from tools.downloader import download_file  # noqa: E402
+from tools.http_client import create_session  # noqa: E402
+
+
+def file_digest(file_name):
+    hasher = hashlib.blake2b(digest_size=32)
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def run(name, base_url, files, threshold, concurrency):
+    session = create_session()
+    work_dir = tempfile.mkdtemp(prefix=f'douyin-bench-download-{name}-')
+    try:
+        def fetch(item):
+            file_name, size = item
+            url = f'{base_url}/video/{file_name}?size={size}'
+            return download_file(session, url, os.path.join(work_dir, file_name), parallel_threshold=threshold)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            ok = list(executor.map(fetch, files))
+        elapsed = time.perf_counter() - start
+        digests = {file_name: file_digest(os.path.join(work_dir, file_name))
+                   for (file_name, _), success in zip(files, ok) if success}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        session.close()
+    total_mb = sum(size for _, size in files) / 1024 / 1024
+    return elapsed, total_mb / elapsed, sum(ok), digests
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='对比单连接下载与分段并行下载')
+    parser.add_argument('--large', type=int, default=2, help='大文件数量，默认2')
+    parser.add_argument('--large-size', type=float, default=32, help='大文件大小(MB)，默认32')
+    parser.add_argument('--small', type=int, default=20, help='小文件数量，默认20')
+    parser.add_argument('--small-size', type=float, default=0.5, help='小文件大小(MB)，默认0.5')
+    parser.add_argument('--bandwidth', type=float, default=8, help='模拟服务单连接带宽(MB/s)，默认8')
+    parser.add_argument('--latency', type=float, default=0.05, help='模拟服务每个请求的延迟(秒)，默认0.05')
+    parser.add_argument('--threshold', type=float, default=16, help='分段下载的文件大小阈值(MB)，默认16')
+    parser.add_argument('--concurrency', type=int, default=4, help='同时下载的文件数，默认4')
+    args = parser.parse_args()
+
+    server = StubServer(StubConfig(latency=args.latency, jitter=0, bandwidth=int(args.bandwidth * 1024 * 1024)))
+    base_url = server.start()
+    logging.disable(logging.INFO)
+
+    groups = {
+        'large': [(f'large_{num}.mp4', int(args.large_size * 1024 * 1024)) for num in range(args.large)],
+        'small': [(f'small_{num}.mp4', int(args.small_size * 1024 * 1024)) for num in range(args.small)],
+    }
+    threshold = int(args.threshold * 1024 * 1024)
+    print(f"单连接带宽 {args.bandwidth}MB/s, 延迟 {args.latency * 1000:.0f}ms, 同时下载 {args.concurrency} 个文件")
+    print(f"{'文件':<8}{'方式':<10}{'耗时(s)':>10}{'MB/s':>10}{'成功':>8}")
+    try:
+        for group, files in groups.items():
+            if not files:
+                continue
+            digests = {}
+            for name, mode_threshold in (('single', 0), ('chunked', threshold)):
+                elapsed, speed, success, digests[name] = run(name, base_url, files, mode_threshold, args.concurrency)
+                print(f"{group:<8}{name:<10}{elapsed:>10.2f}{speed:>10.1f}{success:>5}/{len(files)}")
+            if digests['single'] != digests['chunked']:
+                print(f"警告: {group} 两种方式下载的内容不一致")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
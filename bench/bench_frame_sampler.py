@@ -0,0 +1,125 @@
+"""
+视频比较的抽帧基准：对比原来每个采样点 set(CAP_PROP_POS_FRAMES) 再 read() 的方式，
+与 tools/frame_sampler.py 中顺序 grab()、只在采样点 retrieve() 的方式，输出耗时并检查两种方式的相似度结果
+
+不指定视频时生成两段内容相同、关键帧间隔不同的合成视频，关键帧间隔与线上视频接近
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'util'))
+
+from tools.frame_sampler import SAMPLE_SIZE, sample_step, iter_sampled_frames  # noqa: E402
+
+
+def iter_seeked_frames(cap, frame_count, step, size=SAMPLE_SIZE):
+    # 原来 tool.compare_video 中的采样方式
+    for index in range(0, frame_count, step):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = cap.read()
+        if not ret:
+            yield index, None
+            continue
+        yield index, cv2.resize(frame, size)
+
+
+def make_video(file_name, width, height, frames, fps, gop):
+    """
+    生成带渐变背景和移动色块的合成视频
+    """
+    writer = cv2.VideoWriter(file_name, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height),
+                             [cv2.VIDEOWRITER_PROP_KEY_INTERVAL, gop])
+    if not writer.isOpened():
+        raise RuntimeError(f'无法写入视频 {file_name}')
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    for num in range(frames):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[..., 0] = (x + num * 2) % 256
+        frame[..., 1] = (y + num) % 256
+        frame[..., 2] = ((x + y) / 2 + num * 3) % 256
+        size = height // 6
+        left = (num * 13) % (width - size)
+        top = (num * 7) % (height - size)
+        cv2.rectangle(frame, (left, top), (left + size, top + size), (num % 256, 255 - num % 256, 128), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def similarity(video_path1, video_path2, sampler):
+    """
+    与 tool.compare_video 相同的直方图比较，返回 (相似度百分比, 比较的帧数, 耗时)
+    """
+    start = time.perf_counter()
+    cap1 = cv2.VideoCapture(video_path1)
+    cap2 = cv2.VideoCapture(video_path2)
+    sample_count = min(int(cap1.get(cv2.CAP_PROP_FRAME_COUNT)), int(cap2.get(cv2.CAP_PROP_FRAME_COUNT)))
+    step = sample_step(sample_count)
+    similar = compared = 0
+    for (_, frame1), (_, frame2) in zip(sampler(cap1, sample_count, step), sampler(cap2, sample_count, step)):
+        if frame1 is None or frame2 is None:
+            continue
+        hist1 = cv2.calcHist([frame1], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
+        hist2 = cv2.calcHist([frame2], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
+        cv2.normalize(hist1, hist1, 0, 1.0, cv2.NORM_MINMAX)
+        cv2.normalize(hist2, hist2, 0, 1.0, cv2.NORM_MINMAX)
+        # 展平后计算，结果与三维直方图相同，且不受OpenCV版本影响
+        if cv2.compareHist(hist1.reshape(-1), hist2.reshape(-1), cv2.HISTCMP_CORREL) > 0.8:
+            similar += 1
+        compared += 1
+    cap1.release()
+    cap2.release()
+    elapsed = time.perf_counter() - start
+    return (similar / compared * 100 if compared else 0.0), compared, elapsed
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='对比视频比较时两种抽帧方式的耗时')
+    parser.add_argument('videos', nargs='*', help='要比较的两个视频，不指定时生成合成视频')
+    parser.add_argument('--width', type=int, default=1920, help='合成视频宽度，默认1920')
+    parser.add_argument('--height', type=int, default=1080, help='合成视频高度，默认1080')
+    parser.add_argument('--frames', type=int, default=900, help='合成视频帧数，默认900(30秒)')
+    parser.add_argument('--fps', type=int, default=30, help='合成视频帧率，默认30')
+    parser.add_argument('--gop', type=int, default=250, help='合成视频关键帧间隔，默认250')
+    parser.add_argument('--rounds', type=int, default=3, help='重复次数，取最快的一次，默认3')
+    args = parser.parse_args()
+
+    work_dir = None
+    if args.videos:
+        if len(args.videos) != 2:
+            parser.error('需要指定两个视频')
+        video_path1, video_path2 = args.videos
+    else:
+        work_dir = tempfile.mkdtemp(prefix='douyin-bench-frames-')
+        video_path1 = os.path.join(work_dir, 'a.mp4')
+        video_path2 = os.path.join(work_dir, 'b.mp4')
+        print(f"生成合成视频 {args.width}x{args.height}, {args.frames}帧, 关键帧间隔{args.gop}...")
+        make_video(video_path1, args.width, args.height, args.frames, args.fps, args.gop)
+        make_video(video_path2, args.width, args.height, args.frames, args.fps, max(1, args.gop // 2))
+
+    try:
+        results = {}
+        for name, sampler in (('seek', iter_seeked_frames), ('sequential', iter_sampled_frames)):
+            runs = [similarity(video_path1, video_path2, sampler) for _ in range(args.rounds)]
+            results[name] = min(runs, key=lambda item: item[2])
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'方式':<12}{'耗时(s)':>10}{'比较帧数':>10}{'相似度(%)':>12}")
+    for name, (percentage, compared, elapsed) in results.items():
+        print(f"{name:<12}{elapsed:>10.2f}{compared:>10}{percentage:>12.2f}")
+    print(f"加速比: {results['seek'][2] / results['sequential'][2]:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+aweme/post 分页数据解析的微基准：
+对比原来的 json.loads(response.text) 与 decode_page 在各个解析库下的耗时
+"""
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'util'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tools.page_decoder import available_decoders, decode_page  # noqa: E402
+from fake_data import make_page  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_pages(count):
+    """
+    优先使用 fixtures 目录下保存的真实接口返回，没有时生成模拟数据
+    """
+    pages = []
+    for file_name in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.json'))):
+        with open(file_name, 'rb') as f:
+            pages.append(f.read())
+    if pages:
+        print(f"使用 {len(pages)} 个真实分页数据")
+        return pages
+    print(f"未找到 {FIXTURE_DIR}/*.json, 使用 {count} 页模拟数据")
+    return [json.dumps(make_page(seed=i, start_id=7300000000000000000 - i * 100)).encode('utf-8')
+            for i in range(count)]
+
+
+def legacy_decode(content):
+    # 改动前的做法：requests先解码成str，再完整解析
+    return json.loads(content.decode('utf-8'))
+
+
+def measure(func, pages, rounds):
+    func(pages[0])
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for content in pages:
+            func(content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # 单独统计保留结果时的内存峰值，模拟翻页时整页数据驻留的情况
+    tracemalloc.start()
+    results = [func(content) for content in pages]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return best, peak
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='对比分页数据的解析耗时和内存')
+    parser.add_argument('--pages', type=int, default=20, help='模拟数据的页数，默认20')
+    parser.add_argument('--rounds', type=int, default=5, help='重复次数，取最快一次，默认5')
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    total_mb = sum(len(content) for content in pages) / 1024 / 1024
+    print(f"共 {len(pages)} 页, {total_mb:.2f} MB")
+
+    cases = [('json.loads(text) 原方式', legacy_decode)]
+    for decoder in available_decoders():
+        cases.append((f'decode_page[{decoder}]', lambda content, d=decoder: decode_page(content, decoder=d)))
+        cases.append((f'decode_page[{decoder}] keep_raw',
+                      lambda content, d=decoder: decode_page(content, keep_raw=True, decoder=d)))
+
+    baseline = None
+    print(f"{'方式':<36}{'每页(ms)':>10}{'MB/s':>10}{'峰值内存(MB)':>14}{'加速':>8}")
+    for name, func in cases:
+        best, peak = measure(func, pages, args.rounds)
+        baseline = best if baseline is None else baseline
+        print(f"{name:<36}{best / len(pages) * 1000:>10.2f}{total_mb / best:>10.1f}"
+              f"{peak / 1024 / 1024:>14.2f}{baseline / best:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
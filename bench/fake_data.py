@@ -0,0 +1,102 @@
+import json
+import random
+import time
+
+__all__ = ['make_aweme', 'make_page']
+
+_CDN = 'https://v26-web.douyinvod.com'
+_IMAGE_CDN = 'https://p3-pc-sign.douyinpic.com'
+
+
+def _url_list(prefix, key, count=3):
+    return [f'{prefix}/{key}/{i}/?a=6383&br=1024&bt=1024&cd=0%7C0%7C0%7C0&ch=26&cr=3&cs=0&dr=0&ds=4'
+            f'&ft=GNvhqaaZ88pPpM9Oc-rqT&mime_type=video_mp4&qs=0&rc=ZGk1NjQ6ZTVoNGhmaGU3aUBpam' for i in range(count)]
+
+
+def make_aweme(aweme_id: int, create_time: int, is_image: bool = False, is_top: int = 0):
+    """
+    生成与 aweme/post 接口结构一致的单条数据，字段数量和体积与真实返回接近
+    """
+    key = f'v0300fg10000{aweme_id:x}'
+    aweme = {
+        'aweme_id': str(aweme_id),
+        'desc': f'测试视频 {aweme_id} #话题{aweme_id % 7} #日常',
+        'create_time': create_time,
+        'is_top': is_top,
+        'preview_title': f'测试视频 {aweme_id}',
+        'author': {
+            'uid': '1234567890',
+            'nickname': '测试用户',
+            'sec_uid': 'MS4wLjABAAAA_bench_sec_uid',
+            'avatar_thumb': {'uri': 'aweme-avatar/bench', 'url_list': _url_list(_IMAGE_CDN, 'avatar')},
+            'follow_status': 0,
+            'custom_verify': '',
+            'enterprise_verify_reason': '',
+        },
+        'music': {
+            'id': aweme_id + 1,
+            'title': f'@测试用户创作的原声 {aweme_id}',
+            'author': '测试用户',
+            'play_url': {'uri': key, 'url_list': _url_list(_CDN, 'music', 2)},
+            'cover_hd': {'uri': key, 'url_list': _url_list(_IMAGE_CDN, 'music_cover')},
+            'duration': 15,
+        },
+        'statistics': {
+            'aweme_id': str(aweme_id),
+            'admire_count': aweme_id % 97,
+            'comment_count': aweme_id % 1013,
+            'digg_count': aweme_id % 100003,
+            'collect_count': aweme_id % 311,
+            'play_count': 0,
+            'share_count': aweme_id % 53,
+        },
+        'text_extra': [{'start': 10, 'end': 14, 'type': 1, 'hashtag_name': f'话题{aweme_id % 7}',
+                        'hashtag_id': str(aweme_id % 7)}],
+        'video_tag': [{'tag_id': 2000 + i, 'tag_name': '生活', 'level': i} for i in range(3)],
+        'risk_infos': {'vote': False, 'warn': False, 'risk_sink': False, 'type': 0, 'content': ''},
+        'status': {'is_delete': False, 'allow_share': True, 'is_prohibited': False, 'in_reviewing': False},
+        'share_info': {'share_url': f'https://www.iesdouyin.com/share/video/{aweme_id}/', 'share_link_desc': ''},
+        'images': None,
+    }
+    if is_image:
+        aweme['images'] = [{'uri': f'tos-cn-i-{key}-{i}', 'width': 1080, 'height': 1440,
+                            'url_list': _url_list(_IMAGE_CDN, f'{key}-{i}')} for i in range(4)]
+        aweme['video'] = {'play_addr': {'uri': key, 'url_list': []}, 'cover': {'url_list': []}}
+    else:
+        aweme['video'] = {
+            'play_addr': {'uri': key, 'url_list': _url_list(_CDN, key), 'width': 1080, 'height': 1920,
+                          'data_size': 3145728, 'file_hash': f'{aweme_id:032x}'},
+            'cover': {'uri': key, 'url_list': _url_list(_IMAGE_CDN, f'{key}-cover')},
+            'dynamic_cover': {'uri': key, 'url_list': _url_list(_IMAGE_CDN, f'{key}-dynamic')},
+            'origin_cover': {'uri': key, 'url_list': _url_list(_IMAGE_CDN, f'{key}-origin')},
+            'bit_rate': [{'gear_name': f'normal_{q}', 'quality_type': q, 'bit_rate': 1000000 + q,
+                          'play_addr': {'uri': key, 'url_list': _url_list(_CDN, f'{key}-{q}')}}
+                         for q in (540, 720, 1080)],
+            'duration': 15000,
+            'ratio': '1080p',
+        }
+    return aweme
+
+
+def make_page(count: int = 35, start_id: int = 7300000000000000000, start_time: int = None,
+              interval: int = 3600, image_ratio: float = 0.2, seed: int = 0):
+    """
+    生成一页 aweme/post 接口数据，发布时间从 start_time 开始按 interval 递减
+    :return: dict
+    """
+    rand = random.Random(seed)
+    start_time = int(time.time()) if start_time is None else start_time
+    aweme_list = [make_aweme(start_id - i, start_time - i * interval, rand.random() < image_ratio)
+                  for i in range(count)]
+    return {
+        'status_code': 0,
+        'min_cursor': 0,
+        'max_cursor': (start_time - count * interval) * 1000,
+        'has_more': 1,
+        'aweme_list': aweme_list,
+        'log_pb': {'impr_id': '20240101000000000000000000000000'},
+    }
+
+
+if __name__ == '__main__':
+    print(len(json.dumps(make_page()).encode('utf-8')))
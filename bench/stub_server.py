@@ -0,0 +1,328 @@
+"""
+本地模拟的抖音服务，用于在不访问线上的情况下压测抓取和下载：
+- /aweme/v1/web/aweme/post/ 按 max_cursor 返回分页数据(has_more/max_cursor 与线上一致)
+- /video/{name}.mp4、/image/{name}.jpeg 返回合成文件，支持HEAD和Range请求，视频可用 ?size= 指定大小
+- /stats 返回分页数、下载数和发送的字节数
+- 可以按Cookie限速，超过速率的翻页请求返回空列表，与线上被限流时一致
+
+分页数据优先使用 bench/fixtures/*.json 中录制的真实返回，没有时用 fake_data 生成，
+视频和图片地址会被改写为指向本服务
+"""
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from aiohttp import web
+
+from fake_data import make_page
+
+__all__ = ['StubConfig', 'StubServer']
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+_RANGE_PREFIX = 'bytes='
+
+
+class StubConfig(object):
+    """
+    模拟服务的参数
+    """
+
+    def __init__(self, pages=5, page_size=35, latency=0.05, jitter=0.02, bandwidth=0, error_rate=0.0,
+                 empty_rate=0.0, blank_rate=0.0, video_size=2 * 1024 * 1024, image_size=200 * 1024, image_ratio=0.0,
+                 identity_rate=0.0, fixture_dir=FIXTURE_DIR, seed=0):
+        """
+        :param pages: 每个用户的分页数(使用录制数据时以录制的页数为准)
+        :param page_size: 每页视频数
+        :param latency: 每个请求的基础延迟(秒)
+        :param jitter: 延迟的随机波动(秒)
+        :param bandwidth: 每个下载连接的带宽(字节/秒)，0表示不限
+        :param error_rate: 返回503的概率
+        :param empty_rate: 还有下一页却返回空列表的概率，模拟线上被限流
+        :param blank_rate: 翻页请求返回200但响应体为空的概率，模拟线上被风控
+        :param video_size: 合成视频的字节数
+        :param image_size: 合成图片的字节数
+        :param image_ratio: 图文作品的比例
+        :param identity_rate: 每个Cookie每秒允许的翻页请求数，超过时返回空列表，0表示不限
+        :param fixture_dir: 录制分页数据的目录
+        :param seed: 随机种子
+        """
+        self.pages = pages
+        self.page_size = page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.empty_rate = empty_rate
+        self.blank_rate = blank_rate
+        self.video_size = video_size
+        self.image_size = image_size
+        self.image_ratio = image_ratio
+        self.identity_rate = identity_rate
+        self.fixture_dir = fixture_dir
+        self.seed = seed
+
+
+def _load_fixtures(fixture_dir):
+    pages = []
+    for file_name in sorted(glob.glob(os.path.join(fixture_dir or '', '*.json'))):
+        with open(file_name, 'rb') as f:
+            pages.append(json.loads(f.read()))
+    return pages
+
+
+class StubServer(object):
+    """
+    在后台线程中运行的模拟服务，也可以通过命令行单独启动
+    """
+
+    def __init__(self, config: StubConfig = None, host='127.0.0.1', port=0):
+        self.config = config or StubConfig()
+        self.host = host
+        self.port = port
+        self.random = random.Random(self.config.seed)
+        self.fixtures = _load_fixtures(self.config.fixture_dir)
+        self.user_pages = {}  # sec_uid -> [(page_bytes)]
+        self.user_cursors = {}  # sec_uid -> {max_cursor: 页码}
+        self.identity_buckets = {}  # Cookie -> (剩余令牌, 更新时间)
+        self.stats = {'pages': 0, 'page_bytes': 0, 'downloads': 0, 'download_bytes': 0, 'errors': 0, 'empty_pages': 0,
+                      'blank_pages': 0, 'throttled': 0}
+        self._runner = None
+        self._loop = None
+        self._thread = None
+        self._started = threading.Event()
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}'
+
+    def _rewrite_urls(self, page):
+        for aweme in page.get('aweme_list') or []:
+            aweme_id = aweme['aweme_id']
+            if aweme.get('images'):
+                for num, image in enumerate(aweme['images']):
+                    image['url_list'] = [f'{self.base_url}/image/{aweme_id}_{num}.jpeg']
+            else:
+                video = aweme.setdefault('video', {})
+                video.setdefault('play_addr', {})['url_list'] = [f'{self.base_url}/video/{aweme_id}.mp4']
+                video.setdefault('cover', {})['url_list'] = [f'{self.base_url}/image/{aweme_id}_cover.jpeg']
+        return page
+
+    def _build_pages(self, sec_uid):
+        config = self.config
+        user_seed = int(hashlib.md5(sec_uid.encode('utf-8')).hexdigest()[:8], 16)
+        if self.fixtures:
+            pages = [json.loads(json.dumps(page)) for page in self.fixtures]
+            # 录制数据中的视频id加上用户后缀，避免不同用户的视频重名
+            for page in pages:
+                for aweme in page.get('aweme_list') or []:
+                    aweme['aweme_id'] = f"{aweme['aweme_id']}{user_seed % 1000:03d}"
+        else:
+            start_id = 7300000000000000000 + user_seed * 10000
+            start_time = 1700000000
+            pages = []
+            for num in range(config.pages):
+                page = make_page(count=config.page_size, start_id=start_id - num * config.page_size,
+                                 start_time=start_time - num * config.page_size * 3600,
+                                 image_ratio=config.image_ratio, seed=user_seed + num)
+                pages.append(page)
+        for num, page in enumerate(pages):
+            page['has_more'] = 1 if num < len(pages) - 1 else 0
+        cursors = {0: 0}
+        for num, page in enumerate(pages[:-1]):
+            cursors[int(page['max_cursor'])] = num + 1
+        encoded = [json.dumps(self._rewrite_urls(page), ensure_ascii=False).encode('utf-8') for page in pages]
+        self.user_pages[sec_uid] = encoded
+        self.user_cursors[sec_uid] = cursors
+        return encoded, cursors
+
+    async def _delay(self):
+        delay = self.config.latency + self.random.uniform(-self.config.jitter, self.config.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _should_fail(self):
+        if self.config.error_rate and self.random.random() < self.config.error_rate:
+            self.stats['errors'] += 1
+            return True
+        return False
+
+    def _is_throttled(self, cookie):
+        rate = self.config.identity_rate
+        if not rate:
+            return False
+        # 每个Cookie一个令牌桶，最多积累1秒的请求
+        now = time.monotonic()
+        tokens, updated_at = self.identity_buckets.get(cookie, (rate, now))
+        tokens = min(rate, tokens + (now - updated_at) * rate)
+        throttled = tokens < 1
+        self.identity_buckets[cookie] = (tokens if throttled else tokens - 1, now)
+        if throttled:
+            self.stats['throttled'] += 1
+        return throttled
+
+    async def handle_post(self, request):
+        await self._delay()
+        if self._should_fail():
+            return web.Response(status=503)
+        sec_uid = request.query.get('sec_user_id', '')
+        cursor = int(request.query.get('max_cursor', 0))
+        if sec_uid in self.user_pages:
+            pages, cursors = self.user_pages[sec_uid], self.user_cursors[sec_uid]
+        else:
+            pages, cursors = self._build_pages(sec_uid)
+        num = cursors.get(cursor)
+        if num is None:
+            return web.json_response({'status_code': 0, 'has_more': 0, 'max_cursor': cursor, 'aweme_list': []})
+        if self.config.blank_rate and self.random.random() < self.config.blank_rate:
+            self.stats['blank_pages'] += 1
+            return web.Response(body=b'', content_type='application/json')
+        if self._is_throttled(request.headers.get('Cookie', '')):
+            return web.json_response({'status_code': 0, 'has_more': 1, 'max_cursor': cursor, 'aweme_list': []})
+        if num < len(pages) - 1 and self.config.empty_rate and self.random.random() < self.config.empty_rate:
+            self.stats['empty_pages'] += 1
+            return web.json_response({'status_code': 0, 'has_more': 1, 'max_cursor': cursor, 'aweme_list': []})
+        self.stats['pages'] += 1
+        self.stats['page_bytes'] += len(pages[num])
+        return web.Response(body=pages[num], content_type='application/json')
+
+    def _file_content(self, name, size):
+        # 同名文件内容固定，不同文件内容不同
+        seed = hashlib.md5(name.encode('utf-8')).digest()
+        body = seed * (size // len(seed) + 1)
+        return body[:size]
+
+    async def _send_file(self, request, name, size, content_type):
+        await self._delay()
+        if self._should_fail():
+            return web.Response(status=503)
+        headers = {'Accept-Ranges': 'bytes', 'Content-Type': content_type}
+        if request.method == 'HEAD':
+            headers['Content-Length'] = str(size)
+            return web.Response(status=200, headers=headers)
+
+        start, end, status = 0, size - 1, 200
+        range_header = request.headers.get('Range', '')
+        if range_header.startswith(_RANGE_PREFIX):
+            first, _, last = range_header[len(_RANGE_PREFIX):].partition('-')
+            start = int(first) if first else 0
+            end = min(int(last), size - 1) if last else size - 1
+            if start >= size:
+                return web.Response(status=416, headers={'Content-Range': f'bytes */{size}'})
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        headers['Content-Length'] = str(end - start + 1)
+
+        response = web.StreamResponse(status=status, headers=headers)
+        await response.prepare(request)
+        body = self._file_content(name, size)[start:end + 1]
+        chunk_size = 64 * 1024
+        try:
+            for offset in range(0, len(body), chunk_size):
+                chunk = body[offset:offset + chunk_size]
+                await response.write(chunk)
+                self.stats['download_bytes'] += len(chunk)
+                if self.config.bandwidth:
+                    await asyncio.sleep(len(chunk) / self.config.bandwidth)
+            await response.write_eof()
+        except ConnectionResetError:
+            # 客户端只读了响应头就断开(如分段下载先探测文件大小)
+            return response
+        self.stats['downloads'] += 1
+        return response
+
+    async def handle_video(self, request):
+        # ?size= 可以指定单个文件的大小，用于对比大小文件的下载方式
+        size = int(request.query.get('size', self.config.video_size))
+        return await self._send_file(request, request.match_info['name'], size, 'video/mp4')
+
+    async def handle_image(self, request):
+        return await self._send_file(request, request.match_info['name'], self.config.image_size, 'image/jpeg')
+
+    async def handle_stats(self, request):
+        return web.json_response(self.stats)
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get('/aweme/v1/web/aweme/post/', self.handle_post)
+        app.router.add_get('/video/{name}', self.handle_video)
+        app.router.add_get('/image/{name}', self.handle_image)
+        app.router.add_get('/stats', self.handle_stats)
+        return app
+
+    async def _start(self):
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if not self.port:
+            self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self):
+        """
+        在后台线程启动服务
+        :return: 服务地址
+        """
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start())
+            self._started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='douyin-stub', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self.base_url
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+    def reset_stats(self):
+        for key in self.stats:
+            self.stats[key] = 0
+        self.identity_buckets.clear()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='启动本地模拟的抖音服务')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址，默认127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口，默认8765')
+    parser.add_argument('--pages', type=int, default=5, help='每个用户的分页数，默认5')
+    parser.add_argument('--page-size', type=int, default=35, help='每页视频数，默认35')
+    parser.add_argument('--latency', type=float, default=0.05, help='每个请求的延迟(秒)，默认0.05')
+    parser.add_argument('--bandwidth', type=float, default=0, help='每个下载连接的带宽(MB/s)，默认不限')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回503的概率，默认0')
+    parser.add_argument('--empty-rate', type=float, default=0.0, help='返回空列表的概率，默认0')
+    parser.add_argument('--blank-rate', type=float, default=0.0, help='翻页返回空响应体的概率，默认0')
+    parser.add_argument('--video-size', type=float, default=2, help='合成视频大小(MB)，默认2')
+    parser.add_argument('--identity-rate', type=float, default=0, help='每个Cookie每秒的翻页请求上限，默认不限')
+    args = parser.parse_args()
+
+    config = StubConfig(pages=args.pages, page_size=args.page_size, latency=args.latency,
+                        bandwidth=int(args.bandwidth * 1024 * 1024), error_rate=args.error_rate,
+                        empty_rate=args.empty_rate, blank_rate=args.blank_rate,
+                        video_size=int(args.video_size * 1024 * 1024), identity_rate=args.identity_rate)
+    server = StubServer(config, args.host, args.port)
+    print(f"模拟服务已启动: {server.start()}，设置 DOUYIN_API_HOST 指向该地址即可")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
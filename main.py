@@ -4,6 +4,9 @@ import uuid
 import os
 from datetime import datetime
 from tool import download_user_videos
+from tools.util import to_timestamp
+from tools.download_scheduler import get_download_scheduler
+from tools.compare_pool import CompareProgress
 from flask_sqlalchemy import SQLAlchemy
 from flask_restx import Api, Resource, fields, Namespace
 from flask_cors import CORS
@@ -112,16 +115,33 @@ class Video(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
-# 创建数据库表
-with app.app_context():
-    db.create_all()
+# 创建数据库表；比较用的子进程(forkserver/spawn)会以 __mp_main__ 的名字重新导入本模块，这时不建表
+if __name__ != '__mp_main__':
+    with app.app_context():
+        db.create_all()
 
 # 存储线程信息的字典
 threads_info = {}
+# 对比任务的进度计数，单独存放，threads_info中只保存可以序列化的信息
+compare_progress = {}
+
+def parse_time_window(data):
+    """
+    解析请求中的发布时间范围，格式错误时抛出ValueError
+    :return: (开始时间戳, 结束时间戳)，未指定的一端为None
+    """
+    start_time = to_timestamp(data.get('start_date'))
+    end_time = to_timestamp(data.get('end_date'), end_of_day=True)
+    if start_time is not None and end_time is not None and start_time > end_time:
+        raise ValueError('start_date不能晚于end_date')
+    return start_time, end_time
 
 # 定义Swagger API模型
 sec_id_list_model = api.model('SecIdList', {
-    'sec_id_list': fields.List(fields.String, required=True, description='抖音用户sec_id列表')
+    'sec_id_list': fields.List(fields.String, required=True, description='抖音用户sec_id列表'),
+    'incremental': fields.Boolean(description='是否增量抓取，只下载上次抓取之后的新视频', default=False),
+    'start_date': fields.String(description='只下载该日期之后发布的视频，格式YYYY-MM-DD或YYYY-MM-DD HH:MM:SS'),
+    'end_date': fields.String(description='只下载该日期之前发布的视频(包含当天)，格式同start_date')
 })
 
 download_response_model = api.model('DownloadResponse', {
@@ -134,7 +154,10 @@ thread_status_model = api.model('ThreadStatus', {
     'status': fields.String(description='任务状态(准备中/运行中/已完成/出错)'),
     'created_at': fields.String(description='任务创建时间'),
     'videos_downloaded': fields.Integer(description='已下载视频数量'),
-    'error': fields.String(description='错误信息(如果有的话)')
+    'error': fields.String(description='错误信息(如果有的话)'),
+    'active_downloads': fields.Integer(description='该任务正在进行的下载数'),
+    'queue_depth': fields.Integer(description='该任务排队等待下载名额的文件数'),
+    'global_queue_depth': fields.Integer(description='所有任务排队等待下载名额的文件数')
 })
 
 video_info_model = api.model('VideoInfo', {
@@ -161,7 +184,9 @@ user_videos_model = api.model('UserVideos', {
 video_compare_request_model = api.model('VideoCompareRequest', {
     'sec_id_list': fields.List(fields.String, required=True, description='抖音用户sec_id列表'),
     'similarity_threshold': fields.Float(description='相似度阈值百分比，默认为95%', default=95.0),
-    'output_csv': fields.String(description='输出CSV文件路径，不指定则使用默认路径')
+    'output_csv': fields.String(description='输出CSV文件路径，不指定则使用默认路径'),
+    'start_date': fields.String(description='只比较该日期之后发布的视频，格式YYYY-MM-DD或YYYY-MM-DD HH:MM:SS'),
+    'end_date': fields.String(description='只比较该日期之前发布的视频(包含当天)，格式同start_date')
 })
 
 video_compare_response_model = api.model('VideoCompareResponse', {
@@ -208,6 +233,11 @@ class DownloadVideos(Resource):
             if not isinstance(sec_id_list, list):
                 return {'error': 'sec_id_list必须是列表'}, 400
             
+            incremental = bool(data.get('incremental', False))
+            try:
+                start_time, end_time = parse_time_window(data)
+            except (TypeError, ValueError) as e:
+                return {'error': f'日期格式错误: {e}'}, 400
             thread_ids = []
             
             # 为每个sec_id创建一个下载线程
@@ -226,7 +256,8 @@ class DownloadVideos(Resource):
                 db.session.commit()
                 
                 # 创建线程
-                thread = threading.Thread(target=download_task, args=(thread_id, sec_id, user.id, db_task.id))
+                thread = threading.Thread(target=download_task, args=(thread_id, sec_id, user.id, db_task.id, incremental,
+                                                                       start_time, end_time))
                 thread.daemon = True
                 
                 # 初始化线程信息
@@ -278,6 +309,7 @@ class ThreadStatus(Resource):
         
         thread_info = threads_info[thread_id].copy()
         thread_info.pop('thread', None)  # 移除线程对象，无法序列化
+        thread_info.update(get_download_scheduler().task_stats(thread_id))
         
         # 添加数据库中的视频计数
         task = DownloadTask.query.filter_by(thread_id=thread_id).first()
@@ -299,9 +331,11 @@ class AllThreads(Resource):
         result = {}
         
         # 从内存中获取活跃线程
+        scheduler = get_download_scheduler()
         for thread_id, info in threads_info.items():
             thread_info = info.copy()
             thread_info.pop('thread', None)  # 移除线程对象，无法序列化
+            thread_info.update(scheduler.task_stats(thread_id))
             result[thread_id] = thread_info
         
         # 从数据库获取所有任务状态
@@ -362,6 +396,10 @@ class CompareVideos(Resource):
             # 获取可选参数
             similarity_threshold = data.get('similarity_threshold', 95.0)
             output_csv = data.get('output_csv', None)
+            try:
+                start_time, end_time = parse_time_window(data)
+            except (TypeError, ValueError) as e:
+                return {'error': f'日期格式错误: {e}'}, 400
             
             # 如果未指定输出CSV文件，则使用默认路径
             if not output_csv:
@@ -379,11 +417,12 @@ class CompareVideos(Resource):
             # 创建线程执行对比任务
             thread = threading.Thread(
                 target=compare_task,
-                args=(task_id, sec_id_list, similarity_threshold, output_csv)
+                args=(task_id, sec_id_list, similarity_threshold, output_csv, start_time, end_time)
             )
             thread.daemon = True
             
             # 初始化线程信息
+            compare_progress[task_id] = CompareProgress()
             threads_info[task_id] = {
                 "type": "compare",
                 "sec_id_list": sec_id_list,
@@ -392,6 +431,7 @@ class CompareVideos(Resource):
                 "thread": thread,
                 "download_count": 0,
                 "similar_pairs_count": 0,
+                "failed_users": {},
                 "output_csv": output_csv,
                 "error": None
             }
@@ -426,10 +466,38 @@ class CompareTaskStatus(Resource):
         
         thread_info = threads_info[task_id].copy()
         thread_info.pop('thread', None)  # 移除线程对象，无法序列化
+        thread_info.update(get_download_scheduler().task_stats(task_id))
+        # 任务结束后进度计数已移除，threads_info中保留了最后的进度
+        progress = compare_progress.get(task_id)
+        if progress is not None:
+            thread_info['progress'] = progress.stats()
         
         return thread_info
 
-def download_task(thread_id, sec_id, user_id, task_id):
+    @ns_compare.response(200, '已请求取消任务')
+    @ns_compare.response(404, '未找到指定的任务ID')
+    def delete(self, task_id):
+        """
+        取消视频对比任务
+        
+        停止下载和比较，正在处理的视频和比较块完成后任务结束，状态变为已取消
+        """
+        if task_id not in threads_info or threads_info[task_id].get('type') != 'compare':
+            return {'error': '未找到指定的视频对比任务'}, 404
+        
+        thread_info = threads_info[task_id]
+        progress = compare_progress.get(task_id)
+        if progress is not None and thread_info['status'] in ('准备中', '运行中'):
+            progress.cancel()
+            thread_info['status'] = '取消中'
+        
+        return {
+            "message": "已请求取消视频对比任务",
+            "task_id": task_id,
+            "status": thread_info['status']
+        }
+
+def download_task(thread_id, sec_id, user_id, task_id, incremental=False, start_time=None, end_time=None):
     # 在线程内创建应用上下文
     with app.app_context():
         try:
@@ -444,7 +512,8 @@ def download_task(thread_id, sec_id, user_id, task_id):
                 db.session.commit()
             
             # 调用下载函数并获取视频信息
-            videos_info = download_user_videos(sec_id, task_id, user_id)
+            videos_info = download_user_videos(sec_id, task_id, user_id, incremental=incremental,
+                                               start_time=start_time, end_time=end_time, task_key=thread_id)
             
             # 更新视频下载计数
             if videos_info and isinstance(videos_info, list):
@@ -471,7 +540,7 @@ def download_task(thread_id, sec_id, user_id, task_id):
                     task.error = str(e)
                     db.session.commit()
 
-def compare_task(task_id, sec_id_list, similarity_threshold, output_csv):
+def compare_task(task_id, sec_id_list, similarity_threshold, output_csv, start_time=None, end_time=None):
     """
     视频对比任务处理函数，在新线程中执行
     
@@ -480,6 +549,8 @@ def compare_task(task_id, sec_id_list, similarity_threshold, output_csv):
         sec_id_list (list): 抖音用户sec_id列表
         similarity_threshold (float): 相似度阈值
         output_csv (str): 输出CSV文件路径
+        start_time (int): 发布时间范围的开始时间戳，None表示不限
+        end_time (int): 发布时间范围的结束时间戳，None表示不限
     """
     # 在线程内创建应用上下文
     with app.app_context():
@@ -492,15 +563,22 @@ def compare_task(task_id, sec_id_list, similarity_threshold, output_csv):
             from tool import batch_download_and_compare
             
             # 调用批量下载和比较函数
-            result = batch_download_and_compare(sec_id_list, similarity_threshold, output_csv)
+            progress = compare_progress[task_id]
+            result = batch_download_and_compare(sec_id_list, similarity_threshold, output_csv,
+                                                start_time=start_time, end_time=end_time, task_key=task_id,
+                                                progress=progress)
             
             # 更新线程信息
             threads_info[task_id]["download_count"] = result.get('download_count', 0)
             threads_info[task_id]["similar_pairs_count"] = len(result.get('similar_pairs', []))
+            threads_info[task_id]["failed_users"] = result.get('failed_users', {})
             threads_info[task_id]["output_csv"] = output_csv
             
             # 更新线程状态为已完成
-            if result.get('error'):
+            if progress.cancelled:
+                threads_info[task_id]["status"] = "已取消"
+                print(f"视频对比任务已取消: task_id={task_id}")
+            elif result.get('error'):
                 threads_info[task_id]["status"] = "出错"
                 threads_info[task_id]["error"] = result['error']
                 print(f"视频对比任务出错: {result['error']}")
@@ -516,6 +594,12 @@ def compare_task(task_id, sec_id_list, similarity_threshold, output_csv):
             # 更新线程状态为出错
             threads_info[task_id]["status"] = "出错"
             threads_info[task_id]["error"] = str(e)
+        
+        finally:
+            # 保留最后的进度，移除进度计数
+            progress = compare_progress.pop(task_id, None)
+            if progress is not None:
+                threads_info[task_id]["progress"] = progress.stats()
 
 if __name__ == '__main__':
     # 启用调试模式实现热更新
@@ -86,6 +86,44 @@ def get_user_videos(sec_id):
     else:
         print("获取用户视频列表失败:", response.text)
 
+# X-Bogus.js 在固定时间戳下的输出，用于校验纯Python签名实现
+XBOGUS_GOLDEN_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
+XBOGUS_GOLDEN_VECTORS = [
+    (1700000000, "aid=6383&sec_user_id=MS4wLjABAAAAudTtGsKUxcy2y3FxXlZe-u1gLScN2-zBTkr9hfgg7Gs&count=35&max_cursor=0&cookie_enabled=true&platform=PC&downlink=10", "DFSzswSLHniANedqtmWx-t9WcBrS"),
+    (1741667872, "aid=6383&sec_user_id=MS4wLjABAAAAudTtGsKUxcy2y3FxXlZe-u1gLScN2-zBTkr9hfgg7Gs&count=35&max_cursor=1712345678000&cookie_enabled=true&platform=PC&downlink=10", "DFSzswSLSIhANedqtZzc3t9WcBJO"),
+    (1760000001, "aid=6383&keyword=中文&count=10", "DFSzswSL6eJANedqCx/S-z9WcBnX"),
+    (1234567890, "", "DFSzswSL0IJANedq97B4FU9WcBn5"),
+]
+
+# 校验纯Python签名与 X-Bogus.js 的输出一致
+def test_native_xbogus():
+    import sys
+    import os
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'util'))
+    from tools.xbogus import sign
+    for timestamp, query, expected in XBOGUS_GOLDEN_VECTORS:
+        result = sign(query, XBOGUS_GOLDEN_UA, timestamp)
+        assert result == expected, f"{query}: {result} != {expected}"
+    print(f"纯Python签名与X-Bogus.js一致, 共校验{len(XBOGUS_GOLDEN_VECTORS)}组")
+
+# 校验 simdjson/orjson/json 解析 test_data 中的分页数据结果一致
+def test_page_decoders():
+    import sys
+    import os
+    root = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(root, 'util'))
+    from tools.page_decoder import DECODERS, available_decoders, decode_page
+    with open(os.path.join(root, 'test_data', 'aweme_post_page.json'), 'rb') as f:
+        content = f.read()
+    decoders = available_decoders()
+    for keep_raw in (False, True):
+        expected = decode_page(content, keep_raw=keep_raw, decoder='json')
+        for decoder in decoders:
+            result = decode_page(content, keep_raw=keep_raw, decoder=decoder)
+            assert result == expected, f"{decoder}(keep_raw={keep_raw}) 与json的解析结果不一致"
+    missing = [decoder for decoder in DECODERS if decoder not in decoders]
+    print(f"分页数据解析结果一致: {', '.join(decoders)}" + (f", 未安装: {', '.join(missing)}" if missing else ""))
+
 # 打开Swagger文档
 def open_swagger_doc():
     import webbrowser
@@ -99,6 +137,8 @@ if __name__ == "__main__":
     # get_all_threads_status()  # 获取所有线程状态
     # get_user_videos("MS4wLjABAAAAah62GbBN8fQXHTYIT18z6BV3HB5wt4_H5tYyYn_3Npy56HxUx3uEOk5a5VIL5_Bn")  # 获取用户视频列表
     # open_swagger_doc()  # 打开Swagger文档
+    # test_native_xbogus()  # 校验纯Python签名与X-Bogus.js一致
+    # test_page_decoders()  # 校验三种JSON解析方式的结果一致
     
     print("请取消注释选择要运行的测试函数")
 
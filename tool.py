@@ -3,7 +3,16 @@ import numpy as np
 from tqdm import tqdm
 import os
 from util.douyin_util import DouYinUtil
-from util.config import IS_SAVE, SAVE_FOLDER, USER_SEC_UID, IS_WRITE_TO_CSV, LOGIN_COOKIE, CSV_FILE_NAME
+from util.config import IS_SAVE, SAVE_FOLDER, USER_SEC_UID, IS_WRITE_TO_CSV, LOGIN_COOKIE, CSV_FILE_NAME, \
+    PIPELINE_LIST_WORKERS, PIPELINE_DOWNLOAD_WORKERS, PIPELINE_FINGERPRINT_WORKERS, COMPARE_WORKERS
+# 与 util/tools 中的模块和 main.py 使用同一个模块名导入，否则同一个模块会被加载两次，
+# CompareCancelled 等类和进程内共享的对象各有两份
+from tools.pipeline import Stage, Pipeline
+from tools.compare_pool import ComparePool, CompareCancelled
+from tools.fingerprint_index import get_fingerprint_index
+from tools.frame_sampler import sample_step, iter_sampled_frames
+from tools.video_fingerprint import VideoFingerprint, frame_histogram, get_frame_count, needed_indices, \
+    extract_fingerprint, FRAME_SIMILAR_SCORE
 import sys
 
 # 添加项目根目录到Python路径，以便从工具脚本中导入main模块中的数据库模型
@@ -29,7 +38,108 @@ except ImportError:
     Video = MockVideo
 
 
-def download_user_videos(sec_uid, task_id=None, user_id=None):
+def _download_pipeline(sec_id_list, task_id=None, user_id=None, incremental=False, start_time=None, end_time=None,
+                       fingerprint=None, task_key=None, stop_event=None):
+    """
+    用流水线下载多个用户的视频：翻页 -> 解析详情 -> 下载 -> 计算指纹 -> 记录结果，
+    各环节之间用有界队列连接，翻页、下载和指纹计算同时进行
+
+    参数:
+        sec_id_list (list): 抖音用户sec_uid列表
+        fingerprint (callable, optional): 传入视频文件路径返回视频指纹，为None时不计算
+        task_key (str, optional): 下载调度器中的任务标识，同一任务的下载与其他任务轮流进行
+        stop_event (threading.Event, optional): 设置后停止翻页和下载，正在处理的视频完成后返回
+
+    返回:
+        tuple: ((sec_uid, 视频信息) 列表，顺序与翻页顺序一致, {sec_uid: 获取视频列表时的异常})，
+               获取列表出错的用户只包含出错前已列出的视频
+    """
+    def list_videos(sec_uid):
+        dy_util = DouYinUtil(sec_uid=sec_uid, task_key=task_key)
+        videos = dy_util.iter_videos(incremental=incremental, start_time=start_time, end_time=end_time)
+        for index, video_meta in enumerate(videos):
+            yield {'dy_util': dy_util, 'index': index, 'video_id': video_meta.aweme_id}
+        # 翻页重试用完时只列出了部分视频，已列出的照常下载，该用户记为出错
+        if dy_util.last_error is not None:
+            raise dy_util.last_error
+
+    def resolve_detail(job):
+        video_info = job['dy_util'].get_video_detail_info(job['video_id'])
+        if video_info['is_video'] is not True:
+            return None
+        print(f"视频下载链接:{video_info['link']}")
+        job['video_info'] = video_info
+        job['file_path'] = f"{job['video_id']}.mp4"
+        return job
+
+    def download(job):
+        dy_util = job['dy_util']
+        job['download_success'] = dy_util.download_video(job['video_info']['link'], job['file_path'],
+                                                         aweme_id=job['video_id'])
+        job['content_hash'] = dy_util.content_hashes.get(job['file_path'])
+        job['skipped'] = job['file_path'] in dy_util.skipped_files
+        return job
+
+    def compute_fingerprint(job):
+        if fingerprint is not None and job['download_success']:
+            dy_util = job['dy_util']
+            job['fingerprint'] = fingerprint(f"{dy_util.save_folder}/{dy_util.sec_uid}/{job['file_path']}")
+        return job
+
+    def persist(job):
+        video_info = job['video_info']
+        # 记录视频信息
+        video_data = {
+            'video_id': job['video_id'],
+            'title': video_info.get('title', ''),
+            'download_url': video_info['link'],
+            'file_path': job['file_path'],
+            'content_hash': job['content_hash'],
+            'status': '已下载' if job['download_success'] else '下载失败',
+            'skipped': job['skipped']  # 文件已完整存在，本次没有重新下载
+        }
+        # 如果提供了数据库参数，则保存到数据库
+        # if task_id is not None and user_id is not None:
+        #     try:
+        #         # 创建视频记录
+        #         db_video = Video(
+        #             video_id=job['video_id'],
+        #             user_id=user_id,
+        #             task_id=task_id,
+        #             title=video_info.get('title', ''),
+        #             download_url=video_info['link'],
+        #             file_path=job['file_path'],
+        #             status=video_data['status']
+        #         )
+        #         db.session.add(db_video)
+        #         db.session.commit()
+        #     except Exception as e:
+        #         print(f"保存视频记录到数据库时出错: {str(e)}")
+        return job['dy_util'].sec_uid, job['index'], video_data
+
+    list_stage = Stage('list', list_videos, workers=min(PIPELINE_LIST_WORKERS, len(sec_id_list)), fanout=True)
+    pipeline = Pipeline([
+        list_stage,
+        Stage('detail', resolve_detail),
+        Stage('download', download, workers=PIPELINE_DOWNLOAD_WORKERS),
+        Stage('fingerprint', compute_fingerprint, workers=PIPELINE_FINGERPRINT_WORKERS),
+        Stage('persist', persist),
+    ], name='download', stop_event=stop_event)
+    results = pipeline.run(sec_id_list)
+
+    for name, stats in pipeline.stats().items():
+        print(f"[ToRecord]{name}: 处理{stats['processed']}个, 失败{stats['failed']}个, "
+              f"{stats['items_per_sec']:.2f}个/秒, 等待下游{stats['blocked_seconds']}秒")
+
+    # 下载环节并发执行，按用户和翻页顺序恢复结果顺序
+    order = {sec_uid: num for num, sec_uid in enumerate(sec_id_list)}
+    results.sort(key=lambda result: (order[result[0]], result[1]))
+    failures = {sec_uid: error for sec_uid, error in list_stage.errors}
+    return [(sec_uid, video_data) for sec_uid, _, video_data in results], failures
+
+
+def download_user_videos(sec_uid, task_id=None, user_id=None, incremental=False, start_time=None, end_time=None,
+                         task_key=None):
     """
     下载抖音用户的所有视频
     
@@ -37,57 +147,23 @@ def download_user_videos(sec_uid, task_id=None, user_id=None):
         sec_uid (str): 抖音用户的sec_uid
         task_id (int, optional): 下载任务ID，用于数据库记录
         user_id (int, optional): 用户ID，用于数据库记录
+        incremental (bool): 是否增量抓取，只下载上次抓取之后发布的新视频
+        start_time (optional): 发布时间范围的开始，时间戳或'YYYY-MM-DD'，翻到更早的视频即停止翻页
+        end_time (optional): 发布时间范围的结束，时间戳或'YYYY-MM-DD'(包含当天)
+        task_key (str, optional): 下载调度器中的任务标识，默认按用户区分
         
     返回:
         list: 下载的视频信息列表
+        
+    异常:
+        获取视频列表出错时抛出该错误，已列出的视频仍会下载
     """
     print(f"[ToRecord]开始下载用户{sec_uid}的视频")
-    dy_util = DouYinUtil(sec_uid=sec_uid)
-    all_video_list = dy_util.get_all_videos()
-    downloaded_videos = []
-    
-    for video_id in all_video_list:
-        try:
-            video_info = dy_util.get_video_detail_info(video_id)
-            
-            if video_info['is_video'] is True:
-                print(f"视频下载链接:{video_info['link']}")
-                file_path = f"{video_id}.mp4"
-                
-                # 下载视频
-                download_success = dy_util.download_video(video_info['link'], file_path)
-                
-                # 记录视频信息
-                video_data = {
-                    'video_id': video_id,
-                    'title': video_info.get('title', ''),
-                    'download_url': video_info['link'],
-                    'file_path': file_path,
-                    'status': '已下载' if download_success else '下载失败'
-                }
-                downloaded_videos.append(video_data)
-                
-                # 如果提供了数据库参数，则保存到数据库
-                # if task_id is not None and user_id is not None:
-                #     try:
-                #         # 创建视频记录
-                #         db_video = Video(
-                #             video_id=video_id,
-                #             user_id=user_id,
-                #             task_id=task_id,
-                #             title=video_info.get('title', ''),
-                #             download_url=video_info['link'],
-                #             file_path=file_path,
-                #             status='已下载' if download_success else '下载失败'
-                #         )
-                #         db.session.add(db_video)
-                #         db.session.commit()
-                #     except Exception as e:
-                #         print(f"保存视频记录到数据库时出错: {str(e)}")
-        except Exception as e:
-            print(f"处理视频 {video_id} 时出错: {str(e)}")
-    
-    return downloaded_videos
+    results, failures = _download_pipeline([sec_uid], task_id, user_id, incremental=incremental,
+                                           start_time=start_time, end_time=end_time, task_key=task_key)
+    if sec_uid in failures:
+        raise failures[sec_uid]
+    return [video_data for _, video_data in results]
 
 
 def compare_video(video_path1, video_path2, similarity_threshold=95):
@@ -125,7 +201,7 @@ def compare_video(video_path1, video_path2, similarity_threshold=95):
     
     # 计算采样间隔（为了提高效率，我们可以每隔几帧比较一次）
     # 如果视频很长，可以适当增加step_size
-    step_size = max(1, sample_count // 100)  # 至少采样100帧
+    step_size = sample_step(sample_count)  # 至少采样100帧
     
     # 初始化相似帧计数
     similar_frames = 0
@@ -133,37 +209,26 @@ def compare_video(video_path1, video_path2, similarity_threshold=95):
     
     print(f"开始比较视频，采样间隔：{step_size}帧")
     
+    # 两个视频各自顺序解码一遍，只在采样点生成图像并缩放，按相同的采样点配对
+    frames1 = iter_sampled_frames(cap1, sample_count, step_size)
+    frames2 = iter_sampled_frames(cap2, sample_count, step_size)
+    
     # 使用进度条
-    for i in tqdm(range(0, sample_count, step_size)):
-        # 设置视频的当前帧位置
-        cap1.set(cv2.CAP_PROP_POS_FRAMES, i)
-        cap2.set(cv2.CAP_PROP_POS_FRAMES, i)
-        
-        # 读取帧
-        ret1, frame1 = cap1.read()
-        ret2, frame2 = cap2.read()
-        
+    for (_, frame1_resized), (_, frame2_resized) in tqdm(zip(frames1, frames2),
+                                                         total=len(range(0, sample_count, step_size))):
         # 检查帧是否成功读取
-        if not ret1 or not ret2:
+        if frame1_resized is None or frame2_resized is None:
             continue
         
-        # 调整大小以加速比较（可选）
-        frame1_resized = cv2.resize(frame1, (320, 240))
-        frame2_resized = cv2.resize(frame2, (320, 240))
-        
-        # 计算直方图相似度（这是一种简单的比较方法）
-        hist1 = cv2.calcHist([frame1_resized], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
-        hist2 = cv2.calcHist([frame2_resized], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
-        
-        # 归一化直方图
-        cv2.normalize(hist1, hist1, 0, 1.0, cv2.NORM_MINMAX)
-        cv2.normalize(hist2, hist2, 0, 1.0, cv2.NORM_MINMAX)
+        # 计算直方图相似度（这是一种简单的比较方法），直方图已归一化并展平
+        hist1 = frame_histogram(frame1_resized)
+        hist2 = frame_histogram(frame2_resized)
         
         # 比较直方图
         score = cv2.compareHist(hist1, hist2, cv2.HISTCMP_CORREL)
         
         # 如果相似度大于0.8（这个值可以调整），认为帧相似
-        if score > 0.8:
+        if score > FRAME_SIMILAR_SCORE:
             similar_frames += 1
         
         total_compared += 1
@@ -183,7 +248,53 @@ def compare_video(video_path1, video_path2, similarity_threshold=95):
     return similarity_percentage >= similarity_threshold
 
 
-def compare_videos_batch(videos_dir, similarity_threshold=95, output_csv=None):
+def _fingerprint_videos(video_files, pool, fingerprints=None, targets=None):
+    """
+    每个视频只解码一遍，提取与其他视频比较时需要的帧直方图
+    
+    参数:
+        video_files (list): 视频文件路径列表
+        pool (ComparePool): 执行提取任务的进程池
+        fingerprints (dict, optional): 已有的指纹 {路径: VideoFingerprint}，如下载流水线中计算的或索引中记录的，
+                                       只补充缺少的帧
+        targets (set, optional): 需要比较的视频在video_files中的下标，为None时所有视频两两比较
+        
+    返回:
+        list: 与video_files顺序一致的VideoFingerprint列表
+    """
+    fingerprints = fingerprints or {}
+    # 已有指纹的视频使用记录的帧数，其他视频只读取文件头获取帧数，据此算出每个视频需要哪些帧
+    frame_counts = []
+    for video_file in video_files:
+        fingerprint = fingerprints.get(os.path.normpath(video_file))
+        if fingerprint is not None:
+            frame_counts.append(fingerprint.frame_count)
+            continue
+        frame_count = get_frame_count(video_file)
+        if frame_count is None:
+            # 无法打开的视频与任何视频都不相似
+            print(f"错误：无法打开视频文件 {video_file}")
+        frame_counts.append(frame_count)
+    all_counts = set(count for count in frame_counts if count is not None)
+    target_counts = all_counts if targets is None else \
+        set(frame_counts[num] for num in targets if frame_counts[num] is not None)
+    
+    print(f"提取 {len(video_files)} 个视频的指纹，进程数 {pool.workers}...")
+    jobs = []
+    for num, (video_file, frame_count) in enumerate(zip(video_files, frame_counts)):
+        if frame_count is None:
+            jobs.append((VideoFingerprint(video_file, None), ()))
+            continue
+        fingerprint = fingerprints.get(os.path.normpath(video_file)) or VideoFingerprint(video_file, frame_count)
+        fingerprint.frame_count = frame_count
+        # 需要比较的视频与所有视频比较，其他视频只与需要比较的视频比较
+        other_counts = all_counts if targets is None or num in targets else target_counts
+        jobs.append((fingerprint, needed_indices(frame_count, other_counts)))
+    return pool.extract_fingerprints(jobs)
+
+
+def compare_videos_batch(videos_dir, similarity_threshold=95, output_csv=None, mode='fingerprint', fingerprints=None,
+                         workers=COMPARE_WORKERS, progress=None, targets=None, index=None):
     """
     批量比较多个视频之间的相似度，找出相似视频对
     
@@ -191,11 +302,18 @@ def compare_videos_batch(videos_dir, similarity_threshold=95, output_csv=None):
         videos_dir (str): 包含视频文件的目录
         similarity_threshold (float): 相似度阈值，默认95%
         output_csv (str): 输出CSV文件路径，默认为None
+        mode (str): fingerprint 每个视频只解码一遍提取直方图序列，再分块计算所有视频对的相关系数矩阵；
+                    pairwise 对每一对视频调用compare_video，结果与fingerprint相同
+        fingerprints (dict, optional): 已提取的指纹 {路径: VideoFingerprint}，如下载流水线中计算的
+        workers (int): fingerprint 方式的进程数，每个视频的指纹提取和每块视频对的比较分别交给进程池执行，
+                       0表示CPU核数，1表示在当前线程中执行
+        progress (CompareProgress, optional): 进度计数，其他线程可以读取进度或取消比较，取消时抛出CompareCancelled
+        targets (list, optional): 需要比较的视频文件路径，只比较至少有一个在其中的视频对，为None时比较所有视频对
+        index (FingerprintIndex, optional): fingerprint 方式的指纹索引，已记录的视频不再解码，新提取的指纹写回索引
         
     返回:
         list: 相似视频对的列表，每个元素为(video1, video2, similarity)元组
     """
-    import itertools
     import csv
     from datetime import datetime
     
@@ -221,27 +339,70 @@ def compare_videos_batch(videos_dir, similarity_threshold=95, output_csv=None):
     similar_pairs = []
     
     # 比较所有可能的视频对
-    total_comparisons = len(list(itertools.combinations(video_files, 2)))
-    completed = 0
-    
-    for i, video1 in enumerate(video_files):
-        for video2 in video_files[i+1:]:
-            completed += 1
-            print(f"正在比较 ({completed}/{total_comparisons}): {os.path.basename(video1)} 与 {os.path.basename(video2)}")
+    total_comparisons = len(video_files) * (len(video_files) - 1) // 2
+    target_positions = None
+    if targets is not None:
+        # 只比较需要比较的视频之间、以及它们与其他视频之间的视频对
+        wanted = set(os.path.normpath(target) for target in targets)
+        target_positions = set(num for num, video_file in enumerate(video_files)
+                               if os.path.normpath(video_file) in wanted)
+        if not target_positions:
+            print(f"警告：在 {videos_dir} 中未找到需要比较的视频")
+            return []
+        count = len(target_positions)
+        total_comparisons = count * (len(video_files) - count) + count * (count - 1) // 2
+    
+    if mode == 'fingerprint':
+        known = {}
+        if index is not None:
+            index.prune(videos_dir, video_files)
+            known = index.load([os.path.normpath(video_file) for video_file in video_files])
+        stored = {path: len(fingerprint.hists) for path, fingerprint in known.items()}
+        known.update(fingerprints or {})
+        with ComparePool(workers, progress) as pool:
+            video_fingerprints = _fingerprint_videos(video_files, pool, known, target_positions)
+            if index is not None:
+                # 只记录新视频和补充了帧的视频
+                index.save([fingerprint for video_file, fingerprint in zip(video_files, video_fingerprints)
+                            if stored.get(os.path.normpath(video_file)) != len(fingerprint.hists)])
+            print(f"开始比较 {total_comparisons} 对视频的指纹...")
+            # 分块计算所有视频对的相关系数矩阵，不再逐对比较
+            found = pool.find_similar_pairs(video_fingerprints, similarity_threshold, new=target_positions)
+        for i, j, similarity_percentage in found:
+            video1_id = os.path.basename(video_files[i]).replace('.mp4', '')
+            video2_id = os.path.basename(video_files[j]).replace('.mp4', '')
+            print(f"发现相似视频: {video1_id} 和 {video2_id} ({similarity_percentage:.2f}%)")
+            similar_pairs.append((video1_id, video2_id))
+    else:
+        completed = 0
+        if progress is not None:
+            progress.update(stage='compare', workers=1, pairs_total=total_comparisons)
+    
+        for i, video1 in enumerate(video_files):
+            for j, video2 in enumerate(video_files[i+1:], i + 1):
+                if target_positions is not None and i not in target_positions and j not in target_positions:
+                    continue
+                if progress is not None:
+                    progress.check()
+                    progress.add(pairs_done=1)
+                completed += 1
+                print(f"正在比较 ({completed}/{total_comparisons}): {os.path.basename(video1)} 与 {os.path.basename(video2)}")
             
-            try:
-                # 使用compare_video函数比较两个视频
-                is_similar = compare_video(video1, video2, similarity_threshold)
+                try:
+                    # 使用compare_video函数比较两个视频
+                    is_similar = compare_video(video1, video2, similarity_threshold)
                 
-                if is_similar:
-                    # 提取视频ID（假设文件名就是视频ID加扩展名）
-                    video1_id = os.path.basename(video1).replace('.mp4', '')
-                    video2_id = os.path.basename(video2).replace('.mp4', '')
+                    if is_similar:
+                        # 提取视频ID（假设文件名就是视频ID加扩展名）
+                        video1_id = os.path.basename(video1).replace('.mp4', '')
+                        video2_id = os.path.basename(video2).replace('.mp4', '')
                     
-                    print(f"发现相似视频: {video1_id} 和 {video2_id}")
-                    similar_pairs.append((video1_id, video2_id))
-            except Exception as e:
-                print(f"比较视频时出错: {str(e)}")
+                        print(f"发现相似视频: {video1_id} 和 {video2_id}")
+                        similar_pairs.append((video1_id, video2_id))
+                        if progress is not None:
+                            progress.add(similar_pairs=1)
+                except Exception as e:
+                    print(f"比较视频时出错: {str(e)}")
     
     # 如果指定了输出CSV文件，则保存结果
     if output_csv and similar_pairs:
@@ -263,7 +424,8 @@ def compare_videos_batch(videos_dir, similarity_threshold=95, output_csv=None):
     return similar_pairs
 
 
-def batch_download_and_compare(sec_id_list, similarity_threshold=95, output_csv=None):
+def batch_download_and_compare(sec_id_list, similarity_threshold=95, output_csv=None, start_time=None, end_time=None,
+                               task_key=None, progress=None):
     """
     批量下载多个用户的视频并进行相似度比较
     
@@ -271,6 +433,10 @@ def batch_download_and_compare(sec_id_list, similarity_threshold=95, output_csv=
         sec_id_list (list): 抖音用户sec_id列表
         similarity_threshold (float): 相似度阈值，默认95%
         output_csv (str): 输出CSV文件路径，默认为None
+        start_time (optional): 只下载该时间之后发布的视频
+        end_time (optional): 只下载该时间之前发布的视频
+        task_key (str, optional): 下载调度器中的任务标识
+        progress (CompareProgress, optional): 比较进度，取消后停止下载并跳过比较
         
     返回:
         dict: 包含下载和比较结果的字典
@@ -281,30 +447,57 @@ def batch_download_and_compare(sec_id_list, similarity_threshold=95, output_csv=
     result = {
         'download_count': 0,
         'similar_pairs': [],
+        'failed_users': {},
         'error': None
     }
     
-    # 开始时间
-    start_time = datetime.now()
-    print(f"开始批量下载和比较任务，时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    # 开始时间(start_time/end_time 是发布时间范围参数，这里用其他名字)
+    task_start = datetime.now()
+    print(f"开始批量下载和比较任务，时间: {task_start.strftime('%Y-%m-%d %H:%M:%S')}")
     
-    # 下载所有用户的视频
+    # 所有用户共用一条下载流水线，多个用户同时翻页和下载，下载完的视频同时提取指纹
     all_downloaded_videos = []
+    candidates = []  # (本次用户的视频路径, 是否跳过了下载)
+    fingerprints = {}
+    index = get_fingerprint_index()
     
+    def fingerprint(file_path):
+        file_path = os.path.normpath(file_path)
+        # 索引中已有的视频不再解码
+        video_fingerprint = index.load([file_path]).get(file_path) or extract_fingerprint(file_path)
+        fingerprints[file_path] = video_fingerprint
+        return video_fingerprint
+    
+    try:
+        print(f"下载 {len(sec_id_list)} 个用户的视频...")
+        results, failures = _download_pipeline(sec_id_list, start_time=start_time, end_time=end_time,
+                                               fingerprint=fingerprint, task_key=task_key,
+                                               stop_event=progress.cancel_event if progress is not None else None)
+    except Exception as e:
+        print(f"下载视频时出错: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        results, failures = [], {}
     for sec_id in sec_id_list:
-        try:
-            print(f"下载用户 {sec_id} 的视频...")
-            videos = download_user_videos(sec_id)
-            if videos:
-                all_downloaded_videos.extend(videos)
-                result['download_count'] += len(videos)
-                print(f"成功下载用户 {sec_id} 的 {len(videos)} 个视频")
-            else:
-                print(f"用户 {sec_id} 没有可下载的视频")
-        except Exception as e:
-            print(f"下载用户 {sec_id} 的视频时出错: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        if sec_id in failures:
+            result['failed_users'][sec_id] = str(failures[sec_id])
+            print(f"获取用户 {sec_id} 的视频列表时出错: {failures[sec_id]}")
+        videos = [video_data for result_sec_id, video_data in results if result_sec_id == sec_id]
+        if videos:
+            all_downloaded_videos.extend(videos)
+            candidates.extend((os.path.normpath(os.path.join(SAVE_FOLDER, sec_id, video_data['file_path'])),
+                               video_data['skipped']) for video_data in videos if video_data['status'] == '已下载')
+            result['download_count'] += len(videos)
+            print(f"成功下载用户 {sec_id} 的 {len(videos)} 个视频")
+        else:
+            print(f"用户 {sec_id} 没有可下载的视频")
+    if result['failed_users']:
+        result['error'] = f"{len(result['failed_users'])}个用户的视频列表获取失败或不完整: " \
+                          f"{', '.join(result['failed_users'])}"
+    
+    if progress is not None and progress.cancelled:
+        result['error'] = "比较任务已取消"
+        return result
     
     # 如果没有下载到视频，则提前结束
     if not all_downloaded_videos:
@@ -314,12 +507,23 @@ def batch_download_and_compare(sec_id_list, similarity_threshold=95, output_csv=
     # 确定视频存储的目录
     video_dir = os.path.join(SAVE_FOLDER)
     
-    # 比较视频相似度
+    # 比较视频相似度：只比较本次下载的视频和索引中还没有指纹的视频与其他视频的视频对，
+    # 索引中已有指纹且本次没有重新下载的视频在之前的比较中已经比较过
+    indexed = index.load([path for path, skipped in candidates if skipped])
+    targets = [path for path, skipped in candidates if not skipped or path not in indexed]
+    if not targets:
+        # 没有新视频时用索引中的指纹重新比较本次请求的用户的视频，不需要解码，结果和CSV与之前一致
+        print("本次没有新下载的视频，使用索引中的指纹比较")
+        targets = [path for path, skipped in candidates]
     try:
-        print(f"开始比较 {result['download_count']} 个视频的相似度...")
-        similar_pairs = compare_videos_batch(video_dir, similarity_threshold, output_csv)
+        print(f"开始比较 {len(targets)} 个视频的相似度...")
+        similar_pairs = compare_videos_batch(video_dir, similarity_threshold, output_csv, fingerprints=fingerprints,
+                                             progress=progress, targets=targets, index=index)
         result['similar_pairs'] = similar_pairs
         print(f"相似度比较完成，发现 {len(similar_pairs)} 对相似视频")
+    except CompareCancelled as e:
+        print(f"比较视频相似度时取消: {str(e)}")
+        result['error'] = str(e)
     except Exception as e:
         print(f"比较视频相似度时出错: {str(e)}")
         result['error'] = str(e)
@@ -327,8 +531,8 @@ def batch_download_and_compare(sec_id_list, similarity_threshold=95, output_csv=
         traceback.print_exc()
     
     # 结束时间
-    end_time = datetime.now()
-    duration = (end_time - start_time).total_seconds()
+    task_end = datetime.now()
+    duration = (task_end - task_start).total_seconds()
     print(f"批量下载和比较任务结束，总用时: {duration:.2f} 秒")
     
     return result
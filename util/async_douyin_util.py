@@ -0,0 +1,239 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import aiohttp
+
+import logging
+
+from douyin_util import DouYinUtil
+from tools.util import generate_url_with_xbs
+from tools.rate_limiter import get_rate_limiter
+from tools.page_decoder import decode_page
+from tools.retry import check_response, check_page
+from config import ASYNC_MAX_REQUESTS, ASYNC_MAX_DOWNLOADS, HTTP_POOL_MAXSIZE, HTTP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['AsyncCrawlEngine', 'AsyncDouYinUtil', 'run_crawl']
+
+
+class AsyncCrawlEngine(object):
+    """
+    异步抓取引擎：所有用户的翻页请求共用一个事件循环和一组连接池，通过信号量限制同时进行的接口请求数；
+    CDN下载复用同步版本的断点续传、下载调度和内容去重，在独立的线程池中进行
+    """
+
+    def __init__(self, max_requests: int = ASYNC_MAX_REQUESTS, max_downloads: int = ASYNC_MAX_DOWNLOADS,
+                 limit_per_host: int = HTTP_POOL_MAXSIZE, api_host: str = None, rate_limiter=None):
+        """
+        :param max_requests: 同时进行的接口请求数
+        :param max_downloads: 同时进行的下载数
+        :param limit_per_host: 每个host的连接数上限
+        :param api_host: 接口地址，默认使用配置中的 DOUYIN_API_HOST
+        :param rate_limiter: 翻页使用的限速器，默认与同步版本共享进程内的限速器
+        """
+        self.max_requests = max_requests
+        self.max_downloads = max_downloads
+        self.limit_per_host = limit_per_host
+        self.api_host = api_host
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.session = None
+        self.request_semaphore = None
+        self.list_executor = None
+        self.download_executor = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        connect_timeout, read_timeout = HTTP_TIMEOUT
+        connector = aiohttp.TCPConnector(limit=self.max_requests + self.max_downloads,
+                                         limit_per_host=self.limit_per_host)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+        )
+        self.request_semaphore = asyncio.Semaphore(self.max_requests)
+        # 翻页的线程等待事件循环中的请求，与签名使用的默认线程池分开，避免互相占满
+        self.list_executor = ThreadPoolExecutor(max_workers=self.max_requests, thread_name_prefix='async-list')
+        self.download_executor = ThreadPoolExecutor(max_workers=self.max_downloads,
+                                                    thread_name_prefix='async-download')
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        for executor in (self.list_executor, self.download_executor):
+            if executor is not None:
+                executor.shutdown(wait=False)
+        self.list_executor = None
+        self.download_executor = None
+
+    def create_util(self, sec_uid: str):
+        util = AsyncDouYinUtil(sec_uid, self)
+        if self.api_host:
+            util.api_host = self.api_host
+        util.rate_limiter = self.rate_limiter
+        return util
+
+    async def download_user_videos(self, sec_uid: str, incremental: bool = False, start_time=None, end_time=None):
+        """
+        抓取单个用户的视频列表，并发下载其中所有视频
+        :param sec_uid: 抖音用户的sec_uid
+        :param incremental: 同 DouYinUtil.get_all_videos
+        :param start_time: 同 DouYinUtil.get_all_videos
+        :param end_time: 同 DouYinUtil.get_all_videos
+        :return: 下载的视频信息列表，格式同 tool.download_user_videos
+        """
+        dy_util = self.create_util(sec_uid)
+        all_video_list = await dy_util.get_all_videos(incremental=incremental, start_time=start_time,
+                                                      end_time=end_time)
+
+        async def download_one(video_id):
+            video_info = dy_util.get_video_detail_info(video_id)
+            if video_info['is_video'] is not True:
+                return None
+            file_path = f"{video_id}.mp4"
+            download_success = await dy_util.download_video(video_info['link'], file_path, aweme_id=video_id)
+            return {
+                'video_id': video_id,
+                'title': video_info.get('title', ''),
+                'download_url': video_info['link'],
+                'file_path': file_path,
+                'status': '已下载' if download_success else '下载失败'
+            }
+
+        results = await asyncio.gather(*[download_one(video_id) for video_id in all_video_list],
+                                       return_exceptions=True)
+        downloaded_videos = []
+        for video_id, result in zip(all_video_list, results):
+            if isinstance(result, Exception):
+                logger.error(f"处理视频 {video_id} 时出错: {result}")
+            elif result is not None:
+                downloaded_videos.append(result)
+        return downloaded_videos
+
+    async def crawl_users(self, sec_uid_list: list, **kwargs):
+        """
+        同时抓取多个用户
+        :param sec_uid_list: 抖音用户sec_uid列表
+        :param kwargs: 传给 download_user_videos 的 incremental/start_time/end_time
+        :return: {sec_uid: 下载的视频信息列表}
+        """
+        results = await asyncio.gather(*[self.download_user_videos(sec_uid, **kwargs) for sec_uid in sec_uid_list],
+                                       return_exceptions=True)
+        user_videos = {}
+        for sec_uid, result in zip(sec_uid_list, results):
+            if isinstance(result, Exception):
+                logger.error(f"下载用户 {sec_uid} 的视频时出错: {result}")
+                user_videos[sec_uid] = []
+            else:
+                user_videos[sec_uid] = result
+        return user_videos
+
+
+class AsyncDouYinUtil(DouYinUtil):
+    """
+    DouYinUtil 的异步版本，列表/详情/下载接口与同步版本一致，网络相关方法为协程
+    """
+
+    def __init__(self, sec_uid: str, engine: AsyncCrawlEngine):
+        super().__init__(sec_uid)
+        self.engine = engine
+        self.loop = None  # 翻页线程通过它把请求交回事件循环
+
+    async def get_user_video_info(self, url: str):
+        async with self.engine.request_semaphore:
+            async with self.engine.session.get(url, headers=self.api_headers) as res:
+                body = await res.read()
+        check_response(res.status, body)
+        return decode_page(body, keep_raw=self.spill_raw)
+
+    async def fetch_page(self, cursor: int):
+        """
+        获取一页视频列表，出错或被限流时换Cookie并退避重试
+        :param cursor: 翻页游标max_cursor
+        :return: 接口返回的数据
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            # 当前Cookie冷却中时换一个，全部在冷却时等待最先恢复的
+            wait = self._checkout_session()
+            if wait:
+                await asyncio.sleep(wait)
+            while True:
+                wait = self.circuit_breaker.before_request(self.circuit_breaker.key(self.api_host))
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+            # 签名可能需要与Node进程通信，放到线程池中执行避免阻塞事件循环
+            xbs = await loop.run_in_executor(None, generate_url_with_xbs, self._page_url(cursor),
+                                             self.api_headers.get('User-Agent'))
+            user_video_url = self.video_api_url + '&X-Bogus=' + xbs
+            await self.rate_limiter.acquire_async(self.limiter_key)
+            try:
+                user_info = await self.get_user_video_info(user_video_url)
+                check_page(user_info)
+            except Exception as e:
+                await asyncio.sleep(self._page_failed(e, attempt))
+                continue
+            self._page_succeeded()
+            return user_info
+
+    def _wait_result(self, result):
+        # 在翻页线程中调用，请求仍在事件循环中执行
+        return asyncio.run_coroutine_threadsafe(result, self.loop).result()
+
+    async def get_all_videos(self, incremental: bool = False, start_time=None, end_time=None):
+        """
+        获取所有的视频，参数、增量水位线和停止翻页的条件与同步版本相同，重试用完时保留已获取的视频
+        :return:
+        """
+        self.loop = asyncio.get_running_loop()
+        # 翻页逻辑与同步版本共用，在线程中运行，每页的请求通过 _wait_result 交回事件循环
+        return await self.loop.run_in_executor(
+            self.engine.list_executor,
+            partial(DouYinUtil.get_all_videos, self, incremental=incremental, start_time=start_time,
+                    end_time=end_time)
+        )
+
+    async def download_video(self, video_url: str, file_name: str = None, aweme_id: str = None):
+        """
+        下载视频，与同步版本一样使用 .part 断点续传、下载调度和内容去重
+        :param video_url: 视频地址
+        :param file_name: 视频保存文件名: 默认为空
+        :param aweme_id: 同 DouYinUtil.download_video
+        :return: 文件是否下载完整
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self.engine.download_executor,
+            partial(DouYinUtil.download_video, self, video_url, file_name, aweme_id=aweme_id)
+        )
+
+    async def download_images(self, image_list: list, image_dir: str = None):
+        """
+        下载图片，已完整的图片直接跳过
+        :param image_list: 图片地址
+        :param image_dir: 图片目录: 默认为空
+        :return: 下载统计，同 DouYinUtil.download_images
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self.engine.download_executor, partial(DouYinUtil.download_images, self, image_list, image_dir)
+        )
+
+def run_crawl(sec_uid_list: list, **engine_kwargs):
+    """
+    在新的事件循环中抓取多个用户的视频
+    :param sec_uid_list: 抖音用户sec_uid列表
+    :param engine_kwargs: 传给 AsyncCrawlEngine 的参数
+    :return: {sec_uid: 下载的视频信息列表}
+    """
+    async def main():
+        async with AsyncCrawlEngine(**engine_kwargs) as engine:
+            return await engine.crawl_users(sec_uid_list)
+    return asyncio.run(main())
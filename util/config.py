@@ -7,6 +7,61 @@ SAVE_FOLDER = 'D:/result/data'  # 视频下载保存的文件夹地址[推荐写
 
 IS_WRITE_TO_CSV = True  # ToDo: 是否需要记录到CSV文件 False: 不保存，True:保存
 CSV_FILE_NAME = 'D:/result/data/demo.csv'  # ToDo: 保存到CSV的文件名
+IS_CONTENT_STORE = True  # 是否按内容摘要去重保存下载的文件(相同内容只保存一份，用户目录中为硬链接)
+IS_SPILL_RAW_AWEME = False  # 是否将接口返回的原始视频数据逐行追加到 <SAVE_FOLDER>/<sec_uid>/aweme_raw.jsonl
+
+XBOGUS_BACKEND = 'node'  # X-Bogus签名方式 node:常驻Node进程 execjs:PyExecJS native:纯Python实现
+XBOGUS_POOL_SIZE = 2  # 常驻JS运行时数量(native方式忽略)
+
+DOUYIN_API_HOST = 'https://www.douyin.com'  # 抖音接口地址，压测时可指向本地模拟服务
+
+HTTP_POOL_CONNECTIONS = 16  # 最多缓存多少个host的连接池
+HTTP_POOL_MAXSIZE = 32  # 每个host最多保持的keep-alive连接数
+HTTP_TIMEOUT = (5, 30)  # 请求超时时间(连接超时, 读取超时)，单位秒
+HTTP_MAX_RETRIES = 3  # 请求失败最大重试次数
+HTTP_BACKOFF_FACTOR = 0.5  # 重试退避系数，第n次重试等待 factor * 2^(n-1) 秒
+IMAGE_DOWNLOAD_WORKERS = 8  # 图文作品的图片并发下载数(进程内共享)
+DOWNLOAD_MAX_CONCURRENT = 8  # 整个进程同时进行的CDN下载数，所有任务和用户轮流使用
+DOWNLOAD_MAX_BANDWIDTH = 0  # 整个进程的下载总带宽(字节/秒)，0表示不限
+CHUNKED_DOWNLOAD_THRESHOLD = 16 * 1024 * 1024  # 不小于该大小的视频分段并行下载，0表示总是单连接下载
+CHUNKED_DOWNLOAD_PARTS = 4  # 每个大文件的分段数
+CHUNKED_DOWNLOAD_WORKERS = 16  # 所有分段下载共用的线程数
+CHUNKED_DOWNLOAD_BUFFER = 1024 * 1024  # 分段下载每次读取和写入缓冲的字节数
+
+RATE_LIMIT_INITIAL = 0.5  # 每个host+cookie的初始请求速率(次/秒)
+RATE_LIMIT_MIN = 0.1  # 最低请求速率
+RATE_LIMIT_MAX = 5.0  # 最高请求速率
+RATE_LIMIT_BURST = 2  # 允许的突发请求数
+RATE_LIMIT_INCREASE = 0.1  # 响应正常时每次增加的速率
+RATE_LIMIT_DECREASE = 0.5  # 出错或被限流时速率乘以的系数
+
+LOGIN_COOKIES = []  # 更多账号的Cookie，与 LOGIN_COOKIE 组成会话池轮流翻页，元素为Cookie字符串或 (Cookie, User-Agent)
+SESSION_COOLDOWN = 10  # Cookie出错或被限流后暂停使用的秒数，连续失败时翻倍
+SESSION_MAX_COOLDOWN = 300  # 暂停使用的最长秒数
+SESSION_MAX_FAILURES = 6  # Cookie连续失败多少次后停用，0表示不停用
+
+PAGE_MAX_RETRIES = 4  # 单页列表请求出错或被限流后的重试次数，用完后保留已获取的视频并停止翻页
+PAGE_RETRY_BACKOFF = 1.0  # 重试等待的基础秒数，第n次重试随机等待 0 ~ base*2^n 秒
+PAGE_RETRY_MAX_BACKOFF = 30  # 重试等待的最长秒数
+PENDING_MAX_ATTEMPTS = 3  # 下载失败的视频最多尝试的次数(含第一次)，之后的增量抓取会重新获取播放地址再重试
+CIRCUIT_BREAKER_THRESHOLD = 5  # 同一host连续失败多少次后暂停所有翻页，0表示不熔断
+CIRCUIT_BREAKER_COOLDOWN = 15  # 熔断后暂停的秒数，恢复后试探请求仍失败时翻倍
+CIRCUIT_BREAKER_MAX_COOLDOWN = 300  # 熔断暂停的最长秒数
+
+PAGE_DECODER = 'auto'  # 视频列表页的JSON解析方式 auto/simdjson/orjson/json，auto时使用已安装的最快方式
+
+ASYNC_MAX_REQUESTS = 64  # 异步引擎同时进行的接口请求数
+ASYNC_MAX_DOWNLOADS = 16  # 异步引擎同时进行的CDN下载数
+
+PIPELINE_QUEUE_SIZE = 32  # 下载流水线各环节之间的队列长度，队列满时上游等待
+PIPELINE_LIST_WORKERS = 2  # 同时翻页的用户数
+PIPELINE_DOWNLOAD_WORKERS = 4  # 同时下载的视频数
+PIPELINE_FINGERPRINT_WORKERS = 2  # 同时计算视频指纹的线程数
+
+EXPORT_BATCH_SIZE = 1024  # 导出视频元数据时每批写入的条数
+
+COMPARE_BLOCK_SIZE = 128  # 批量比较视频时每次计算多少个视频之间的相关系数矩阵，越大越快但占用内存越多
+COMPARE_WORKERS = 0  # 批量比较视频时提取指纹和计算相关系数的进程数，0表示CPU核数，1表示在当前线程中执行
 
 
 import os
@@ -15,4 +70,12 @@ import os
 if os.name == 'posix':
     SAVE_FOLDER = '/Users/duhuifeng/code/download'
     CSV_FILE_NAME = '/Users/duhuifeng/code/demo.csv'
-    
+
+# 抓取进度等数据与Flask应用共用的SQLite数据库
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'douyin.db')
+
+# 按内容摘要保存文件的目录，文件不带扩展名
+CONTENT_STORE_FOLDER = os.path.join(SAVE_FOLDER, '.blobs')
+
+# 视频元数据导出文件，扩展名决定格式: .ndjson/.jsonl/.parquet/.arrow
+EXPORT_FILE_NAME = os.path.join(SAVE_FOLDER, 'videos.parquet')
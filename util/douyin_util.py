@@ -1,16 +1,25 @@
 import json
-import requests
 import time
 import os
-import urllib.request
 import argparse
-import pandas as pd
 import csv
 from datetime import datetime
 
-from tools.util import get_current_time_format, generate_url_with_xbs, sleep_random
-from config import IS_SAVE, SAVE_FOLDER, USER_SEC_UID, IS_WRITE_TO_CSV, LOGIN_COOKIE, CSV_FILE_NAME
-import requests
+from tools.util import get_current_time_format, generate_url_with_xbs, to_timestamp
+from tools.http_client import get_session
+from tools.downloader import download_file, download_files
+from tools.rate_limiter import get_rate_limiter, limiter_key
+from tools.crawl_state import get_crawl_state_store
+from tools.video_meta import VideoMeta
+from tools.content_store import get_content_store, new_hasher
+from tools.page_decoder import decode_page
+from tools.exporter import VideoMetaExporter
+from tools.download_scheduler import get_download_scheduler
+from tools.session_pool import get_session_pool
+from tools.circuit_breaker import get_circuit_breaker
+from tools.retry import FATAL, check_response, check_page, classify_error, backoff_delay
+from config import IS_SAVE, SAVE_FOLDER, USER_SEC_UID, IS_WRITE_TO_CSV, LOGIN_COOKIE, CSV_FILE_NAME, DOUYIN_API_HOST, \
+    IS_SPILL_RAW_AWEME, IS_CONTENT_STORE, EXPORT_FILE_NAME, PAGE_MAX_RETRIES
 
 import logging
 
@@ -23,11 +32,23 @@ logger = logging.getLogger(__name__)
 
 __all__ = ['DouYinUtil']
 
+
+def _file_key(file_name: str):
+    try:
+        stat = os.stat(file_name)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
 class DouYinUtil(object):
 
-    def __init__(self, sec_uid: str):
+    def __init__(self, sec_uid: str, spill_raw: bool = IS_SPILL_RAW_AWEME, exporter=None, task_key=None):
         """
         :param sec_uid: 抖音id
+        :param spill_raw: 是否把原始视频数据写到磁盘，内存中只保留精简的VideoMeta
+        :param exporter: VideoMetaExporter，传入时每获取到一条视频就写入导出文件
+        :param task_key: 所属下载任务，下载调度器在任务之间轮流分配下载名额，默认按用户区分
         """
         self.sec_uid = sec_uid
         self.is_save = IS_SAVE
@@ -36,6 +57,7 @@ class DouYinUtil(object):
             os.mkdir(self.save_folder)
         self.is_write_to_csv = IS_WRITE_TO_CSV
         self.csv_name = CSV_FILE_NAME
+        self.api_host = DOUYIN_API_HOST
         self.video_api_url = ''
         self.api_headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36',
@@ -44,110 +66,404 @@ class DouYinUtil(object):
         }
         self.cursor = 0
         self.videos_list = []  # 视频列表id
-        self.video_info_list = []
-        self.video_info_dict = {}
+        self.video_info_dict = {}  # 视频id -> VideoMeta
+        self.spill_raw = spill_raw
+        self.raw_file_name = f"{self.save_folder}/{self.sec_uid}/aweme_raw.jsonl"
         self.stop_flag = False  # 默认不停止
+        self.session = get_session()  # 所有实例共享连接池
+        self.rate_limiter = get_rate_limiter()  # 所有实例共享限速器
+        self.limiter_key = limiter_key(self.api_host, LOGIN_COOKIE)
+        self.session_pool = get_session_pool()  # 多个Cookie轮流翻页
+        self.crawl_session = None  # 当前使用的Cookie，第一次翻页时从会话池领取
+        self.circuit_breaker = get_circuit_breaker()  # 同一host被限流时所有实例一起暂停
+        self.max_retries = PAGE_MAX_RETRIES
+        self.last_error = None  # 翻页重试用完后的异常，此时只获取到了部分视频
+        self.content_store = get_content_store() if IS_CONTENT_STORE else None
+        self.content_hashes = {}  # 文件名 -> 下载时计算的内容摘要
+        self.skipped_files = set()  # 已完整存在、没有重新下载的文件名
+        self.exporter = exporter
+        self.scheduler = get_download_scheduler()  # 所有实例共享下载名额和带宽
+        self.task_key = task_key if task_key is not None else sec_uid
 
     def get_user_video_info(self, url: str):
-        res = requests.get(url, headers=self.api_headers)
-        res.encoding = 'utf-8'
-        res_text = res.text
-        return json.loads(res_text)
+        res = self.session.get(url, headers=self.api_headers)
+        check_response(res.status_code, res.content)
+        # 直接从字节解析，只保留抓取用到的字段；需要落盘原始数据时保留完整内容
+        return decode_page(res.content, keep_raw=self.spill_raw)
+
+    def _use_session(self, crawl_session):
+        self.crawl_session = crawl_session
+        self.api_headers['Cookie'] = crawl_session.cookie
+        self.api_headers['User-Agent'] = crawl_session.user_agent
+        # 每个Cookie在限速器中有独立的令牌桶
+        self.limiter_key = limiter_key(self.api_host, crawl_session.cookie)
+
+    def _checkout_session(self):
+        """
+        当前Cookie不可用(冷却中或已停用)时从会话池换一个
+        :return: 新Cookie还需要冷却的秒数
+        """
+        current = self.crawl_session
+        if current is not None and current.available():
+            return 0
+        crawl_session = self.session_pool.acquire(exclude=current)
+        if current is not None:
+            self.session_pool.release(current)
+        self._use_session(crawl_session)
+        return crawl_session.cooldown_remaining()
+
+    def release_session(self):
+        """
+        把当前Cookie还给会话池
+        """
+        if self.crawl_session is not None:
+            self.session_pool.release(self.crawl_session)
+            self.crawl_session = None
+
+    def _report_page(self, healthy: bool):
+        self.rate_limiter.report(self.limiter_key, healthy)
+        self.session_pool.report(self.crawl_session, healthy)
+
+    def _page_succeeded(self):
+        self._report_page(True)
+        self.circuit_breaker.record_success(self.circuit_breaker.key(self.api_host))
+
+    def _page_failed(self, error: Exception, attempt: int):
+        """
+        记录一次翻页失败，不能重试或重试次数用完时重新抛出异常
+        :param error: 异常
+        :param attempt: 第几次重试，从0开始
+        :return: 重试前需要等待的秒数
+        """
+        kind = classify_error(error)
+        self._report_page(False)
+        if kind != FATAL:
+            self.circuit_breaker.record_failure(self.circuit_breaker.key(self.api_host))
+        if kind == FATAL or attempt >= self.max_retries:
+            raise error
+        delay = backoff_delay(attempt)
+        logger.warning(f"请求接口失败({kind}), {delay:.1f}秒后第{attempt + 1}次重试: {self.sec_uid} {error}")
+        return delay
+
+    def _page_url(self, cursor):
+        self.video_api_url = f'{self.api_host}/aweme/v1/web/aweme/post/?aid=6383&sec_user_id={self.sec_uid}&count=35&max_cursor={cursor}&cookie_enabled=true&platform=PC&downlink=10'
+        return self.video_api_url
+
+    def get_aweme_detail(self, url: str):
+        res = self.session.get(url, headers=self.api_headers)
+        check_response(res.status_code, res.content)
+        return json.loads(res.content)
+
+    def _detail_url(self, aweme_id):
+        return f'{self.api_host}/aweme/v1/web/aweme/detail/?aid=6383&aweme_id={aweme_id}&cookie_enabled=true&platform=PC&downlink=10'
 
-    def get_all_videos(self):
+    def _request_api(self, url: str, fetch):
+        """
+        请求一次签名后的接口，出错或被限流时换Cookie并退避重试
+        :param url: 不带X-Bogus的接口地址
+        :param fetch: 用签名后的地址请求并校验数据的函数
+        :return: fetch 的返回值
+        """
+        for attempt in range(self.max_retries + 1):
+            wait = self._checkout_session()
+            if wait:
+                time.sleep(wait)
+            # 熔断期间等待，恢复后只有一个线程先试探
+            while True:
+                wait = self.circuit_breaker.before_request(self.circuit_breaker.key(self.api_host))
+                if not wait:
+                    break
+                time.sleep(wait)
+            xbs = generate_url_with_xbs(url, self.api_headers.get('User-Agent'))
+            signed_url = url + '&X-Bogus=' + xbs
+            # print(f'访问url:{signed_url}')
+            self.rate_limiter.acquire(self.limiter_key)
+            try:
+                result = fetch(signed_url)
+            except Exception as e:
+                time.sleep(self._page_failed(e, attempt))
+                continue
+            self._page_succeeded()
+            return result
+
+    def fetch_page(self, cursor: int):
+        """
+        获取一页视频列表，出错或被限流时换Cookie并退避重试
+        :param cursor: 翻页游标max_cursor
+        :return: 接口返回的数据
+        """
+        def fetch(url):
+            user_info = self.get_user_video_info(url)
+            # 还有下一页却返回空列表，通常是被限流了
+            check_page(user_info)
+            return user_info
+
+        return self._request_api(self._page_url(cursor), fetch)
+
+    def fetch_video_meta(self, aweme_id: str):
+        """
+        通过作品详情接口重新获取视频信息，播放地址有时效，重试下载前需要重新获取
+        :param aweme_id: 视频id
+        :return: VideoMeta，作品已删除或无法解析时返回None
+        """
+        aweme_info = self._request_api(self._detail_url(aweme_id), self.get_aweme_detail).get('aweme_detail')
+        if not aweme_info:
+            return None
+        return self._add_aweme(aweme_info)
+
+    def _add_aweme(self, aweme_info: dict):
+        # print(f'视频信息如下:{aweme_info}')
+        try:
+            video_meta = VideoMeta.from_aweme(aweme_info)
+        except (KeyError, IndexError, TypeError) as e:
+            # 单条数据缺少字段(如作品已删除、播放地址为空)时跳过，不影响同一页的其他视频
+            logger.error(f'解析视频信息失败, 跳过: {self.sec_uid} {aweme_info.get("aweme_id")} {e!r}')
+            return None
+        self.video_info_dict.setdefault(video_meta.aweme_id, video_meta)
+        self.videos_list.append(video_meta.aweme_id)
+        if self.spill_raw:
+            self._spill_raw_aweme(aweme_info)
+        if self.exporter is not None:
+            self.exporter.write(video_meta, self.sec_uid)
+        return video_meta
+
+    def _spill_raw_aweme(self, aweme_info: dict):
+        save_folder = os.path.dirname(self.raw_file_name)
+        if not os.path.exists(save_folder):
+            os.makedirs(save_folder)
+        with open(self.raw_file_name, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(aweme_info, ensure_ascii=False) + '\n')
+
+    def get_all_videos(self, incremental: bool = False, start_time=None, end_time=None):
         """
         获取所有的视频
+        :param incremental: 增量模式，翻到上次已抓取过的视频就停止，只返回新视频
+        :param start_time: 发布时间范围的开始(时间戳/datetime/日期字符串)，翻到更早的视频就停止翻页
+        :param end_time: 发布时间范围的结束，之后发布的视频不返回
         :return:
         """
+        for _ in self.iter_videos(incremental=incremental, start_time=start_time, end_time=end_time):
+            pass
+        return self.videos_list
+
+    def iter_videos(self, incremental: bool = False, start_time=None, end_time=None):
+        """
+        逐页翻页并逐条产出视频信息，调用方可以边翻页边下载
+        :param incremental: 增量模式，翻到上次已抓取过的视频就停止，只产出新视频和之前没有下载成功的视频
+        :param start_time: 发布时间范围的开始(时间戳/datetime/日期字符串)，翻到更早的视频就停止翻页
+        :param end_time: 发布时间范围的结束(只给日期时包含当天)，之后发布的视频跳过
+        :return: VideoMeta 生成器，下载时传入 aweme_id 会记录下载结果
+        """
+        try:
+            yield from self._iter_videos(incremental, start_time, end_time)
+        finally:
+            # 翻页结束(或调用方提前停止)后把Cookie还给会话池
+            self.release_session()
+
+    def _wait_result(self, result):
+        # 异步子类的 fetch_page 返回协程，在这里等待它的结果
+        return result
+
+    def _fetch_page_or_stop(self):
+        # 重试用完时不抛出异常，已获取的视频和保存的游标都保留，下次增量抓取从这里继续
+        try:
+            return self._wait_result(self.fetch_page(self.cursor))
+        except Exception as e:
+            self.last_error = e
+            logger.error(f'获取视频列表失败, 保留已获取的{len(self.videos_list)}个视频并停止翻页: '
+                         f'{self.sec_uid} 游标{self.cursor} {e}')
+            return None
+
+    def _iter_videos(self, incremental: bool, start_time, end_time):
+        self.last_error = None
+        start_time = to_timestamp(start_time)
+        end_time = to_timestamp(end_time, end_of_day=True)
+        # 按时间范围抓取只翻了部分页，不能用来更新水位线和续抓游标
+        windowed = start_time is not None or end_time is not None
+        state_store = get_crawl_state_store()
+        state = state_store.get(self.sec_uid) or {}
+        watermark = state.get('newest_create_time') if incremental else None
+        # 上次的历史抓取没有翻完时，记下需要续抓的游标
+        resume_cursor = state.get('last_cursor') if incremental and not state.get('history_complete') else None
+        if windowed:
+            resume_cursor = None
+        newest = None
+
+        # 第一轮从最新一页开始翻页
+        self.cursor = 0
+        self.stop_flag = False
         while not self.stop_flag:
-            self.video_api_url = f'https://www.douyin.com/aweme/v1/web/aweme/post/?aid=6383&sec_user_id={self.sec_uid}&count=35&max_cursor={self.cursor}&cookie_enabled=true&platform=PC&downlink=10'
-            xbs = generate_url_with_xbs(self.video_api_url, self.api_headers.get('User-Agent'))
-            user_video_url = self.video_api_url + '&X-Bogus=' + xbs
-            # print(f'访问url:{user_video_url}')
-            user_info = self.get_user_video_info(user_video_url)   
-            aweme_list = user_info['aweme_list']
-            for aweme_info in aweme_list:
-                # print(f'视频信息如下:{aweme_info}')
-                self.video_info_list.append(aweme_info)
-                self.video_info_dict.setdefault(aweme_info['aweme_id'], aweme_info)
-                self.videos_list.append(aweme_info['aweme_id'])
+            user_info = self._fetch_page_or_stop()
+            if user_info is None:
+                break
+            for aweme_info in user_info['aweme_list']:
+                # 置顶视频不按时间排序，不参与水位线判断
+                is_top = bool(aweme_info.get('is_top'))
+                if not is_top and (newest is None or aweme_info['create_time'] > newest['create_time']):
+                    newest = aweme_info
+                if watermark is not None and not is_top and aweme_info['create_time'] <= watermark:
+                    logger.info(f'已翻到上次抓取过的视频, 停止翻页: {self.sec_uid}')
+                    self.stop_flag = True
+                    break
+                # 列表按发布时间倒序，早于开始时间说明后面的页都不在范围内
+                if start_time is not None and aweme_info['create_time'] < start_time:
+                    if is_top:
+                        continue
+                    logger.info(f'已翻到开始时间之前的视频, 停止翻页: {self.sec_uid}')
+                    self.stop_flag = True
+                    break
+                if end_time is not None and aweme_info['create_time'] > end_time:
+                    continue
+                if aweme_info['aweme_id'] not in self.video_info_dict:
+                    video_meta = self._add_aweme(aweme_info)
+                    if video_meta is None:
+                        continue
+                    yield video_meta
+            if self.stop_flag:
+                break
             if int(user_info['has_more']) == 0:
                 print(f'获取完整视频列表完成')
                 self.stop_flag = True
+                resume_cursor = None
+                if not windowed:
+                    state_store.save(self.sec_uid, last_cursor=0, history_complete=True)
             else:
                 self.cursor = user_info['max_cursor']
                 # self.stop_flag = True
-            sleep_random()
-        return self.videos_list
+                if watermark is None and not windowed:
+                    state_store.save(self.sec_uid, last_cursor=self.cursor)
+        # 最新一页到水位线之间已全部拿到，更新水位线；
+        # 没有水位线时每页都保存了游标，中途失败也可以更新，剩下的部分下次从游标续抓
+        finished = self.last_error is None or watermark is None
+        if not windowed and finished and newest is not None \
+                and newest['create_time'] > (state.get('newest_create_time') or 0):
+            state_store.save(self.sec_uid, newest_aweme_id=newest['aweme_id'],
+                             newest_create_time=newest['create_time'])
+
+        # 上次的历史抓取没有完成时，从保存的游标继续往下翻
+        if resume_cursor and self.last_error is None:
+            logger.info(f'从游标{resume_cursor}继续抓取历史视频: {self.sec_uid}')
+            self.cursor = resume_cursor
+            self.stop_flag = False
+            while not self.stop_flag:
+                user_info = self._fetch_page_or_stop()
+                if user_info is None:
+                    break
+                for aweme_info in user_info['aweme_list']:
+                    if aweme_info['aweme_id'] not in self.video_info_dict:
+                        video_meta = self._add_aweme(aweme_info)
+                        if video_meta is not None:
+                            yield video_meta
+                if int(user_info['has_more']) == 0:
+                    self.stop_flag = True
+                    state_store.save(self.sec_uid, last_cursor=0, history_complete=True)
+                else:
+                    self.cursor = user_info['max_cursor']
+                    state_store.save(self.sec_uid, last_cursor=self.cursor)
 
-    def download_video(self, video_url: str, file_name: str = None):
+        # 之前没有下载成功的视频已在水位线或游标之后，翻页不会再遇到；播放地址可能已过期，重新获取后再重试
+        if incremental and not windowed:
+            for aweme_id in state_store.get_pending(self.sec_uid):
+                if aweme_id in self.video_info_dict:
+                    continue
+                logger.info(f'重试之前没有下载成功的视频: {self.sec_uid} {aweme_id}')
+                try:
+                    video_meta = self.fetch_video_meta(aweme_id)
+                except Exception as e:
+                    logger.error(f'获取视频详情失败: {self.sec_uid} {aweme_id} {e}')
+                    state_store.record_failure(self.sec_uid, aweme_id)
+                    continue
+                if video_meta is None:
+                    logger.info(f'作品已不存在, 不再重试: {self.sec_uid} {aweme_id}')
+                    state_store.remove_pending(self.sec_uid, aweme_id)
+                    continue
+                yield video_meta
+
+    def download_video(self, video_url: str, file_name: str = None, aweme_id: str = None):
         """
         下载视频
         :param video_url: 视频地址
         :param file_name: 视频保存文件名: 默认为空
-        :return:
+        :param aweme_id: 视频id，传入时记录下载结果，没有下载成功的视频在之后的增量抓取中重试
+        :return: 文件是否下载完整，已完整存在而跳过下载的文件名记录在 skipped_files 中
         """
         logger.info(f"下载视频: {video_url}")
         if not self.is_save:
             logger.info("当前不需要保存")
-            return
+            return False
+        if aweme_id is None:
+            return self._download_video(video_url, file_name)
+        # 水位线和游标在翻页时就已越过这个视频，下载失败或被中断时只能靠这条记录重试
+        state_store = get_crawl_state_store()
+        state_store.add_pending(self.sec_uid, aweme_id)
+        success = self._download_video(video_url, file_name)
+        if success:
+            state_store.remove_pending(self.sec_uid, aweme_id)
+        else:
+            state_store.record_failure(self.sec_uid, aweme_id)
+        return success
+
+    def _download_video(self, video_url: str, file_name: str):
         save_folder = f"{self.save_folder}/{self.sec_uid}"
-        if not os.path.exists(save_folder):
-            os.mkdir(save_folder)
+        # 流水线中多个线程会同时下载同一用户的视频
+        os.makedirs(save_folder, exist_ok=True)
         real_file_name = f"{save_folder}/{file_name}"
         logger.info(f"下载url:{video_url}\n保存文件名:{real_file_name}")
-        if os.path.exists(real_file_name):
-            os.remove(real_file_name)
 
         # 发送GET请求
         headers_ = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36',
             'Referer': video_url,
-            'cookie': LOGIN_COOKIE
+            'cookie': self.api_headers['Cookie']
         }
-        response = requests.get(video_url, stream=True, headers=headers_)
-
-        # 检查请求是否成功
-        if response.status_code == 200:
-            # 打开一个本地文件用于保存下载的视频
-            with open(real_file_name, 'wb') as f:
-                # 下载大文件需这样处理
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+        # 已完整的文件直接跳过，中断的下载从 .part 文件续传
+        hasher = new_hasher() if self.content_store is not None else None
+        # 文件没有变化时使用记录的摘要，跳过下载时不再读取整个文件
+        known_digest = self.content_store.digest_of(real_file_name) if self.content_store is not None else None
+        file_key = _file_key(real_file_name)
+        success = download_file(self.session, video_url, real_file_name, headers_, hasher=hasher,
+                                throttle=self.scheduler.throttle,
+                                slot=lambda: self.scheduler.slot(self.task_key, self.sec_uid),
+                                hash_existing=known_digest is None)
+        if success:
             logger.info("下载完成")
-        else:
-            logger.info(f"错误{response.status_code}")
-        # urllib.request.urlretrieve(video_url, real_file_name)
+            # 文件大小和修改时间都没变说明是跳过的，重新下载的文件会被替换
+            skipped = file_key is not None and _file_key(real_file_name) == file_key
+            if skipped:
+                self.skipped_files.add(file_name)
+            if skipped and known_digest is not None:
+                self.content_hashes[file_name] = known_digest
+            elif hasher is not None:
+                digest = hasher.hexdigest()
+                self.content_hashes[file_name] = digest
+                self.content_store.add(real_file_name, digest, self.sec_uid)
+        return success
 
     def download_images(self, image_list: list, image_dir: str = None):
         """
-        下载图片
+        并发下载图片，已完整的图片直接跳过
         :param image_list: 图片地址
         :param file_name: 图片目录: 默认为空
-        :return:
+        :return: 下载统计 {'total': 图片数, 'success': 成功数, 'elapsed': 耗时(秒)}
         """
         if not self.is_save:
             logger.info("当前不需要保存")
             return
 
-        parent_folder = f"{self.save_folder}/{self.sec_uid}"
-        if not os.path.exists(parent_folder):
-            os.mkdir(parent_folder)
         save_folder = f"{self.save_folder}/{self.sec_uid}/{image_dir}"
 
         logger.info(f"save-dir:{save_folder}")
 
-        num = 1
-        if not os.path.exists(save_folder):
-            os.mkdir(save_folder)
-        for image_url in image_list:
-            num += 1
-            logger.info(f"image_url:{image_url} {num}")
-            real_file_name = f"{save_folder}/{num}.jpeg"
-            logger.info(f"下载url:{image_url}\n保存文件名:{real_file_name}")
-            if os.path.exists(real_file_name):
-                os.remove(real_file_name)
-            urllib.request.urlretrieve(image_url, real_file_name)
+        os.makedirs(save_folder, exist_ok=True)
+        # 文件名从2开始编号，与之前的命名保持一致
+        items = [(image_url, f"{save_folder}/{num}.jpeg") for num, image_url in enumerate(image_list, start=2)]
+        start = time.perf_counter()
+        results = download_files(self.session, items, slot=lambda: self.scheduler.slot(self.task_key, self.sec_uid),
+                                 throttle=self.scheduler.throttle)
+        elapsed = time.perf_counter() - start
+        success = sum(1 for result in results if result)
+        logger.info(f"图文{image_dir}下载完成: {success}/{len(items)}张, 耗时{elapsed:.2f}秒")
+        return {'total': len(items), 'success': success, 'elapsed': elapsed}
 
     def get_video_detail_info(self, video_id: str):
         """
@@ -170,30 +486,30 @@ class DouYinUtil(object):
         res_info = self.video_info_dict.get(video_id, None)
         if res_info is None:
             return default_response
-        default_response['nick_name'] = res_info['author']['nickname']
-        print(f'nick_name:{res_info}')
-        default_response['title'] = res_info['desc']
-        if res_info.get('preview_title') is not None:
-            default_response["preview_title"] = res_info["preview_title"]
-        create_time = res_info['create_time']
+        default_response['nick_name'] = res_info.nickname
+        print(f'nick_name:{res_info.nickname}')
+        default_response['title'] = res_info.desc
+        if res_info.preview_title is not None:
+            default_response["preview_title"] = res_info.preview_title
+        create_time = res_info.create_time
         local_time = time.localtime(create_time)
         local_time_str = time.strftime("%Y-%m-%d %H:%M:%S", local_time)
         default_response['publish_time'] = local_time_str
         default_response['record_time'] = get_current_time_format()
-        if res_info['images'] is None:
-            default_response['link'] = res_info["video"]["play_addr"]["url_list"][0]
-            default_response['cover_url'] = res_info["video"]["cover"]["url_list"][0]
+        if res_info.is_video:
+            default_response['link'] = res_info.links[0]
+            default_response['cover_url'] = res_info.cover_url
             default_response['is_video'] = True
         else:
-            default_response['link'] = list(map(lambda x: x["url_list"][-1], res_info["images"]))
+            default_response['link'] = list(res_info.links)
             default_response['is_video'] = False
-        default_response['thumb_up_num'] = res_info['statistics']['admire_count']
-        default_response['comment_num'] = res_info['statistics']['comment_count']
+        default_response['thumb_up_num'] = res_info.admire_count
+        default_response['comment_num'] = res_info.comment_count
         return default_response
 
     def save_video_info_dict(self, save_path="D:\\result\\video.json"):
         """
-        将视频信息字典保存到本地JSON文件
+        将视频信息字典保存到本地JSON文件，原始数据见 spill_raw 写出的 aweme_raw.jsonl
         :param save_path: 保存路径，默认为D:\\result\\video.json
         :return:
         """
@@ -205,7 +521,8 @@ class DouYinUtil(object):
         # 将字典转换为JSON并保存
         try:
             with open(save_path, 'w', encoding='utf-8') as f:
-                json.dump(self.video_info_dict, f, ensure_ascii=False, indent=4)
+                json.dump({video_id: video_meta.to_dict() for video_id, video_meta in self.video_info_dict.items()},
+                          f, ensure_ascii=False)
             logger.info(f"已成功将视频信息字典保存到 {save_path}")
         except Exception as e:
             logger.error(f"保存视频信息字典到 {save_path} 时出错: {e}")
@@ -252,74 +569,28 @@ if __name__ == '__main__':
     "MS4wLjABAAAAWzVO_Kt-uvi8lTCVo17KmsLkKOs7a4WlkCxGzVytWkGGF7flXWMap35sxiURj2cL",
     "MS4wLjABAAAAdXNU5N0mJFlKyONz-OcIAXkmKd-NJo78Zs7NENSZHE2u7w_ol4hfx1Hdzw2M6bZF"
     ]
-    for sec in sec_ids:
-        params_list_size = len(sys.argv)
-        USER_SEC_UID = sec
+    # 视频信息在翻页时逐条写入导出文件，用 tools.exporter.load_videos 读取分析
+    with VideoMetaExporter(EXPORT_FILE_NAME) as exporter:
+        for sec in sec_ids:
+            params_list_size = len(sys.argv)
+            USER_SEC_UID = sec
 
-        print(f"当前传入的参数：SEC_ID：{USER_SEC_UID}\n SAVE_FOLDER:{SAVE_FOLDER}")
-        if not os.path.exists(SAVE_FOLDER):
-            os.mkdir(SAVE_FOLDER)
+            print(f"当前传入的参数：SEC_ID：{USER_SEC_UID}\n SAVE_FOLDER:{SAVE_FOLDER}")
+            if not os.path.exists(SAVE_FOLDER):
+                os.mkdir(SAVE_FOLDER)
 
-        dy_util = DouYinUtil(sec_uid=USER_SEC_UID)
-        all_video_list = dy_util.get_all_videos()
-        print(f"当前需要下载的视频列表数量为:{len(all_video_list)}")
+            dy_util = DouYinUtil(sec_uid=USER_SEC_UID, exporter=exporter)
+            # 翻到开始日期之前的视频就停止翻页，不再拉取整个历史
+            all_video_list = dy_util.get_all_videos(start_time=start_date, end_time=end_date)
+            print(f"当前需要下载的视频列表数量为:{len(all_video_list)}")
         
-        # 保存视频信息字典到本地
-        dy_util.save_video_info_dict(f"D:\\result\\video_{USER_SEC_UID}.json")
+            # 保存视频信息字典到本地
+            dy_util.save_video_info_dict(f"D:\\result\\video_{USER_SEC_UID}.json")
+
+            # get_all_videos 已按发布时间范围过滤
+            total_videos_in_date_range += len(all_video_list)
+            print(f"用户 {USER_SEC_UID} 在 {start_date.strftime('%Y-%m-%d')} 到 {end_date.strftime('%Y-%m-%d')} 期间发布了 {len(all_video_list)} 个视频")
 
-        continue
-        
-        # 当前用户在日期范围内的视频数
-        user_videos_in_date_range = 0
-        
-        csvVideos = []
-        for video_id in all_video_list:
-            video_info = dy_util.get_video_detail_info(video_id)
-            print(f"视频信息:{video_info}")
-            
-            # 检查发布日期是否在指定范围内
-            publish_time = video_info.get('publish_time', '')
-            if publish_time:
-                try:
-                    publish_date = datetime.strptime(publish_time, "%Y-%m-%d %H:%M:%S")
-                    if not (start_date <= publish_date <= end_date):
-                        logger.info(f"视频 {video_id} 的发布日期 {publish_time} 不在指定范围内，跳过下载")
-                        continue
-                    else:
-                        logger.info(f"视频 {video_id} 的发布日期 {publish_time} 在指定范围内，将下载")
-                        user_videos_in_date_range += 1
-                        total_videos_in_date_range += 1
-                except ValueError as e:
-                    logger.error(f"解析发布日期出错: {e}，将继续下载")
-            
-            if video_info['is_video'] is True:
-                logger.info(f"video_link:{video_info['link']}")
-                dy_util.download_video(video_info['link'], f"{video_id}.mp4")
-            if video_info["is_video"] is False:
-                dy_util.download_images(video_info["link"], f"{video_id}")
-            title = video_info["title"]
-            preview_title = video_info["preview_title"]
-            logger.info(f"file:{video_id}.mp4,title:{title} , preview_title:{preview_title}")
-            video_info["link"] = video_id
-            video_info["video_id"] = f"id:{video_id}"
-            csvVideos.append(video_info)
-        
-        print(f"用户 {USER_SEC_UID} 在 {start_date.strftime('%Y-%m-%d')} 到 {end_date.strftime('%Y-%m-%d')} 期间发布了 {user_videos_in_date_range} 个视频")
-        
-        try:
-            CSV_FILE_NAME = f'/Users/duhuifeng/code/csv/sec_{USER_SEC_UID}.csv'
-            data = pd.DataFrame(csvVideos)
-            csvHeaders = ["视频id", "视频链接", "是否为视频", "标题", "点赞数", "评论数", "视频封面", "发布日期",
-                      "更新日期",
-                      "预览标题"]
-            data.to_csv(CSV_FILE_NAME, header=csvHeaders, index=False, mode='a+', encoding='utf-8')
-            try:
-                data.to_csv(CSV_FILE_NAME, header=False, index=False, mode='a+', encoding='utf-8')
-            except UnicodeEncodeError:
-                logger.info("编码错误, 该数据无法写到文件中, 直接忽略该数据")
-        except Exception as e:
-            logger.info(e)
-    
     # 输出统计结果
     print(f"\n统计结果：在 {start_date.strftime('%Y-%m-%d')} 到 {end_date.strftime('%Y-%m-%d')} 期间，所有用户共发布了 {total_videos_in_date_range} 个视频")
 
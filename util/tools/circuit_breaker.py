@@ -0,0 +1,119 @@
+import threading
+import time
+import urllib.parse
+
+import logging
+
+from config import CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_COOLDOWN, CIRCUIT_BREAKER_MAX_COOLDOWN
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['CircuitBreaker', 'get_circuit_breaker']
+
+
+class _Circuit(object):
+    __slots__ = ('failures', 'trips', 'open_until', 'probing_since')
+
+    def __init__(self):
+        self.failures = 0  # 连续失败次数
+        self.trips = 0  # 连续熔断次数，用于计算暂停时长
+        self.open_until = 0.0
+        self.probing_since = None  # 暂停结束后试探请求的开始时间
+
+
+class CircuitBreaker(object):
+    """
+    按host熔断：同一host连续失败达到阈值时暂停所有线程的请求，
+    暂停结束后只放行一个试探请求，成功则恢复，失败则暂停时间翻倍
+    """
+
+    def __init__(self, threshold: int = CIRCUIT_BREAKER_THRESHOLD, cooldown: float = CIRCUIT_BREAKER_COOLDOWN,
+                 max_cooldown: float = CIRCUIT_BREAKER_MAX_COOLDOWN):
+        """
+        :param threshold: 连续失败多少次后熔断，0表示不熔断
+        :param cooldown: 第一次熔断暂停的秒数
+        :param max_cooldown: 暂停秒数上限
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.circuits = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(url: str):
+        return urllib.parse.urlparse(url).netloc
+
+    def before_request(self, key: str):
+        """
+        :param key: host
+        :return: 需要等待的秒数，0表示可以发请求
+        """
+        with self.lock:
+            circuit = self.circuits.get(key)
+            if circuit is None or circuit.trips == 0:
+                return 0
+            now = time.monotonic()
+            if now < circuit.open_until:
+                return circuit.open_until - now
+            # 已有试探请求在进行，其他线程稍后再看结果；试探请求迟迟没有结果时允许再试探
+            if circuit.probing_since is not None and now - circuit.probing_since < self.cooldown:
+                return min(1.0, self.cooldown)
+            circuit.probing_since = now
+            return 0
+
+    def record_success(self, key: str):
+        with self.lock:
+            circuit = self.circuits.get(key)
+            if circuit is None:
+                return
+            if circuit.trips:
+                logger.info(f"{key} 请求恢复正常")
+            circuit.failures = 0
+            circuit.trips = 0
+            circuit.probing_since = None
+
+    def record_failure(self, key: str):
+        with self.lock:
+            circuit = self.circuits.setdefault(key, _Circuit())
+            now = time.monotonic()
+            if now < circuit.open_until:
+                return
+            circuit.failures += 1
+            # 试探请求失败时直接再次熔断
+            if circuit.probing_since is None and (not self.threshold or circuit.failures < self.threshold):
+                return
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** circuit.trips)
+            circuit.trips += 1
+            circuit.open_until = now + cooldown
+            circuit.probing_since = None
+            logger.warning(f"{key} 连续失败{circuit.failures}次, 暂停所有请求{cooldown:.0f}秒")
+
+    def stats(self):
+        with self.lock:
+            now = time.monotonic()
+            return {
+                key: {
+                    'failures': circuit.failures,
+                    'trips': circuit.trips,
+                    'open': round(max(0.0, circuit.open_until - now), 1),
+                }
+                for key, circuit in self.circuits.items()
+            }
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker():
+    """
+    获取进程内共享的熔断器，同一host的所有线程共用
+    :return:
+    """
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker()
+    return _breaker
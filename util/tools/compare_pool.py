@@ -0,0 +1,273 @@
+import concurrent.futures
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+import logging
+import numpy as np
+
+from config import COMPARE_WORKERS, COMPARE_BLOCK_SIZE
+from tools.video_fingerprint import HIST_BINS, VideoFingerprint, extract_fingerprint, iter_compare_blocks, stack_rows, \
+    compare_block
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['CompareCancelled', 'CompareProgress', 'ComparePool']
+
+
+class CompareCancelled(Exception):
+    pass
+
+
+class CompareProgress(object):
+    """
+    批量比较的进度计数，比较线程更新，其他线程可以随时读取或取消
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.stage = None  # fingerprint 提取指纹, compare 比较指纹
+        self.workers = 0
+        self.videos_total = 0
+        self.videos_done = 0
+        self.blocks_total = 0
+        self.blocks_done = 0
+        self.pairs_total = 0
+        self.pairs_done = 0
+        self.similar_pairs = 0
+        self.started_at = time.monotonic()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check(self):
+        if self.cancelled:
+            raise CompareCancelled('比较任务已取消')
+
+    def update(self, **values):
+        with self.lock:
+            for name, value in values.items():
+                setattr(self, name, value)
+
+    def add(self, **counts):
+        with self.lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'stage': self.stage,
+                'workers': self.workers,
+                'videos_total': self.videos_total,
+                'videos_done': self.videos_done,
+                'blocks_total': self.blocks_total,
+                'blocks_done': self.blocks_done,
+                'pairs_total': self.pairs_total,
+                'pairs_done': self.pairs_done,
+                'similar_pairs': self.similar_pairs,
+                'cancelled': self.cancelled,
+                'elapsed_seconds': round(time.monotonic() - self.started_at, 1),
+            }
+
+
+def _extract_task(path: str, indices, frame_count: int):
+    # 在子进程中执行，只返回新提取的直方图，由主进程合并到已有的指纹
+    try:
+        fingerprint = extract_fingerprint(path, indices, frame_count=frame_count)
+        return fingerprint.frame_count, fingerprint.hists, None
+    except Exception as e:
+        return None, {}, str(e)
+
+
+def _write_hists(fingerprints, path: str):
+    """
+    把所有视频的直方图依次写到一个.npy文件，子进程用内存映射读取，每个任务只需要传递位置信息
+    :return: 每个视频的 (帧数, 帧序号数组, 起始行)
+    """
+    layout = []
+    offset = 0
+    for fingerprint in fingerprints:
+        indices = np.array(sorted(fingerprint.hists), dtype=np.int64)
+        layout.append((fingerprint.frame_count, indices, offset))
+        offset += len(indices)
+    hists = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32,
+                                      shape=(offset, HIST_BINS[0] * HIST_BINS[1] * HIST_BINS[2]))
+    for fingerprint, (_, indices, offset) in zip(fingerprints, layout):
+        if len(indices):
+            hists[offset:offset + len(indices)] = np.stack([fingerprint.hists[index] for index in indices.tolist()])
+    hists.flush()
+    del hists
+    return layout
+
+
+# 子进程中已映射的直方图文件
+_mapped = {}
+
+
+def _compare_task(hists_path: str, layout: dict, *args):
+    # 在子进程中执行，按位置信息从映射的文件中取出这一块视频的直方图
+    hists = _mapped.get(hists_path)
+    if hists is None:
+        _mapped.clear()
+        # 转成普通数组视图，逐行取直方图时没有memmap的额外开销
+        hists = _mapped[hists_path] = np.load(hists_path, mmap_mode='r').view(np.ndarray)
+    fingerprints = {
+        member: VideoFingerprint(None, frame_count, dict(zip(indices.tolist(), hists[offset:offset + len(indices)])))
+        for member, (frame_count, indices, offset) in layout.items()
+    }
+    return compare_block(fingerprints, *args)
+
+
+def _process_context():
+    # 比较在多线程的web进程中进行，直接fork可能复制其他线程持有的锁；
+    # forkserver 从单线程的服务进程fork出worker，计算用的模块只在服务进程中导入一次。
+    # 不预加载主模块：服务进程中不执行 main.py 等入口脚本的模块级代码
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([extract_fingerprint.__module__, __name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+class ComparePool(object):
+    """
+    并行批量比较：每个视频的指纹提取、每块视频对的相关系数计算各是一个任务，
+    由进程池执行，完成一个处理一个；workers为1时在当前线程中依次执行。
+    每个任务完成后更新进度，取消后放弃尚未开始的任务并抛出CompareCancelled
+    """
+
+    def __init__(self, workers: int = COMPARE_WORKERS, progress: CompareProgress = None):
+        """
+        :param workers: 进程数，0表示CPU核数
+        :param progress: 进度计数，为None时新建
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.progress = progress or CompareProgress()
+        self.progress.update(workers=self.workers)
+        self.executor = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers,
+                                                                   mp_context=_process_context())
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def _run(self, func, tasks, on_result):
+        """
+        执行任务，按完成顺序把结果交给on_result；同时提交的任务数不超过进程数的两倍，任务参数按需生成
+        :param tasks: 可迭代对象，元素为 (key, 参数元组)
+        :param on_result: 接收 (key, 结果)
+        """
+        tasks = iter(tasks)
+        if self.executor is None:
+            for key, args in tasks:
+                self.progress.check()
+                on_result(key, func(*args))
+            return
+
+        pending = {}
+
+        def submit_next():
+            for key, args in tasks:
+                pending[self.executor.submit(func, *args)] = key
+                return True
+            return False
+
+        for _ in range(self.workers * 2):
+            if not submit_next():
+                break
+        while pending:
+            done, _ = concurrent.futures.wait(pending, timeout=0.5,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            if self.progress.cancelled:
+                for future in pending:
+                    future.cancel()
+                raise CompareCancelled('比较任务已取消')
+            for future in done:
+                key = pending.pop(future)
+                on_result(key, future.result())
+                submit_next()
+
+    def extract_fingerprints(self, jobs):
+        """
+        提取一批视频的指纹，每个视频是一个任务
+        :param jobs: [(VideoFingerprint, 需要的帧序号)]，指纹带有路径和帧数，只提取其中缺少的帧
+        :return: 补充后的VideoFingerprint列表，与jobs顺序一致，无法读取的视频帧数为None
+        """
+        fingerprints = [fingerprint for fingerprint, _ in jobs]
+        self.progress.update(stage='fingerprint', videos_total=len(jobs), videos_done=0)
+
+        def tasks():
+            for num, (fingerprint, indices) in enumerate(jobs):
+                missing = fingerprint.missing(indices) if fingerprint.frame_count is not None else []
+                if not missing:
+                    self.progress.add(videos_done=1)
+                    continue
+                yield num, (fingerprint.path, missing, fingerprint.frame_count)
+
+        def on_result(num, result):
+            frame_count, hists, error = result
+            fingerprint = fingerprints[num]
+            if error is not None:
+                logger.error(f"提取视频指纹时出错: {fingerprint.path} {error}")
+            fingerprint.frame_count = frame_count
+            fingerprint.hists.update(hists)
+            self.progress.add(videos_done=1)
+
+        self._run(_extract_task, tasks(), on_result)
+        return fingerprints
+
+    def find_similar_pairs(self, fingerprints: list, similarity_threshold=95, block_size: int = COMPARE_BLOCK_SIZE,
+                           new=None):
+        """
+        与 video_fingerprint.find_similar_pairs 结果相同，每块视频对是一个任务
+        :param new: 新视频的下标，不为None时只比较至少有一个是新视频的视频对
+        :return: [(i, j, 相似度百分比)]，i < j 为fingerprints中的下标，按 (i, j) 排序
+        """
+        blocks = list(iter_compare_blocks(fingerprints, block_size, new))
+        self.progress.update(stage='compare', blocks_total=len(blocks), blocks_done=0,
+                             pairs_total=sum(int(np.count_nonzero(row_rank[:, None] < column_rank[None, :]))
+                                             for _, _, _, row_rank, _, column_rank in blocks),
+                             pairs_done=0, similar_pairs=0)
+        results = []
+
+        def tasks(layout=None):
+            row_key = rows = None
+            for step, length, row_block, row_rank, column_block, column_rank in blocks:
+                pairs = int(np.count_nonzero(row_rank[:, None] < column_rank[None, :]))
+                if layout is None:
+                    # 在当前线程中执行时同一行块的各列块共用行数据
+                    if row_block is not row_key:
+                        row_key, rows = row_block, stack_rows(fingerprints, row_block, step, length)
+                    yield pairs, (fingerprints, step, length, row_block, row_rank, column_block, column_rank,
+                                  similarity_threshold, rows)
+                else:
+                    members = {int(member): layout[member] for member in np.union1d(row_block, column_block)}
+                    yield pairs, (hists_path, members, step, length, row_block, row_rank, column_block,
+                                  column_rank, similarity_threshold)
+
+        def on_result(pairs, found):
+            results.extend(found)
+            self.progress.add(blocks_done=1, pairs_done=pairs, similar_pairs=len(found))
+
+        if self.executor is None:
+            self._run(compare_block, tasks(), on_result)
+        else:
+            with tempfile.TemporaryDirectory(prefix='douyin-compare-', ignore_cleanup_errors=True) as work_dir:
+                hists_path = os.path.join(work_dir, 'hists.npy')
+                self._run(_compare_task, tasks(_write_hists(fingerprints, hists_path)), on_result)
+        results.sort()
+        return results
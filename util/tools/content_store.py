@@ -0,0 +1,137 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import logging
+
+from config import CONTENT_STORE_FOLDER, DB_PATH
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['ContentStore', 'get_content_store', 'new_hasher']
+
+_CREATE_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS content_ref (
+    path VARCHAR(255) PRIMARY KEY,
+    digest VARCHAR(64) NOT NULL,
+    sec_uid VARCHAR(100),
+    size INTEGER,
+    mtime_ns INTEGER,
+    created_at INTEGER
+)
+'''
+_CREATE_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS ix_content_ref_digest ON content_ref (digest)'
+# 之前创建的表缺少的列
+_NEW_COLUMNS = {'mtime_ns': 'INTEGER'}
+
+
+def new_hasher():
+    """
+    下载时使用的内容摘要算法
+    :return:
+    """
+    return hashlib.blake2b(digest_size=32)
+
+
+class ContentStore(object):
+    """
+    按内容摘要存放的文件仓库：每份内容只在 .blobs 目录下保存一次，
+    用户目录中的文件是指向它的硬链接，引用关系记录在 douyin.db 的 content_ref 表中
+    """
+
+    def __init__(self, store_folder: str = CONTENT_STORE_FOLDER, db_path: str = DB_PATH):
+        self.store_folder = store_folder
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(_CREATE_TABLE_SQL)
+            conn.execute(_CREATE_INDEX_SQL)
+            existing = {row[1] for row in conn.execute('PRAGMA table_info(content_ref)')}
+            for column, column_type in _NEW_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE content_ref ADD COLUMN {column} {column_type}')
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def blob_path(self, digest: str):
+        # 不带扩展名，避免被按 .mp4 遍历目录的比较逻辑重复处理
+        return os.path.join(self.store_folder, digest[:2], digest)
+
+    def add(self, file_name: str, digest: str, sec_uid: str = None):
+        """
+        把已下载的文件放入仓库，内容已存在时用硬链接替换该文件
+        :param file_name: 已下载完整的文件路径
+        :param digest: 文件内容摘要
+        :param sec_uid: 文件所属用户
+        :return: 已经引用同一内容的其他文件路径列表，非空即表示完全重复
+        """
+        blob = self.blob_path(digest)
+        with self.lock:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                if os.path.exists(blob):
+                    if not os.path.samefile(blob, file_name):
+                        tmp_name = file_name + '.link'
+                        os.link(blob, tmp_name)
+                        os.replace(tmp_name, file_name)
+                else:
+                    os.link(file_name, blob)
+            except OSError as e:
+                # 文件系统不支持硬链接时只记录引用关系
+                logger.info(f"无法创建硬链接, 仅记录内容摘要: {e}")
+            # 替换成硬链接后文件的修改时间是仓库文件的，链接完成后再记录
+            stat = os.stat(file_name)
+            with self._connect() as conn:
+                duplicates = [row[0] for row in conn.execute(
+                    "SELECT path FROM content_ref WHERE digest = ? AND path != ?", (digest, file_name))]
+                conn.execute(
+                    "INSERT OR REPLACE INTO content_ref (path, digest, sec_uid, size, mtime_ns, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (file_name, digest, sec_uid, stat.st_size, stat.st_mtime_ns, int(time.time()))
+                )
+        if duplicates:
+            logger.info(f"{file_name} 与已下载的 {duplicates[0]} 内容完全相同")
+        return duplicates
+
+    def refs(self, digest: str):
+        """
+        :param digest: 内容摘要
+        :return: 引用该内容的所有文件路径
+        """
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT path FROM content_ref WHERE digest = ?", (digest,))]
+
+    def digest_of(self, file_name: str):
+        """
+        :param file_name: 文件路径
+        :return: 记录的内容摘要，没有记录、文件不存在或大小和修改时间与记录时不同时返回None
+        """
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return None
+        with self._connect() as conn:
+            row = conn.execute("SELECT digest, size, mtime_ns FROM content_ref WHERE path = ?", (file_name,)).fetchone()
+        if row is None or (row[1], row[2]) != (stat.st_size, stat.st_mtime_ns):
+            return None
+        return row[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_content_store():
+    """
+    获取进程内共享的内容仓库
+    :return:
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ContentStore()
+    return _store
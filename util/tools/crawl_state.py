@@ -0,0 +1,159 @@
+import logging
+import sqlite3
+import threading
+import time
+
+from config import DB_PATH, PENDING_MAX_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['CrawlStateStore', 'get_crawl_state_store']
+
+_CREATE_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS crawl_state (
+    sec_uid VARCHAR(100) PRIMARY KEY,
+    newest_aweme_id VARCHAR(100),
+    newest_create_time INTEGER,
+    last_cursor INTEGER DEFAULT 0,
+    history_complete INTEGER DEFAULT 0,
+    updated_at INTEGER
+)
+'''
+_CREATE_PENDING_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS crawl_pending_video (
+    sec_uid VARCHAR(100),
+    aweme_id VARCHAR(100),
+    attempts INTEGER DEFAULT 0,
+    created_at INTEGER,
+    PRIMARY KEY (sec_uid, aweme_id)
+)
+'''
+
+# 早期版本的待下载表没有这些列，启动时补上
+_PENDING_NEW_COLUMNS = {'attempts': 'INTEGER DEFAULT 0'}
+
+_FIELDS = ('newest_aweme_id', 'newest_create_time', 'last_cursor', 'history_complete')
+
+
+class CrawlStateStore(object):
+    """
+    保存在 douyin.db 中的每个用户的抓取进度:
+    已见过的最新视频(水位线)、历史翻页的游标以及历史是否已抓取完整；
+    另外记录已列出但还没有下载成功的视频，水位线和游标越过它们之后仍可以重试
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(_CREATE_TABLE_SQL)
+            conn.execute(_CREATE_PENDING_TABLE_SQL)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(crawl_pending_video)")}
+            for column, column_type in _PENDING_NEW_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE crawl_pending_video ADD COLUMN {column} {column_type}")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(self, sec_uid: str):
+        """
+        :param sec_uid: 抖音用户的sec_uid
+        :return: 抓取进度字典，没有记录时返回None
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(_FIELDS)} FROM crawl_state WHERE sec_uid = ?", (sec_uid,)
+            ).fetchone()
+        if row is None:
+            return None
+        state = dict(zip(_FIELDS, row))
+        state['history_complete'] = bool(state['history_complete'])
+        return state
+
+    def save(self, sec_uid: str, **fields):
+        """
+        更新抓取进度，只写入传入的字段
+        :param sec_uid: 抖音用户的sec_uid
+        :param fields: newest_aweme_id/newest_create_time/last_cursor/history_complete
+        :return:
+        """
+        unknown = set(fields) - set(_FIELDS)
+        if unknown:
+            raise ValueError(f"未知的抓取进度字段: {unknown}")
+        if 'history_complete' in fields:
+            fields['history_complete'] = int(bool(fields['history_complete']))
+        fields['updated_at'] = int(time.time())
+        columns = list(fields)
+        with self.lock, self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO crawl_state (sec_uid) VALUES (?)", (sec_uid,))
+            conn.execute(
+                f"UPDATE crawl_state SET {', '.join(f'{c} = ?' for c in columns)} WHERE sec_uid = ?",
+                [fields[c] for c in columns] + [sec_uid]
+            )
+
+    def add_pending(self, sec_uid: str, aweme_id: str):
+        """
+        开始下载视频前记录，下载失败或被中断时下次增量抓取再重试
+        :param sec_uid: 抖音用户的sec_uid
+        :param aweme_id: 视频id
+        """
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO crawl_pending_video (sec_uid, aweme_id, created_at) VALUES (?, ?, ?)",
+                (sec_uid, aweme_id, int(time.time()))
+            )
+
+    def remove_pending(self, sec_uid: str, aweme_id: str):
+        """
+        视频下载成功或作品已不存在时移除记录
+        """
+        with self.lock, self._connect() as conn:
+            conn.execute("DELETE FROM crawl_pending_video WHERE sec_uid = ? AND aweme_id = ?", (sec_uid, aweme_id))
+
+    def record_failure(self, sec_uid: str, aweme_id: str, max_attempts: int = PENDING_MAX_ATTEMPTS):
+        """
+        记录一次下载失败，失败次数达到上限后放弃，不再重试
+        :param sec_uid: 抖音用户的sec_uid
+        :param aweme_id: 视频id
+        :param max_attempts: 最多尝试的次数
+        """
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE crawl_pending_video SET attempts = attempts + 1 WHERE sec_uid = ? AND aweme_id = ?",
+                (sec_uid, aweme_id)
+            )
+            deleted = conn.execute(
+                "DELETE FROM crawl_pending_video WHERE sec_uid = ? AND aweme_id = ? AND attempts >= ?",
+                (sec_uid, aweme_id, max_attempts)
+            ).rowcount
+        if deleted:
+            logger.warning(f'视频已失败{max_attempts}次，不再重试: {sec_uid} {aweme_id}')
+
+    def get_pending(self, sec_uid: str):
+        """
+        :param sec_uid: 抖音用户的sec_uid
+        :return: 等待重试的视频id列表，按记录的先后顺序
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT aweme_id FROM crawl_pending_video WHERE sec_uid = ? ORDER BY created_at, rowid",
+                (sec_uid,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_crawl_state_store():
+    """
+    获取进程内共享的抓取进度存储
+    :return:
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CrawlStateStore()
+    return _store
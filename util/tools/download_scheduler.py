@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from config import DOWNLOAD_MAX_CONCURRENT, DOWNLOAD_MAX_BANDWIDTH
+
+__all__ = ['DownloadScheduler', 'get_download_scheduler']
+
+
+class DownloadScheduler(object):
+    """
+    进程内所有CDN下载共用的调度器：
+    限制同时进行的下载数和总带宽，有空位时在任务之间轮转分配，同一任务内再在用户之间轮转，
+    避免一个视频很多的账号占满所有下载名额
+    """
+
+    def __init__(self, max_concurrent: int = DOWNLOAD_MAX_CONCURRENT, max_bandwidth: float = DOWNLOAD_MAX_BANDWIDTH):
+        """
+        :param max_concurrent: 同时进行的下载数上限
+        :param max_bandwidth: 所有下载的总带宽上限(字节/秒)，0表示不限
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_bandwidth = max_bandwidth
+        self.lock = threading.Lock()
+        self.waiting = OrderedDict()  # task_key -> OrderedDict(user_key -> deque[Event])
+        self.active = {}  # task_key -> 正在下载的数量
+        self.active_total = 0
+        self.bytes_transferred = 0
+        self.tokens = float(max_bandwidth)
+        self.updated_at = time.monotonic()
+
+    def _grant(self, task_key):
+        self.active[task_key] = self.active.get(task_key, 0) + 1
+        self.active_total += 1
+
+    def _dispatch(self):
+        while self.active_total < self.max_concurrent and self.waiting:
+            # 取出队首的任务后放到队尾，下次从下一个任务开始分配
+            task_key, users = next(iter(self.waiting.items()))
+            self.waiting.move_to_end(task_key)
+            user_key, waiters = next(iter(users.items()))
+            users.move_to_end(user_key)
+            event = waiters.popleft()
+            if not waiters:
+                del users[user_key]
+            if not users:
+                del self.waiting[task_key]
+            self._grant(task_key)
+            event.set()
+
+    def acquire(self, task_key, user_key):
+        """
+        等待下载名额
+        :param task_key: 所属任务，如Flask接口的线程ID
+        :param user_key: 所属用户sec_uid
+        """
+        with self.lock:
+            if self.active_total < self.max_concurrent and not self.waiting:
+                self._grant(task_key)
+                return
+            event = threading.Event()
+            self.waiting.setdefault(task_key, OrderedDict()).setdefault(user_key, deque()).append(event)
+        # 名额由 release 分配，计数也由 release 更新
+        event.wait()
+
+    def release(self, task_key):
+        with self.lock:
+            self.active[task_key] -= 1
+            if self.active[task_key] == 0:
+                del self.active[task_key]
+            self.active_total -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, task_key, user_key):
+        """
+        with scheduler.slot(task_key, sec_uid): 下载...
+        """
+        self.acquire(task_key, user_key)
+        try:
+            yield
+        finally:
+            self.release(task_key)
+
+    def throttle(self, nbytes: int):
+        """
+        记录下载的字节数，超过总带宽时阻塞当前线程
+        :param nbytes: 本次读到的字节数
+        """
+        with self.lock:
+            self.bytes_transferred += nbytes
+            if not self.max_bandwidth:
+                return
+            now = time.monotonic()
+            # 最多积累1秒的令牌，允许短时突发
+            self.tokens = min(self.max_bandwidth, self.tokens + (now - self.updated_at) * self.max_bandwidth)
+            self.updated_at = now
+            self.tokens -= nbytes
+            wait = -self.tokens / self.max_bandwidth if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+    def task_stats(self, task_key):
+        """
+        :param task_key: 任务标识
+        :return: 该任务正在下载和排队等待的数量，以及全局排队数
+        """
+        with self.lock:
+            users = self.waiting.get(task_key) or {}
+            return {
+                'active_downloads': self.active.get(task_key, 0),
+                'queue_depth': sum(len(waiters) for waiters in users.values()),
+                'global_queue_depth': self._waiting_total(),
+            }
+
+    def _waiting_total(self):
+        return sum(len(waiters) for users in self.waiting.values() for waiters in users.values())
+
+    def stats(self):
+        """
+        :return: 全局并发、排队和带宽使用情况
+        """
+        with self.lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_bandwidth': self.max_bandwidth,
+                'active': self.active_total,
+                'waiting': self._waiting_total(),
+                'bytes_transferred': self.bytes_transferred,
+                'tasks': {
+                    str(task_key): {
+                        'active': self.active.get(task_key, 0),
+                        'waiting': sum(len(waiters) for waiters in self.waiting.get(task_key, {}).values()),
+                    }
+                    for task_key in set(self.active) | set(self.waiting)
+                },
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_download_scheduler():
+    """
+    获取进程内共享的下载调度器，所有下载线程共用
+    :return:
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = DownloadScheduler()
+    return _scheduler
@@ -0,0 +1,310 @@
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import logging
+
+from config import IMAGE_DOWNLOAD_WORKERS, CHUNKED_DOWNLOAD_THRESHOLD, CHUNKED_DOWNLOAD_PARTS, \
+    CHUNKED_DOWNLOAD_WORKERS, CHUNKED_DOWNLOAD_BUFFER
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['download_file', 'download_file_ranges', 'download_files', 'get_remote_size']
+
+PART_SUFFIX = '.part'
+RANGES_SUFFIX = '.ranges'  # 分段下载的进度文件，与 .part 文件放在一起
+
+_CONTENT_RANGE_RE = re.compile(r'bytes\s+(?:(\d+)-(\d+)|\*)/(\d+)')
+
+
+def _total_from_content_range(content_range: str):
+    match = _CONTENT_RANGE_RE.match(content_range or '')
+    if match is None:
+        return None
+    return int(match.group(3))
+
+
+def _span_from_content_range(content_range: str):
+    match = _CONTENT_RANGE_RE.match(content_range or '')
+    if match is None or match.group(1) is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def get_remote_size(session, url: str, headers: dict = None):
+    """
+    通过HEAD请求获取远端文件大小
+    :return: 文件字节数，获取不到时返回None
+    """
+    try:
+        response = session.head(url, headers=headers, allow_redirects=True)
+    except Exception as e:
+        logger.info(f"获取文件大小失败: {e}")
+        return None
+    if response.status_code != 200:
+        return None
+    length = response.headers.get('Content-Length')
+    return int(length) if length is not None and length.isdigit() else None
+
+
+def _hash_file(hasher, file_name: str, chunk_size: int = 1024 * 1024):
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+
+
+def _load_range_state(state_file_name: str):
+    try:
+        with open(state_file_name, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_range_state(state_file_name: str, state: dict):
+    tmp_name = state_file_name + '.tmp'
+    with open(tmp_name, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_name, state_file_name)
+
+
+def _split_ranges(total_size: int, parts: int):
+    part_size = -(-total_size // parts)
+    return [[start, min(start + part_size, total_size) - 1] for start in range(0, total_size, part_size)]
+
+
+def download_file_ranges(session, url: str, real_file_name: str, total_size: int, headers: dict = None,
+                         parts: int = CHUNKED_DOWNLOAD_PARTS, hasher=None, throttle=None, slot=None):
+    """
+    分段并行下载：预分配 .part 文件，多个Range请求同时写入各自的区间，
+    完成的分段记录在 .part.ranges 中，中断后只重新下载未完成的分段
+    :param total_size: 文件总字节数
+    :param parts: 分段数
+    :param slot: 同 download_file，每个分段的请求各占一个名额
+    :return: 文件是否完整
+    """
+    headers = dict(headers or {})
+    slot = slot or nullcontext
+    part_file_name = real_file_name + PART_SUFFIX
+    state_file_name = part_file_name + RANGES_SUFFIX
+    state = _load_range_state(state_file_name)
+    if state is None or state.get('size') != total_size or not os.path.exists(part_file_name):
+        state = {'size': total_size, 'ranges': _split_ranges(total_size, parts), 'done': []}
+        with open(part_file_name, 'wb') as f:
+            f.truncate(total_size)
+        _save_range_state(state_file_name, state)
+    state_lock = threading.Lock()
+
+    def fetch(index):
+        start, end = state['ranges'][index]
+        range_headers = dict(headers)
+        range_headers['Range'] = f'bytes={start}-{end}'
+        written = 0
+        try:
+            with slot(), session.get(url, stream=True, headers=range_headers) as response:
+                if response.status_code != 206 or \
+                        _span_from_content_range(response.headers.get('Content-Range')) != (start, end):
+                    logger.info(f"分段{start}-{end}返回{response.status_code}, 放弃分段下载")
+                    return False
+                with open(part_file_name, 'r+b', buffering=CHUNKED_DOWNLOAD_BUFFER) as f:
+                    f.seek(start)
+                    for chunk in response.iter_content(chunk_size=CHUNKED_DOWNLOAD_BUFFER):
+                        f.write(chunk)
+                        written += len(chunk)
+                        if throttle is not None:
+                            throttle(len(chunk))
+        except Exception as e:
+            logger.info(f"分段{start}-{end}下载出错: {e}")
+            return False
+        if written != end - start + 1:
+            return False
+        with state_lock:
+            state['done'].append(index)
+            _save_range_state(state_file_name, state)
+        return True
+
+    pending = [index for index in range(len(state['ranges'])) if index not in state['done']]
+    logger.info(f"分{len(pending)}段并行下载({total_size}字节): {real_file_name}")
+    results = list(_get_range_executor().map(fetch, pending))
+    if not all(results):
+        logger.info(f"部分分段下载失败, 保留 {part_file_name} 以便续传")
+        return False
+    actual_size = os.path.getsize(part_file_name)
+    if actual_size != total_size:
+        logger.info(f"文件大小不一致(期望{total_size}, 实际{actual_size})")
+        return False
+    # 分段是乱序写入的，完成后再统一计算摘要
+    if hasher is not None:
+        _hash_file(hasher, part_file_name)
+    os.replace(part_file_name, real_file_name)
+    os.remove(state_file_name)
+    return True
+
+
+def download_file(session, url: str, real_file_name: str, headers: dict = None, chunk_size: int = 8192,
+                  hasher=None, throttle=None, parallel_threshold: int = CHUNKED_DOWNLOAD_THRESHOLD, slot=None,
+                  hash_existing: bool = True):
+    """
+    断点续传下载：先写入 .part 文件，用Range请求续传，校验大小后再原子重命名
+    :param session: requests.Session
+    :param url: 下载地址
+    :param real_file_name: 最终保存的文件路径
+    :param headers: 请求头
+    :param chunk_size: 每次写入的字节数
+    :param hasher: hashlib的哈希对象，传入时边下载边计算文件内容摘要
+    :param throttle: 每读到一块数据时以字节数调用，用于全局限速
+    :param parallel_threshold: 文件不小于该字节数且服务端支持Range时分段并行下载，0表示总是单连接
+    :param slot: 返回上下文管理器的函数，每个请求在其中进行，用于全局调度；分段下载时每个分段各占一个名额
+    :param hash_existing: 文件已完整存在而跳过下载时是否读取文件计算摘要，调用方已有记录的摘要时传False
+    :return: 文件是否完整
+    """
+    headers = dict(headers or {})
+    slot = slot or nullcontext
+    if os.path.exists(real_file_name):
+        with slot():
+            remote_size = get_remote_size(session, url, headers)
+        # 最终文件只在校验大小后才重命名生成，获取不到远端大小时按完整处理，只有确定大小不一致才重新下载
+        if remote_size is None or os.path.getsize(real_file_name) == remote_size:
+            logger.info(f"文件已完整存在, 跳过下载: {real_file_name}")
+            if hasher is not None and hash_existing:
+                _hash_file(hasher, real_file_name)
+            return True
+        logger.info(f"文件大小与远端不一致(远端{remote_size}), 重新下载: {real_file_name}")
+        os.remove(real_file_name)
+
+    part_file_name = real_file_name + PART_SUFFIX
+    state = _load_range_state(part_file_name + RANGES_SUFFIX)
+    if state is not None:
+        # 上次是分段下载的，.part 已预分配到完整大小，不能按文件大小续传
+        return download_file_ranges(session, url, real_file_name, state['size'], headers,
+                                    hasher=hasher, throttle=throttle, slot=slot)
+
+    offset = os.path.getsize(part_file_name) if os.path.exists(part_file_name) else 0
+    if offset > 0:
+        headers['Range'] = f'bytes={offset}-'
+    elif parallel_threshold:
+        # 用Range请求拿到文件总大小，小文件直接沿用这个响应单连接下载
+        headers['Range'] = 'bytes=0-'
+
+    parallel_size = None
+    # 单连接下载的名额在进入分段下载前释放，分段各自领取名额
+    with slot(), session.get(url, stream=True, headers=headers) as response:
+        if response.status_code == 206 and offset == 0 and parallel_threshold:
+            total_size = _total_from_content_range(response.headers.get('Content-Range'))
+            if total_size is not None and total_size >= parallel_threshold:
+                parallel_size = total_size
+        if parallel_size is not None:
+            # 大文件不读这个响应的内容，改为分段下载
+            expected_size = parallel_size
+        elif response.status_code == 416:
+            # 请求的起点已超出文件末尾，只有返回了 bytes */总大小 且与 .part 大小一致时才说明已下载完整
+            expected_size = _total_from_content_range(response.headers.get('Content-Range'))
+            if offset == 0 or expected_size != offset:
+                logger.info(f"续传位置{offset}超出范围({response.headers.get('Content-Range')}), "
+                            f"丢弃 {part_file_name}")
+                if os.path.exists(part_file_name):
+                    os.remove(part_file_name)
+                return False
+            if hasher is not None:
+                _hash_file(hasher, part_file_name)
+        elif response.status_code == 206:
+            expected_size = _total_from_content_range(response.headers.get('Content-Range'))
+            span = _span_from_content_range(response.headers.get('Content-Range'))
+            if span is None or span[0] != offset:
+                if span is None or span[0] != 0:
+                    logger.info(f"返回的区间{response.headers.get('Content-Range')}与续传位置{offset}不一致, "
+                                f"丢弃 {part_file_name}")
+                    if os.path.exists(part_file_name):
+                        os.remove(part_file_name)
+                    return False
+                # 服务端忽略了续传位置，从头返回了内容
+                logger.info(f"服务端从头返回内容, 重新下载: {real_file_name}")
+                offset = 0
+            if offset > 0:
+                logger.info(f"从第{offset}字节继续下载: {real_file_name}")
+                if hasher is not None:
+                    _hash_file(hasher, part_file_name)
+            with open(part_file_name, 'ab' if offset > 0 else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    if throttle is not None:
+                        throttle(len(chunk))
+        elif response.status_code == 200:
+            # 服务端不支持Range时从头下载
+            length = response.headers.get('Content-Length')
+            expected_size = int(length) if length is not None and length.isdigit() else None
+            with open(part_file_name, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    if throttle is not None:
+                        throttle(len(chunk))
+        else:
+            logger.info(f"错误{response.status_code}")
+            return False
+
+    if parallel_size is not None:
+        return download_file_ranges(session, url, real_file_name, parallel_size, headers,
+                                    hasher=hasher, throttle=throttle, slot=slot)
+
+    actual_size = os.path.getsize(part_file_name) if os.path.exists(part_file_name) else 0
+    if expected_size is not None and actual_size != expected_size:
+        logger.info(f"文件大小不一致(期望{expected_size}, 实际{actual_size}), 保留 {part_file_name} 以便续传")
+        return False
+    os.replace(part_file_name, real_file_name)
+    return True
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # 所有线程共用一个线程池，总并发不会随下载线程数增长
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=IMAGE_DOWNLOAD_WORKERS, thread_name_prefix='file-download')
+    return _executor
+
+
+_range_executor = None
+
+
+def _get_range_executor():
+    # 分段请求单独一个线程池，与图片下载的线程池互不占用
+    global _range_executor
+    if _range_executor is None:
+        with _executor_lock:
+            if _range_executor is None:
+                _range_executor = ThreadPoolExecutor(max_workers=CHUNKED_DOWNLOAD_WORKERS,
+                                                     thread_name_prefix='range-download')
+    return _range_executor
+
+
+def download_files(session, items: list, headers: dict = None, slot=None, throttle=None):
+    """
+    并发下载多个文件，并发数由 IMAGE_DOWNLOAD_WORKERS 限制
+    :param session: requests.Session
+    :param items: [(下载地址, 保存路径)]
+    :param headers: 请求头
+    :param slot: 同 download_file
+    :param throttle: 同 download_file
+    :return: 与items一一对应的是否下载完整
+    """
+    def fetch(item):
+        url, real_file_name = item
+        try:
+            return download_file(session, url, real_file_name, headers, throttle=throttle, slot=slot)
+        except Exception as e:
+            logger.info(f"下载 {url} 出错: {e}")
+            return False
+
+    return list(_get_executor().map(fetch, items))
@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+
+import logging
+
+from config import EXPORT_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['VideoMetaExporter', 'load_videos', 'iter_ndjson', 'EXPORT_COLUMNS']
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.json
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 导出的列及类型，与 VideoMeta 的字段一一对应，另加所属用户
+EXPORT_COLUMNS = (
+    ('sec_uid', 'string'),
+    ('aweme_id', 'string'),
+    ('nickname', 'string'),
+    ('desc', 'string'),
+    ('preview_title', 'string'),
+    ('create_time', 'int64'),
+    ('is_video', 'bool'),
+    ('links', 'list<string>'),
+    ('cover_url', 'string'),
+    ('admire_count', 'int64'),
+    ('comment_count', 'int64'),
+)
+
+_FORMATS = {
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+}
+
+
+def _detect_format(file_name: str):
+    fmt = _FORMATS.get(os.path.splitext(file_name)[1].lower())
+    if fmt is None:
+        raise ValueError(f"无法根据扩展名判断导出格式: {file_name}, 支持 {', '.join(_FORMATS)}")
+    return fmt
+
+
+def _require_pyarrow(fmt: str):
+    if pyarrow is None:
+        raise ImportError(f"导出/读取 {fmt} 需要安装 pyarrow")
+
+
+def _arrow_schema():
+    types = {
+        'string': pyarrow.string(),
+        'int64': pyarrow.int64(),
+        'bool': pyarrow.bool_(),
+        'list<string>': pyarrow.list_(pyarrow.string()),
+    }
+    return pyarrow.schema([(name, types[type_name]) for name, type_name in EXPORT_COLUMNS])
+
+
+def _dumps(row: dict):
+    if orjson is not None:
+        return orjson.dumps(row) + b'\n'
+    return json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+class VideoMetaExporter(object):
+    """
+    边抓取边导出视频元数据，格式由扩展名决定：
+    .ndjson/.jsonl 每条一行JSON，.parquet/.arrow 按 EXPORT_COLUMNS 的类型分批写入列式文件
+    """
+
+    def __init__(self, file_name: str, batch_size: int = EXPORT_BATCH_SIZE):
+        self.file_name = file_name
+        self.format = _detect_format(file_name)
+        if self.format != 'ndjson':
+            _require_pyarrow(self.format)
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.rows = 0
+        self._buffer = []
+        self._file = None
+        self._writer = None
+        save_dir = os.path.dirname(file_name)
+        if save_dir and not os.path.exists(save_dir):
+            os.makedirs(save_dir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _open(self):
+        if self.format == 'ndjson':
+            # NDJSON可以直接追加，多次运行的结果写在同一个文件里
+            self._file = open(self.file_name, 'ab')
+        elif self.format == 'parquet':
+            self._writer = pyarrow.parquet.ParquetWriter(self.file_name, _arrow_schema())
+        else:
+            self._file = pyarrow.OSFile(self.file_name, 'wb')
+            self._writer = pyarrow.ipc.new_file(self._file, _arrow_schema())
+
+    def write(self, video_meta, sec_uid: str = None):
+        """
+        写入一条视频元数据，攒够 batch_size 条后落盘
+        :param video_meta: VideoMeta
+        :param sec_uid: 视频所属用户
+        :return:
+        """
+        row = video_meta.to_dict()
+        row['sec_uid'] = sec_uid
+        with self.lock:
+            self._buffer.append(row)
+            self.rows += 1
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        if self._file is None and self._writer is None:
+            self._open()
+        if self.format == 'ndjson':
+            self._file.write(b''.join(_dumps(row) for row in self._buffer))
+            self._file.flush()
+        else:
+            batch = pyarrow.RecordBatch.from_pylist(self._buffer, schema=_arrow_schema())
+            self._writer.write_batch(batch)
+        self._buffer = []
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        logger.info(f"已导出 {self.rows} 条视频信息到 {self.file_name}")
+
+
+def iter_ndjson(file_name: str):
+    """
+    逐行读取NDJSON导出文件，不依赖pyarrow
+    :return: dict 生成器
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    with open(file_name, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield loads(line)
+
+
+def load_videos(file_name: str, columns: list = None):
+    """
+    读取导出文件用于后续分析，需要DataFrame时调用返回值的 to_pandas()
+    :param file_name: VideoMetaExporter 导出的文件
+    :param columns: 只读取指定的列，列式格式下其余列不会被解码
+    :return: pyarrow.Table
+    """
+    fmt = _detect_format(file_name)
+    _require_pyarrow(fmt)
+    if fmt == 'parquet':
+        return pyarrow.parquet.read_table(file_name, columns=columns)
+    if fmt == 'arrow':
+        # 内存映射读取，不复制数据；映射随table的引用释放
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(file_name, 'r')).read_all()
+    else:
+        table = pyarrow.json.read_json(file_name, parse_options=pyarrow.json.ParseOptions(
+            explicit_schema=_arrow_schema()))
+    return table.select(columns) if columns else table
@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import logging
+import numpy as np
+
+from config import DB_PATH
+from tools.video_fingerprint import HIST_BINS, VideoFingerprint
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['FingerprintIndex', 'get_fingerprint_index']
+
+_CREATE_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS video_fingerprint (
+    path VARCHAR(255) PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    frame_count INTEGER,
+    indices BLOB,
+    hists BLOB,
+    updated_at INTEGER
+)
+'''
+# 一次查询的路径数，不超过sqlite的参数个数限制
+_QUERY_CHUNK = 500
+
+
+def _file_key(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class FingerprintIndex(object):
+    """
+    已下载视频的指纹索引，记录在 douyin.db 的 video_fingerprint 表中：
+    文件大小和修改时间没有变化时直接使用记录的帧数和直方图，比较时只需要解码新视频和缺少的帧
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(_CREATE_TABLE_SQL)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def load(self, paths):
+        """
+        :param paths: 视频文件路径
+        :return: {路径: VideoFingerprint}，键与传入的路径相同，没有记录或文件已变化的视频不包含在内
+        """
+        keys = {os.path.abspath(path): path for path in paths}
+        fingerprints = {}
+        names = list(keys)
+        with self._connect() as conn:
+            for start in range(0, len(names), _QUERY_CHUNK):
+                chunk = names[start:start + _QUERY_CHUNK]
+                rows = conn.execute(
+                    f"SELECT path, size, mtime_ns, frame_count, indices, hists FROM video_fingerprint "
+                    f"WHERE path IN ({','.join('?' * len(chunk))})", chunk)
+                for name, size, mtime_ns, frame_count, indices, hists in rows:
+                    path = keys[name]
+                    if _file_key(path) != (size, mtime_ns):
+                        continue
+                    indices = np.frombuffer(indices, dtype=np.int32).tolist()
+                    hists = np.frombuffer(zlib.decompress(hists), dtype=np.float32).reshape(
+                        len(indices), HIST_BINS[0] * HIST_BINS[1] * HIST_BINS[2])
+                    fingerprints[path] = VideoFingerprint(path, frame_count, dict(zip(indices, hists)))
+        return fingerprints
+
+    def save(self, fingerprints):
+        """
+        记录视频指纹，无法读取的视频也记录下来(帧数为None)，文件不变时不再重试
+        :param fingerprints: VideoFingerprint列表
+        """
+        rows = []
+        now = int(time.time())
+        for fingerprint in fingerprints:
+            file_key = _file_key(fingerprint.path)
+            if file_key is None:
+                continue
+            indices = sorted(fingerprint.hists)
+            hists = np.stack([fingerprint.hists[index] for index in indices]).astype(np.float32) if indices else \
+                np.empty((0, HIST_BINS[0] * HIST_BINS[1] * HIST_BINS[2]), dtype=np.float32)
+            rows.append((os.path.abspath(fingerprint.path), file_key[0], file_key[1], fingerprint.frame_count,
+                         np.array(indices, dtype=np.int32).tobytes(), zlib.compress(hists.tobytes()), now))
+        if not rows:
+            return
+        with self.lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO video_fingerprint (path, size, mtime_ns, frame_count, indices, hists, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        logger.info(f"记录了 {len(rows)} 个视频的指纹")
+
+    def prune(self, folder: str, paths):
+        """
+        删除folder下已不存在的视频的记录
+        :param folder: 目录
+        :param paths: folder下现有的视频文件路径
+        :return: 删除的记录数
+        """
+        prefix = os.path.join(os.path.abspath(folder), '')
+        existing = set(os.path.abspath(path) for path in paths)
+        with self.lock, self._connect() as conn:
+            stale = [(name,) for (name,) in conn.execute("SELECT path FROM video_fingerprint")
+                     if name.startswith(prefix) and name not in existing]
+            conn.executemany("DELETE FROM video_fingerprint WHERE path = ?", stale)
+        return len(stale)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_fingerprint_index():
+    """
+    获取进程内共享的指纹索引
+    :return:
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = FingerprintIndex()
+    return _index
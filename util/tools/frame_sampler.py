@@ -0,0 +1,40 @@
+import cv2
+
+__all__ = ['SAMPLE_SIZE', 'sample_step', 'iter_sampled_frames']
+
+SAMPLE_SIZE = (320, 240)  # 比较前把帧缩放到的大小
+
+
+def sample_step(frame_count: int, samples: int = 100):
+    """
+    :param frame_count: 参与比较的帧数
+    :param samples: 大约采样多少帧
+    :return: 采样间隔
+    """
+    return max(1, frame_count // samples)
+
+
+def iter_sampled_frames(cap, frame_count: int, step: int, size=SAMPLE_SIZE):
+    """
+    顺序读取视频，只在采样点解码出图像：
+    grab() 只解码不转换，retrieve() 才生成图像，不需要像 set(CAP_PROP_POS_FRAMES) 那样每次从关键帧重新解码
+    :param cap: cv2.VideoCapture
+    :param frame_count: 只读取前多少帧
+    :param step: 采样间隔
+    :param size: 缩放后的大小，为None时不缩放
+    :return: 生成器，依次产出每个采样点 (帧序号, 图像)，读取失败的采样点图像为None
+    """
+    # 最后一个采样点之后的帧不需要解码
+    last = (frame_count - 1) // step * step
+    for index in range(last + 1):
+        if not cap.grab():
+            # 实际帧数可能比 CAP_PROP_FRAME_COUNT 少
+            return
+        if index % step:
+            continue
+        ret, frame = cap.retrieve()
+        if not ret:
+            yield index, None
+            continue
+        yield index, cv2.resize(frame, size) if size else frame
+
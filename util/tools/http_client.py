@@ -0,0 +1,122 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_TIMEOUT, HTTP_MAX_RETRIES, HTTP_BACKOFF_FACTOR
+
+__all__ = ['get_session', 'get_connection_stats', 'DEFAULT_TIMEOUT']
+
+DEFAULT_TIMEOUT = HTTP_TIMEOUT
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    带默认超时的连接池适配器，每个host对应一个独立的连接池
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+    def connection_stats(self):
+        """
+        统计各host连接池的新建连接数与请求数
+        :return: {host: {'connections': 新建连接数, 'requests': 请求数}}
+        """
+        stats = {}
+        pools = self.poolmanager.pools
+        with pools.lock:
+            keys = list(pools.keys())
+        for key in keys:
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}:{pool.port}"
+            item = stats.setdefault(host, {'connections': 0, 'requests': 0})
+            item['connections'] += pool.num_connections
+            item['requests'] += pool.num_requests
+        return stats
+
+
+def create_session(pool_connections: int = HTTP_POOL_CONNECTIONS, pool_maxsize: int = HTTP_POOL_MAXSIZE,
+                   timeout=DEFAULT_TIMEOUT, max_retries: int = HTTP_MAX_RETRIES,
+                   backoff_factor: float = HTTP_BACKOFF_FACTOR):
+    """
+    创建带连接池、keep-alive、超时与重试的Session
+    :param pool_connections: 最多缓存多少个host的连接池
+    :param pool_maxsize: 每个host最多保持的连接数
+    :param timeout: 默认超时时间(秒)，可以是(连接超时, 读取超时)
+    :param max_retries: 最大重试次数
+    :param backoff_factor: 重试退避系数
+    :return:
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        # 429 不在这里重试，交给上层的限速器、会话池和熔断器处理
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+    )
+    adapter = PooledHTTPAdapter(
+        timeout=timeout,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+        pool_block=False,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    获取进程内共享的Session，所有下载线程共用同一组连接池
+    :return:
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def get_connection_stats():
+    """
+    获取共享Session的连接复用统计
+    :return:
+    """
+    session = get_session()
+    hosts = {}
+    for adapter in set(session.adapters.values()):
+        if isinstance(adapter, PooledHTTPAdapter):
+            for host, item in adapter.connection_stats().items():
+                total = hosts.setdefault(host, {'connections': 0, 'requests': 0})
+                total['connections'] += item['connections']
+                total['requests'] += item['requests']
+    connections = sum(item['connections'] for item in hosts.values())
+    requests_count = sum(item['requests'] for item in hosts.values())
+    reuse_rate = 1 - connections / requests_count if requests_count else 0.0
+    return {
+        'connections': connections,
+        'requests': requests_count,
+        'reuse_rate': reuse_rate,
+        'hosts': hosts,
+    }
@@ -0,0 +1,121 @@
+import json
+import threading
+
+from config import PAGE_DECODER
+
+__all__ = ['decode_page', 'slim_aweme', 'available_decoders', 'DECODERS']
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DECODERS = ('simdjson', 'orjson', 'json')
+
+# 不保留原始数据时每页只保留这些字段，各种解析方式的结果相同
+PAGE_KEYS = ('status_code', 'has_more', 'max_cursor')
+
+_local = threading.local()
+
+
+def available_decoders():
+    """
+    :return: 当前环境可用的解析方式，按速度从快到慢排列
+    """
+    result = []
+    if simdjson is not None:
+        result.append('simdjson')
+    if orjson is not None:
+        result.append('orjson')
+    result.append('json')
+    return result
+
+
+def _first(url_list, index=0):
+    if not url_list:
+        return []
+    return [url_list[index]]
+
+
+def slim_aweme(aweme):
+    """
+    只提取抓取流程用到的字段，返回结构与原始aweme一致的普通dict
+    :param aweme: 原始aweme数据(dict或simdjson的惰性对象)
+    :return:
+    """
+    author = aweme.get('author') or {}
+    statistics = aweme.get('statistics') or {}
+    result = {
+        'aweme_id': aweme['aweme_id'],
+        'create_time': aweme.get('create_time', 0),
+        'is_top': aweme.get('is_top', 0),
+        'desc': aweme.get('desc', ''),
+        'preview_title': aweme.get('preview_title'),
+        'author': {'nickname': author.get('nickname', '')},
+        'statistics': {
+            'admire_count': statistics.get('admire_count', 0),
+            'comment_count': statistics.get('comment_count', 0),
+        },
+        'images': None,
+    }
+    images = aweme.get('images')
+    if images is None:
+        video = aweme.get('video') or {}
+        result['video'] = {
+            'play_addr': {'url_list': _first((video.get('play_addr') or {}).get('url_list'))},
+            'cover': {'url_list': _first((video.get('cover') or {}).get('url_list'))},
+        }
+    else:
+        result['images'] = [{'url_list': _first(image.get('url_list'), -1)} for image in images]
+    return result
+
+
+def _decode_simdjson(content: bytes, keep_raw: bool):
+    # Parser复用内部缓冲区，每个线程一个，且文档对象只在下一次parse前有效
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        parser = _local.parser = simdjson.Parser()
+    doc = parser.parse(content)
+    if keep_raw:
+        return doc.as_dict()
+    result = {}
+    for key in PAGE_KEYS:
+        if key in doc:
+            result[key] = doc[key]
+    if 'aweme_list' in doc:
+        aweme_list = doc['aweme_list']
+        result['aweme_list'] = None if aweme_list is None else [slim_aweme(aweme) for aweme in aweme_list]
+    return result
+
+
+def _decode_full(loads, content: bytes, keep_raw: bool):
+    doc = loads(content)
+    if keep_raw or not isinstance(doc, dict):
+        return doc
+    result = {key: doc[key] for key in PAGE_KEYS if key in doc}
+    if 'aweme_list' in doc:
+        aweme_list = doc['aweme_list']
+        result['aweme_list'] = None if aweme_list is None else [slim_aweme(aweme) for aweme in aweme_list]
+    return result
+
+
+def decode_page(content: bytes, keep_raw: bool = False, decoder: str = PAGE_DECODER):
+    """
+    直接从响应字节解析 aweme/post 接口数据
+    :param content: 响应体
+    :param keep_raw: 是否保留完整的aweme数据，为False时只保留抓取用到的字段
+    :param decoder: auto/simdjson/orjson/json，auto时使用可用的最快方式
+    :return:
+    """
+    if decoder == 'auto':
+        decoder = available_decoders()[0]
+    if decoder == 'simdjson' and simdjson is not None:
+        return _decode_simdjson(content, keep_raw)
+    if decoder in ('simdjson', 'orjson') and orjson is not None:
+        return _decode_full(orjson.loads, content, keep_raw)
+    return _decode_full(json.loads, content, keep_raw)
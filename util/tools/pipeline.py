@@ -0,0 +1,201 @@
+import queue
+import threading
+import time
+
+import logging
+
+from config import PIPELINE_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['Stage', 'Pipeline']
+
+# 队列结束标记，每个下游worker收到一个后退出
+_DONE = object()
+
+
+class Stage(object):
+    """
+    流水线中的一个环节，有自己的输入队列和worker数
+    """
+
+    def __init__(self, name: str, func, workers: int = 1, queue_size: int = PIPELINE_QUEUE_SIZE,
+                 fanout: bool = False):
+        """
+        :param name: 环节名称
+        :param func: 处理函数，接收一个元素，返回None时丢弃该元素
+        :param workers: 并发处理的线程数
+        :param queue_size: 输入队列长度，队列满时上游阻塞等待(背压)
+        :param fanout: 为True时func返回可迭代对象，其中每个元素分别传给下游
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.fanout = fanout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.processed = 0  # 已处理的输入数
+        self.emitted = 0  # 传给下游的元素数
+        self.failed = 0
+        self.errors = []  # 处理出错的 (输入, 异常)
+        self.busy = 0.0  # 所有worker处理元素的累计耗时(秒)
+        self.blocked = 0.0  # 等待下游队列空位的累计耗时(秒)
+        self.started_at = None
+        self.finished_at = None
+
+    def stats(self):
+        """
+        :return: 该环节的吞吐量和队列情况
+        """
+        with self.lock:
+            end = self.finished_at or time.monotonic()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            return {
+                'workers': self.workers,
+                'queue_depth': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                'processed': self.processed,
+                'emitted': self.emitted,
+                'failed': self.failed,
+                'items_per_sec': self.processed / elapsed if elapsed else 0.0,
+                'busy_seconds': round(self.busy, 3),
+                'blocked_seconds': round(self.blocked, 3),
+            }
+
+
+class Pipeline(object):
+    """
+    多环节流水线，环节之间用有界队列连接：
+    每个环节独立并发，网络、磁盘和CPU的工作可以同时进行，下游处理不过来时上游自动放慢
+    """
+
+    def __init__(self, stages: list, name: str = 'pipeline', stop_event: threading.Event = None):
+        """
+        :param stages: 按顺序排列的环节
+        :param name: 流水线名称，用于日志和线程名
+        :param stop_event: 外部的停止信号，设置后效果与stop()相同，为None时新建
+        """
+        self.stages = stages
+        self.name = name
+        self.results = []
+        self.results_lock = threading.Lock()
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self._threads = []
+
+    def _put(self, stage_index: int, item):
+        # 最后一个环节的输出就是结果
+        if stage_index >= len(self.stages):
+            if item is not _DONE:
+                with self.results_lock:
+                    self.results.append(item)
+            return True
+        target = self.stages[stage_index].queue
+        while not self.stop_event.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _emit(self, stage: Stage, stage_index: int, item):
+        start = time.monotonic()
+        ok = self._put(stage_index + 1, item)
+        with stage.lock:
+            stage.blocked += time.monotonic() - start
+            if ok:
+                stage.emitted += 1
+        return ok
+
+    def _worker(self, stage: Stage, stage_index: int, remaining: list):
+        while True:
+            item = stage.queue.get()
+            if item is _DONE:
+                break
+            if self.stop_event.is_set():
+                continue
+            start = time.monotonic()
+            try:
+                output = stage.func(item)
+                if stage.fanout:
+                    for value in output or ():
+                        if value is not None and not self._emit(stage, stage_index, value):
+                            break
+                elif output is not None:
+                    self._emit(stage, stage_index, output)
+            except Exception as e:
+                with stage.lock:
+                    stage.failed += 1
+                    stage.errors.append((item, e))
+                logger.error(f"[{self.name}] {stage.name} 处理 {item!r} 出错: {e}")
+            with stage.lock:
+                stage.processed += 1
+                stage.busy += time.monotonic() - start
+
+        # 本环节最后一个worker退出时通知下游结束
+        with stage.lock:
+            remaining[stage_index] -= 1
+            last = remaining[stage_index] == 0
+            if last:
+                stage.finished_at = time.monotonic()
+        if last:
+            next_index = stage_index + 1
+            if next_index < len(self.stages):
+                for _ in range(self.stages[next_index].workers):
+                    self.stages[next_index].queue.put(_DONE)
+
+    def start(self, source):
+        """
+        启动所有环节，从source中读取元素送入第一个环节
+        :param source: 可迭代对象
+        :return:
+        """
+        remaining = [stage.workers for stage in self.stages]
+        now = time.monotonic()
+        for index, stage in enumerate(self.stages):
+            stage.started_at = now
+            for num in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(stage, index, remaining),
+                                          name=f'{self.name}-{stage.name}-{num}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+        def feed():
+            try:
+                for item in source:
+                    if not self._put(0, item):
+                        break
+            except Exception as e:
+                logger.error(f"[{self.name}] 读取输入出错: {e}")
+            finally:
+                for _ in range(self.stages[0].workers):
+                    self.stages[0].queue.put(_DONE)
+
+        feeder = threading.Thread(target=feed, name=f'{self.name}-feed', daemon=True)
+        feeder.start()
+        self._threads.append(feeder)
+
+    def join(self):
+        """
+        等待所有环节处理完毕
+        :return: 最后一个环节输出的元素列表
+        """
+        for thread in self._threads:
+            thread.join()
+        return self.results
+
+    def run(self, source):
+        self.start(source)
+        return self.join()
+
+    def stop(self):
+        """
+        停止接收新元素，正在处理的元素完成后退出
+        """
+        self.stop_event.set()
+
+    def stats(self):
+        """
+        :return: {环节名称: 吞吐量和队列情况}
+        """
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import threading
+import time
+import urllib.parse
+
+from config import (RATE_LIMIT_INITIAL, RATE_LIMIT_MIN, RATE_LIMIT_MAX, RATE_LIMIT_BURST,
+                    RATE_LIMIT_INCREASE, RATE_LIMIT_DECREASE)
+
+__all__ = ['AdaptiveRateLimiter', 'get_rate_limiter', 'limiter_key']
+
+
+def limiter_key(url: str, cookie: str = ''):
+    """
+    限速的粒度为 host + cookie，同一身份访问同一host的所有线程共享一个令牌桶
+    :param url: 请求地址
+    :param cookie: 请求使用的cookie
+    :return:
+    """
+    host = urllib.parse.urlparse(url).netloc
+    cookie_id = hashlib.md5((cookie or '').encode('utf-8')).hexdigest()[:8]
+    return f"{host}|{cookie_id}"
+
+
+class _Bucket(object):
+    __slots__ = ('rate', 'tokens', 'updated_at', 'successes', 'failures')
+
+    def __init__(self, rate: float, tokens: float):
+        self.rate = rate
+        self.tokens = tokens
+        self.updated_at = time.monotonic()
+        self.successes = 0
+        self.failures = 0
+
+
+class AdaptiveRateLimiter(object):
+    """
+    令牌桶 + AIMD 的自适应限速器：
+    响应正常时速率线性增加，出错或被限流时速率成倍下降
+    """
+
+    def __init__(self, initial_rate: float = RATE_LIMIT_INITIAL, min_rate: float = RATE_LIMIT_MIN,
+                 max_rate: float = RATE_LIMIT_MAX, burst: float = RATE_LIMIT_BURST,
+                 increase: float = RATE_LIMIT_INCREASE, decrease: float = RATE_LIMIT_DECREASE):
+        """
+        :param initial_rate: 初始速率(次/秒)
+        :param min_rate: 最低速率
+        :param max_rate: 最高速率
+        :param burst: 令牌桶容量，允许的突发请求数
+        :param increase: 每次成功后增加的速率
+        :param decrease: 每次失败后速率乘以的系数
+        """
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def _bucket(self, key: str):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = _Bucket(self.initial_rate, min(1.0, self.burst))
+            self.buckets[key] = bucket
+        return bucket
+
+    def reserve(self, key: str):
+        """
+        预占一个令牌
+        :param key: 限速key
+        :return: 需要等待的秒数
+        """
+        with self.lock:
+            bucket = self._bucket(key)
+            now = time.monotonic()
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at) * bucket.rate)
+            bucket.updated_at = now
+            # 令牌可以透支，排在后面的请求等待更久，保证先到先得
+            bucket.tokens -= 1
+            if bucket.tokens >= 0:
+                return 0.0
+            return -bucket.tokens / bucket.rate
+
+    def acquire(self, key: str):
+        """
+        阻塞直到可以发出请求
+        :param key: 限速key
+        :return:
+        """
+        wait = self.reserve(key)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, key: str):
+        """
+        acquire 的协程版本
+        :param key: 限速key
+        :return:
+        """
+        wait = self.reserve(key)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def report(self, key: str, healthy: bool):
+        """
+        根据响应情况调整速率
+        :param key: 限速key
+        :param healthy: 响应是否正常
+        :return:
+        """
+        with self.lock:
+            bucket = self._bucket(key)
+            if healthy:
+                bucket.successes += 1
+                bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+            else:
+                bucket.failures += 1
+                bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+
+    def stats(self):
+        """
+        获取各限速key的当前速率与成功失败次数
+        :return:
+        """
+        with self.lock:
+            return {
+                key: {'rate': bucket.rate, 'successes': bucket.successes, 'failures': bucket.failures}
+                for key, bucket in self.buckets.items()
+            }
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    获取进程内共享的限速器，所有抓取线程与协程共用
+    :return:
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = AdaptiveRateLimiter()
+    return _rate_limiter
@@ -0,0 +1,83 @@
+import random
+
+import requests
+
+from config import PAGE_RETRY_BACKOFF, PAGE_RETRY_MAX_BACKOFF
+
+__all__ = ['THROTTLED', 'TRANSIENT', 'FATAL', 'PageFetchError', 'check_response', 'check_page', 'classify_error',
+           'backoff_delay']
+
+# 失败的类型：被限流和临时错误可以重试，其余直接失败
+THROTTLED = 'throttled'
+TRANSIENT = 'transient'
+FATAL = 'fatal'
+
+
+class PageFetchError(Exception):
+    """
+    翻页请求失败，kind 为失败类型
+    """
+
+    def __init__(self, message: str, kind: str = TRANSIENT):
+        super().__init__(message)
+        self.kind = kind
+
+
+def check_response(status: int, body: bytes):
+    """
+    检查接口的HTTP状态和响应体，失败时抛出 PageFetchError
+    :param status: HTTP状态码
+    :param body: 响应体
+    """
+    if status in (403, 429):
+        raise PageFetchError(f'接口返回{status}', THROTTLED)
+    if status >= 500:
+        raise PageFetchError(f'接口返回{status}', TRANSIENT)
+    if status >= 400:
+        raise PageFetchError(f'接口返回{status}', FATAL)
+    # 被限流时接口经常返回200和空的响应体
+    if not body:
+        raise PageFetchError('接口返回空内容', THROTTLED)
+
+
+def check_page(user_info):
+    """
+    检查解析后的分页数据，缺少字段或还有下一页却返回空列表时抛出 PageFetchError；
+    最后一页的 aweme_list 可能是 null，统一改为空列表
+    :param user_info: decode_page 的返回值
+    """
+    if not isinstance(user_info, dict) or 'has_more' not in user_info:
+        raise PageFetchError('分页数据格式不正确', TRANSIENT)
+    user_info['aweme_list'] = user_info.get('aweme_list') or []
+    if not user_info.get('aweme_list') and int(user_info['has_more']) != 0:
+        raise PageFetchError('还有下一页却返回空列表', THROTTLED)
+
+
+def classify_error(error: Exception):
+    """
+    :param error: 翻页时抛出的异常
+    :return: THROTTLED/TRANSIENT/FATAL
+    """
+    if isinstance(error, PageFetchError):
+        return error.kind
+    # 网络错误、超时和截断的响应体都可以重试
+    if isinstance(error, (requests.RequestException, ConnectionError, TimeoutError, ValueError)):
+        return TRANSIENT
+    try:
+        import aiohttp
+    except ImportError:
+        return FATAL
+    if isinstance(error, aiohttp.ClientError):
+        return TRANSIENT
+    return FATAL
+
+
+def backoff_delay(attempt: int, base: float = PAGE_RETRY_BACKOFF, cap: float = PAGE_RETRY_MAX_BACKOFF):
+    """
+    指数退避 + 随机抖动，避免多个线程同时重试
+    :param attempt: 第几次重试，从0开始
+    :param base: 基础等待秒数
+    :param cap: 最长等待秒数
+    :return: 等待秒数，在 0 ~ min(cap, base * 2^attempt) 之间随机
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,154 @@
+import hashlib
+import threading
+import time
+
+import logging
+
+from config import LOGIN_COOKIE, LOGIN_COOKIES, SESSION_COOLDOWN, SESSION_MAX_COOLDOWN, SESSION_MAX_FAILURES
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['CrawlSession', 'SessionPool', 'get_session_pool', 'DEFAULT_USER_AGENT']
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36'
+
+
+class CrawlSession(object):
+    """
+    一个抓取身份(Cookie + User-Agent)及其健康状况
+    """
+    __slots__ = ('cookie', 'user_agent', 'name', 'in_use', 'successes', 'failures', 'consecutive_failures',
+                 'cooldown_until', 'retired')
+
+    def __init__(self, cookie: str, user_agent: str = DEFAULT_USER_AGENT):
+        self.cookie = cookie
+        self.user_agent = user_agent
+        self.name = hashlib.md5((cookie or '').encode('utf-8')).hexdigest()[:8]
+        self.in_use = 0  # 当前分配给了几个抓取线程
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.retired = False
+
+    def cooldown_remaining(self):
+        return max(0.0, self.cooldown_until - time.monotonic())
+
+    def available(self):
+        return not self.retired and self.cooldown_remaining() == 0
+
+    def __repr__(self):
+        return f'<CrawlSession {self.name}>'
+
+
+class SessionPool(object):
+    """
+    多个Cookie组成的会话池：抓取线程从池中领取负载最低的可用身份，
+    身份被限流时进入冷却(连续失败时冷却时间翻倍)，连续失败过多则停用，
+    每个身份在限速器中有独立的令牌桶，总吞吐随身份数增长
+    """
+
+    def __init__(self, identities: list, cooldown: float = SESSION_COOLDOWN, max_cooldown: float = SESSION_MAX_COOLDOWN,
+                 max_failures: int = SESSION_MAX_FAILURES):
+        """
+        :param identities: Cookie字符串或 (Cookie, User-Agent) 的列表
+        :param cooldown: 被限流后的冷却时间(秒)
+        :param max_cooldown: 冷却时间上限(秒)
+        :param max_failures: 连续失败多少次后停用该身份(至少保留一个)，0表示不停用
+        """
+        self.sessions = []
+        seen = set()
+        for identity in identities:
+            cookie, user_agent = (identity, DEFAULT_USER_AGENT) if isinstance(identity, str) else identity
+            if not cookie or cookie in seen:
+                continue
+            seen.add(cookie)
+            self.sessions.append(CrawlSession(cookie, user_agent))
+        if not self.sessions:
+            raise ValueError('会话池至少需要一个Cookie')
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_failures = max_failures
+        self.lock = threading.Lock()
+
+    def acquire(self, exclude: CrawlSession = None):
+        """
+        领取一个身份，优先选择可用且负载最低的；全部在冷却时返回最先结束冷却的，由调用方等待
+        :param exclude: 尽量不选这个身份，用于刚被限流后换一个
+        :return: CrawlSession，用 cooldown_remaining() 获取需要等待的秒数
+        """
+        with self.lock:
+            candidates = [session for session in self.sessions if not session.retired]
+            if not candidates:
+                raise RuntimeError('会话池中所有Cookie都已停用')
+            available = [session for session in candidates if session.available() and session is not exclude] \
+                or [session for session in candidates if session.available()]
+            if available:
+                session = min(available, key=lambda item: item.in_use)
+            else:
+                session = min(candidates, key=lambda item: item.cooldown_until)
+            session.in_use += 1
+            return session
+
+    def release(self, session: CrawlSession):
+        with self.lock:
+            session.in_use = max(0, session.in_use - 1)
+
+    def report(self, session: CrawlSession, healthy: bool):
+        """
+        记录一次请求的结果
+        :param session: 发出请求的身份
+        :param healthy: 为False表示出错或被限流
+        """
+        with self.lock:
+            if healthy:
+                session.successes += 1
+                session.consecutive_failures = 0
+                return
+            session.failures += 1
+            # 冷却开始前已经发出的请求陆续失败，不重复计入
+            if session.cooldown_remaining():
+                return
+            session.consecutive_failures += 1
+            # 最后一个未停用的Cookie只冷却不停用，避免所有抓取直接失败
+            alive = sum(1 for item in self.sessions if not item.retired)
+            if self.max_failures and session.consecutive_failures >= self.max_failures and alive > 1:
+                session.retired = True
+                logger.warning(f"Cookie {session.name} 连续失败{session.consecutive_failures}次, 已停用")
+                return
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** (session.consecutive_failures - 1))
+            session.cooldown_until = time.monotonic() + cooldown
+            logger.info(f"Cookie {session.name} 出错或被限流, 冷却{cooldown:.0f}秒")
+
+    def stats(self):
+        """
+        :return: 每个身份的使用和健康情况
+        """
+        with self.lock:
+            return {
+                session.name: {
+                    'in_use': session.in_use,
+                    'successes': session.successes,
+                    'failures': session.failures,
+                    'cooldown': round(session.cooldown_remaining(), 1),
+                    'retired': session.retired,
+                }
+                for session in self.sessions
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_session_pool():
+    """
+    获取进程内共享的会话池，由 LOGIN_COOKIE 和 LOGIN_COOKIES 组成
+    :return:
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SessionPool([LOGIN_COOKIE] + list(LOGIN_COOKIES))
+    return _pool
@@ -0,0 +1,262 @@
+import json
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+
+import logging
+
+from config import XBOGUS_BACKEND, XBOGUS_POOL_SIZE
+from tools import xbogus
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['XBogusSigner', 'get_signer']
+
+# X-Bogus.js 与本模块位于同一目录，不再依赖进程的工作目录
+XBOGUS_JS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'X-Bogus.js')
+
+BACKENDS = ('node', 'execjs', 'native')
+
+# 常驻Node进程执行的脚本：每行读入一个JSON请求，每行输出一个JSON结果
+_NODE_SERVER_SCRIPT = r"""
+const { sign } = require(process.argv[1]);
+const readline = require('readline');
+const rl = readline.createInterface({ input: process.stdin, terminal: false });
+rl.on('line', (line) => {
+    let out;
+    try {
+        const req = JSON.parse(line);
+        out = { ok: true, result: req.queries.map((q) => sign(q, req.ua)) };
+    } catch (e) {
+        out = { ok: false, error: String(e) };
+    }
+    process.stdout.write(JSON.stringify(out) + '\n');
+});
+"""
+
+
+class NodeRuntime(object):
+    """
+    常驻的Node进程，X-Bogus.js只在启动时加载编译一次
+    """
+
+    def __init__(self, js_path: str = XBOGUS_JS_PATH, node_bin: str = 'node'):
+        self.js_path = js_path
+        self.node_bin = node_bin
+        self.process = None
+        self.lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            [self.node_bin, '-e', _NODE_SERVER_SCRIPT, self.js_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding='utf-8',
+            bufsize=1,
+        )
+
+    def _request(self, queries: list, user_agent: str):
+        self.process.stdin.write(json.dumps({'queries': queries, 'ua': user_agent}) + '\n')
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError('Node签名进程已退出')
+        return json.loads(line)
+
+    def sign_batch(self, queries: list, user_agent: str):
+        """
+        :param queries: url的query字符串列表
+        :param user_agent: 请求使用的User-Agent
+        :return: 与queries一一对应的X-Bogus列表
+        """
+        with self.lock:
+            try:
+                res = self._request(queries, user_agent)
+            except (OSError, ValueError, RuntimeError) as e:
+                # 进程异常退出时重启一次后重试
+                logger.warning(f"Node签名进程异常, 正在重启: {e}")
+                self.close()
+                self._start()
+                res = self._request(queries, user_agent)
+        if not res.get('ok'):
+            raise RuntimeError(f"X-Bogus签名失败: {res.get('error')}")
+        return res['result']
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.terminate()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+        self.process = None
+
+
+class ExecJSRuntime(object):
+    """
+    找不到node可执行文件时的兜底方案：通过PyExecJS编译一次后复用上下文
+    """
+
+    def __init__(self, js_path: str = XBOGUS_JS_PATH):
+        import execjs
+        with open(js_path, encoding='utf-8') as f:
+            self.ctx = execjs.compile(f.read())
+        self.lock = threading.Lock()
+
+    def sign_batch(self, queries: list, user_agent: str):
+        with self.lock:
+            return [self.ctx.call('sign', query, user_agent) for query in queries]
+
+    def close(self):
+        self.ctx = None
+
+
+class NativeRuntime(object):
+    """
+    纯Python实现的签名，不依赖Node，无状态可直接被多线程共享
+    """
+
+    def sign_batch(self, queries: list, user_agent: str):
+        timestamp = int(time.time())
+        return [xbogus.sign(query, user_agent, timestamp) for query in queries]
+
+    def close(self):
+        pass
+
+
+class XBogusSigner(object):
+    """
+    进程级的X-Bogus签名服务，内部维护一组预热好的JS运行时，可被多个线程同时使用
+    """
+
+    def __init__(self, pool_size: int = XBOGUS_POOL_SIZE, js_path: str = XBOGUS_JS_PATH,
+                 latency_window: int = 1000, backend: str = XBOGUS_BACKEND):
+        """
+        :param pool_size: 运行时数量
+        :param js_path: X-Bogus.js 路径
+        :param latency_window: 保留最近多少次调用的耗时用于统计
+        :param backend: 签名方式 node/execjs/native
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"不支持的签名方式: {backend}, 可选: {BACKENDS}")
+        node_bin = shutil.which('node')
+        if backend == 'node' and not node_bin:
+            logger.warning("未找到node可执行文件, 改用execjs签名")
+            backend = 'execjs'
+        self.backend = backend
+        # 纯Python实现无需多个副本
+        self.pool_size = 1 if backend == 'native' else max(1, pool_size)
+        self.js_path = js_path
+        self.pool = queue.Queue()
+        self.runtimes = []
+        for _ in range(self.pool_size):
+            if backend == 'native':
+                runtime = NativeRuntime()
+            elif backend == 'node':
+                runtime = NodeRuntime(js_path, node_bin)
+            else:
+                runtime = ExecJSRuntime(js_path)
+            self.runtimes.append(runtime)
+            self.pool.put(runtime)
+        self.stats_lock = threading.Lock()
+        self.latencies = deque(maxlen=latency_window)
+        self.call_count = 0
+        self.sign_count = 0
+        self.last_latency = 0.0
+
+    def _record(self, latency: float, count: int):
+        with self.stats_lock:
+            self.latencies.append(latency)
+            self.call_count += 1
+            self.sign_count += count
+            self.last_latency = latency
+        logger.debug(f"X-Bogus签名{count}条, 耗时{latency * 1000:.2f}ms")
+
+    def sign_batch(self, queries: list, user_agent: str):
+        """
+        批量签名
+        :param queries: url的query字符串列表
+        :param user_agent: 请求使用的User-Agent
+        :return: X-Bogus列表
+        """
+        if not queries:
+            return []
+        if self.backend == 'native':
+            start = time.perf_counter()
+            try:
+                return self.runtimes[0].sign_batch(list(queries), user_agent)
+            finally:
+                self._record(time.perf_counter() - start, len(queries))
+        runtime = self.pool.get()
+        start = time.perf_counter()
+        try:
+            return runtime.sign_batch(list(queries), user_agent)
+        finally:
+            self.pool.put(runtime)
+            self._record(time.perf_counter() - start, len(queries))
+
+    def sign(self, query: str, user_agent: str):
+        """
+        单条签名
+        :param query: url的query字符串
+        :param user_agent: 请求使用的User-Agent
+        :return: X-Bogus
+        """
+        return self.sign_batch([query], user_agent)[0]
+
+    def stats(self):
+        """
+        获取签名耗时统计(毫秒)
+        :return:
+        """
+        with self.stats_lock:
+            samples = sorted(self.latencies)
+            call_count = self.call_count
+            sign_count = self.sign_count
+            last_latency = self.last_latency
+        result = {
+            'backend': self.backend,
+            'pool_size': self.pool_size,
+            'calls': call_count,
+            'signed': sign_count,
+            'last_ms': last_latency * 1000,
+            'avg_ms': 0.0,
+            'p50_ms': 0.0,
+            'p99_ms': 0.0,
+        }
+        if samples:
+            result['avg_ms'] = sum(samples) / len(samples) * 1000
+            result['p50_ms'] = samples[int(len(samples) * 0.5)] * 1000
+            result['p99_ms'] = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+        return result
+
+    def close(self):
+        for runtime in self.runtimes:
+            runtime.close()
+
+
+_signer = None
+_signer_lock = threading.Lock()
+
+
+def get_signer(pool_size: int = XBOGUS_POOL_SIZE, backend: str = XBOGUS_BACKEND):
+    """
+    获取进程内共享的签名服务，首次调用时创建
+    :param pool_size: 运行时数量，仅在首次创建时生效
+    :param backend: 签名方式，仅在首次创建时生效
+    :return:
+    """
+    global _signer
+    if _signer is None:
+        with _signer_lock:
+            if _signer is None:
+                _signer = XBogusSigner(pool_size, backend=backend)
+    return _signer
@@ -1,9 +1,10 @@
 import random
-import execjs
 import time
 import urllib.parse
 import datetime
 
+from tools.signer import get_signer
+
 
 def sleep_random(sleep_time: int = None):
     """
@@ -37,5 +38,29 @@ def generate_url_with_xbs(url, user_agent):
     :return:
     """
     query = urllib.parse.urlparse(url).query
-    x_bogus = execjs.compile(open('tools/X-Bogus.js').read()).call('sign', query, user_agent)
+    x_bogus = get_signer().sign(query, user_agent)
     return x_bogus
+
+
+def to_timestamp(value, end_of_day: bool = False):
+    """
+    把日期转换成与 create_time 一致的秒级时间戳
+    :param value: None / 时间戳 / datetime / 'YYYY-MM-DD' / 'YYYY-MM-DD HH:MM:SS'
+    :param end_of_day: 只给了日期时取当天的最后一秒，用于时间范围的结束日期
+    :return: 时间戳，value为空时返回None
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime.datetime):
+        return int(value.timestamp())
+    if isinstance(value, datetime.date):
+        value = value.strftime('%Y-%m-%d')
+    try:
+        return int(datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S').timestamp())
+    except ValueError:
+        date = datetime.datetime.strptime(value, '%Y-%m-%d')
+    if end_of_day:
+        date += datetime.timedelta(days=1, seconds=-1)
+    return int(date.timestamp())
@@ -0,0 +1,293 @@
+import cv2
+import numpy as np
+
+from config import COMPARE_BLOCK_SIZE
+from tools.frame_sampler import SAMPLE_SIZE, sample_step
+
+__all__ = ['VideoFingerprint', 'frame_histogram', 'get_frame_count', 'sample_indices', 'needed_indices',
+           'extract_fingerprint', 'compare_fingerprints', 'iter_compare_blocks', 'stack_rows', 'compare_block',
+           'find_similar_pairs']
+
+HIST_BINS = [8, 8, 8]
+HIST_RANGES = [0, 256, 0, 256, 0, 256]
+FRAME_SIMILAR_SCORE = 0.8  # 两帧直方图相关系数大于该值认为帧相似
+# float32矩阵乘法的结果离阈值这么近时，用float64重新计算，保证与逐对比较的结果一致
+_REFINE_MARGIN = 1e-4
+
+
+class VideoFingerprint(object):
+    """
+    视频的直方图序列：帧序号 -> 归一化后展平的 8x8x8 颜色直方图
+    """
+    __slots__ = ('path', 'frame_count', 'hists')
+
+    def __init__(self, path: str, frame_count: int, hists: dict = None):
+        self.path = path
+        self.frame_count = frame_count
+        self.hists = hists if hists is not None else {}
+
+    def missing(self, indices):
+        return sorted(index for index in indices if index not in self.hists)
+
+
+def frame_histogram(frame):
+    """
+    与 tool.compare_video 相同的帧特征：8x8x8 的BGR直方图，按最小最大值归一化到0~1
+    :param frame: 已缩放的图像
+    :return: 长度为512的float32数组
+    """
+    hist = cv2.calcHist([frame], [0, 1, 2], None, HIST_BINS, HIST_RANGES)
+    cv2.normalize(hist, hist, 0, 1.0, cv2.NORM_MINMAX)
+    return hist.reshape(-1)
+
+
+def get_frame_count(path: str):
+    """
+    :return: 视频帧数，无法打开时返回None
+    """
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return None
+        return int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+
+def sample_indices(frame_count1: int, frame_count2: int):
+    """
+    compare_video 比较两个视频时的采样帧序号：按较短的视频计算采样间隔
+    """
+    sample_count = min(frame_count1, frame_count2)
+    return range(0, sample_count, sample_step(sample_count))
+
+
+def needed_indices(frame_count: int, other_counts):
+    """
+    与其他视频逐一比较时，这个视频需要提取直方图的帧序号
+    :param frame_count: 本视频帧数
+    :param other_counts: 其他视频的帧数
+    :return: 帧序号集合
+    """
+    # 比自己长的视频都按自己的帧数采样；比自己短的按对方帧数采样，同一采样间隔只需要最长的那个
+    indices = set()
+    longest_by_step = {}
+    for other in other_counts:
+        if other is None:
+            continue
+        count = min(frame_count, other)
+        step = sample_step(count)
+        longest_by_step[step] = max(longest_by_step.get(step, 0), count)
+    for step, count in longest_by_step.items():
+        indices.update(range(0, count, step))
+    return indices
+
+
+def extract_fingerprint(path: str, indices=None, fingerprint: VideoFingerprint = None, frame_count: int = None):
+    """
+    顺序解码一遍视频，提取指定帧的直方图；传入已有的指纹时只提取缺少的帧
+    :param path: 视频文件路径
+    :param indices: 需要的帧序号，默认为与等长视频比较时的采样帧
+    :param fingerprint: 已有的指纹
+    :param frame_count: 已知的帧数，不传时从视频读取
+    :return: VideoFingerprint，视频无法打开时帧数为None
+    """
+    if fingerprint is None:
+        fingerprint = VideoFingerprint(path, frame_count)
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            fingerprint.frame_count = None
+            return fingerprint
+        if fingerprint.frame_count is None:
+            fingerprint.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if indices is None:
+            indices = sample_indices(fingerprint.frame_count, fingerprint.frame_count)
+        missing = fingerprint.missing(indices)
+        if not missing:
+            return fingerprint
+        wanted = set(missing)
+        for index in range(missing[-1] + 1):
+            if not cap.grab():
+                break
+            if index not in wanted:
+                continue
+            ret, frame = cap.retrieve()
+            if ret:
+                fingerprint.hists[index] = frame_histogram(cv2.resize(frame, SAMPLE_SIZE))
+    finally:
+        cap.release()
+    return fingerprint
+
+
+def _correlations(hists1, hists2):
+    # 与 cv2.compareHist(HISTCMP_CORREL) 相同的公式，按行计算
+    a = hists1.astype(np.float64)
+    b = hists2.astype(np.float64)
+    a -= a.mean(axis=1, keepdims=True)
+    b -= b.mean(axis=1, keepdims=True)
+    numerator = (a * b).sum(axis=1)
+    product = (a * a).sum(axis=1) * (b * b).sum(axis=1)
+    scores = np.ones(len(a))
+    valid = np.abs(product) > np.finfo(np.float64).eps
+    scores[valid] = numerator[valid] / np.sqrt(product[valid])
+    return scores
+
+
+def compare_fingerprints(fingerprint1: VideoFingerprint, fingerprint2: VideoFingerprint, similarity_threshold=95):
+    """
+    用指纹比较两个视频，结果与 tool.compare_video 一致
+    :return: (是否相似, 相似度百分比)
+    """
+    if fingerprint1.frame_count is None or fingerprint2.frame_count is None:
+        return False, 0.0
+    hists1, hists2 = fingerprint1.hists, fingerprint2.hists
+    # 读取失败的帧不参与比较
+    indices = [index for index in sample_indices(fingerprint1.frame_count, fingerprint2.frame_count)
+               if index in hists1 and index in hists2]
+    if not indices:
+        return False, 0.0
+    scores = _correlations(np.stack([hists1[index] for index in indices]),
+                           np.stack([hists2[index] for index in indices]))
+    similarity_percentage = np.count_nonzero(scores > FRAME_SIMILAR_SCORE) / len(indices) * 100
+    return similarity_percentage >= similarity_threshold, similarity_percentage
+
+
+def _stack(fingerprints, members, step, length):
+    """
+    把一组视频在 0, step, 2*step... 处的直方图中心化、单位化后叠成 (帧, 视频, 512) 的数组，
+    两个单位向量的点积就是相关系数
+    :return: (数组, 该帧是否存在的掩码(帧, 视频), 方差为0的掩码(帧, 视频))
+    """
+    stacked = np.zeros((length, len(members), HIST_BINS[0] * HIST_BINS[1] * HIST_BINS[2]), dtype=np.float32)
+    present = np.zeros((length, len(members)), dtype=bool)
+    for column, member in enumerate(members):
+        hists = fingerprints[member].hists
+        for row in range(length):
+            hist = hists.get(row * step)
+            if hist is not None:
+                stacked[row, column] = hist
+                present[row, column] = True
+    stacked -= stacked.mean(axis=2, keepdims=True)
+    norms = np.sqrt((stacked.astype(np.float64) ** 2).sum(axis=2))
+    # 所有bin都相等的直方图与任何直方图的相关系数按OpenCV的规则为1
+    flat = present & (norms ** 2 <= np.sqrt(np.finfo(np.float64).eps))
+    stacked /= np.where(norms > 0, norms, 1)[..., None].astype(np.float32)
+    return stacked, present, flat
+
+
+def iter_compare_blocks(fingerprints, block_size: int = COMPARE_BLOCK_SIZE, new=None):
+    """
+    按采样间隔分组、按block_size分块，列出比较所有视频对需要计算的块：
+    每对视频按较短的视频采样，由较短的一个(帧数相同时下标较小的一个)作为行，同一采样间隔的行视频分为一组
+    :param fingerprints: VideoFingerprint列表
+    :param block_size: 每块的视频数
+    :param new: 新视频的下标，不为None时只比较至少有一个是新视频的视频对：
+                新视频作为行时与所有更长的视频比较，旧视频作为行时只与更长的新视频比较
+    :return: 生成器，产出 (采样间隔, 采样帧数, 行视频下标, 行视频排名, 列视频下标, 列视频排名)，
+             同一行块的各列块连续产出，行排名小于列排名的组合才是需要比较的视频对
+    """
+    counts = np.array([-1 if fingerprint.frame_count is None else fingerprint.frame_count
+                       for fingerprint in fingerprints])
+    valid = np.flatnonzero(counts >= 0)
+    order = valid[np.lexsort((valid, counts[valid]))]
+    rank = np.empty(len(fingerprints), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    steps = np.array([sample_step(int(count)) for count in counts[order]])
+    is_new = None
+    if new is not None:
+        is_new = np.zeros(len(fingerprints), dtype=bool)
+        is_new[list(new)] = True
+
+    for step in np.unique(steps):
+        rows = order[steps == step]
+        if is_new is None:
+            groups = [(rows, order)]
+        else:
+            groups = [(rows[is_new[rows]], order), (rows[~is_new[rows]], order[is_new[order]])]
+        for group_rows, columns in groups:
+            if not len(group_rows):
+                continue
+            length = -(-int(counts[group_rows].max()) // int(step))
+            for row_start in range(0, len(group_rows), block_size):
+                row_block = group_rows[row_start:row_start + block_size]
+                row_rank = rank[row_block]
+                # 比行更长的视频都可能与行配对
+                first_column = int(np.searchsorted(rank[columns], row_rank[0] + 1))
+                for column_start in range(first_column, len(columns), block_size):
+                    column_block = columns[column_start:column_start + block_size]
+                    column_rank = rank[column_block]
+                    if not (row_rank[:, None] < column_rank[None, :]).any():
+                        continue
+                    yield int(step), length, row_block, row_rank, column_block, column_rank
+
+
+def stack_rows(fingerprints, row_block, step: int, length: int):
+    """
+    行视频的数据，同一行块的各列块可以共用
+    """
+    row_stack, row_present, row_flat = _stack(fingerprints, row_block, step, length)
+    # 只在行视频自己的帧数范围内采样
+    counts = np.array([fingerprints[row].frame_count for row in row_block])
+    row_present &= np.arange(length)[:, None] * step < counts[None, :]
+    return row_stack, row_present, row_flat
+
+
+def compare_block(fingerprints, step: int, length: int, row_block, row_rank, column_block, column_rank,
+                  similarity_threshold=95, rows=None):
+    """
+    用矩阵乘法一次算出块内所有视频对在每个采样帧上的相关系数，
+    占用的内存约为 采样帧数 x 行数 x (列数 + 1024) x 4 字节
+    :param fingerprints: 按下标取VideoFingerprint的列表或字典，只需要包含行和列的视频
+    :param rows: 已计算的 stack_rows 结果，为None时计算
+    :return: [(i, j, 相似度百分比)]，i < j
+    """
+    row_stack, row_present, row_flat = rows or stack_rows(fingerprints, row_block, step, length)
+    pair_mask = row_rank[:, None] < column_rank[None, :]
+    column_stack, column_present, column_flat = _stack(fingerprints, column_block, step, length)
+    # (帧, 行, 列) 的相关系数
+    scores = np.matmul(row_stack, column_stack.transpose(0, 2, 1))
+    both = row_present[:, :, None] & column_present[:, None, :]
+    scores[(row_flat[:, :, None] | column_flat[:, None, :]) & both] = 1.0
+    similar = both & (scores > FRAME_SIMILAR_SCORE)
+    _refine(fingerprints, row_block, column_block, step, scores, both, similar)
+    compared = both.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentage = np.where(compared > 0, similar.sum(axis=0) / np.maximum(compared, 1) * 100, 0.0)
+    hit = pair_mask & (compared > 0) & (percentage >= similarity_threshold)
+    results = []
+    for row, column in zip(*np.nonzero(hit)):
+        i, j = int(row_block[row]), int(column_block[column])
+        results.append((min(i, j), max(i, j), float(percentage[row, column])))
+    return results
+
+
+def find_similar_pairs(fingerprints: list, similarity_threshold=95, block_size: int = COMPARE_BLOCK_SIZE, new=None):
+    """
+    向量化比较所有视频对，结果与逐对调用 compare_fingerprints 相同，分块方式见 iter_compare_blocks
+    :param fingerprints: VideoFingerprint列表
+    :param similarity_threshold: 相似度阈值(百分比)
+    :param block_size: 每块的视频数
+    :param new: 新视频的下标，不为None时只比较至少有一个是新视频的视频对
+    :return: [(i, j, 相似度百分比)]，i < j 为fingerprints中的下标，按 (i, j) 排序
+    """
+    results = []
+    row_key = rows = None
+    blocks = iter_compare_blocks(fingerprints, block_size, new)
+    for step, length, row_block, row_rank, column_block, column_rank in blocks:
+        if row_block is not row_key:
+            row_key, rows = row_block, stack_rows(fingerprints, row_block, step, length)
+        results.extend(compare_block(fingerprints, step, length, row_block, row_rank, column_block, column_rank,
+                                     similarity_threshold, rows))
+    results.sort()
+    return results
+
+
+def _refine(fingerprints, row_block, column_block, step, scores, both, similar):
+    # 离阈值很近的相关系数用float64按OpenCV的公式重新计算
+    near = both & (np.abs(scores - FRAME_SIMILAR_SCORE) < _REFINE_MARGIN)
+    for frame, row, column in zip(*np.nonzero(near)):
+        index = int(frame) * int(step)
+        score = _correlations(fingerprints[row_block[row]].hists[index][None, :],
+                              fingerprints[column_block[column]].hists[index][None, :])[0]
+        similar[frame, row, column] = score > FRAME_SIMILAR_SCORE
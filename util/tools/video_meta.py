@@ -0,0 +1,62 @@
+__all__ = ['VideoMeta']
+
+
+class VideoMeta(object):
+    """
+    精简的视频元数据，只保留 get_video_detail_info 用到的字段，
+    原始的aweme数据每条有几十KB，不再常驻内存
+    """
+    __slots__ = ('aweme_id', 'nickname', 'desc', 'preview_title', 'create_time', 'is_video',
+                 'links', 'cover_url', 'admire_count', 'comment_count')
+
+    def __init__(self, aweme_id, nickname='', desc='', preview_title=None, create_time=0, is_video=True,
+                 links=(), cover_url=None, admire_count=0, comment_count=0):
+        self.aweme_id = aweme_id
+        self.nickname = nickname
+        self.desc = desc
+        self.preview_title = preview_title
+        self.create_time = create_time
+        self.is_video = is_video
+        self.links = tuple(links)  # 视频为播放地址，图文为每张图片的地址
+        self.cover_url = cover_url
+        self.admire_count = admire_count
+        self.comment_count = comment_count
+
+    @classmethod
+    def from_aweme(cls, aweme_info: dict):
+        """
+        从接口返回的aweme数据中提取需要的字段
+        :param aweme_info: aweme/post 接口返回的单条视频数据
+        :return:
+        """
+        images = aweme_info.get('images')
+        if images is None:
+            video = aweme_info.get('video') or {}
+            links = video['play_addr']['url_list'][:1]
+            cover_url = video['cover']['url_list'][0]
+        else:
+            links = [image['url_list'][-1] for image in images]
+            cover_url = None
+        statistics = aweme_info.get('statistics') or {}
+        return cls(
+            aweme_id=aweme_info['aweme_id'],
+            nickname=(aweme_info.get('author') or {}).get('nickname', ''),
+            desc=aweme_info.get('desc', ''),
+            preview_title=aweme_info.get('preview_title'),
+            create_time=aweme_info.get('create_time', 0),
+            is_video=images is None,
+            links=links,
+            cover_url=cover_url,
+            admire_count=statistics.get('admire_count', 0),
+            comment_count=statistics.get('comment_count', 0),
+        )
+
+    def to_dict(self):
+        result = {}
+        for name in self.__slots__:
+            result[name] = getattr(self, name)
+        result['links'] = list(self.links)
+        return result
+
+    def __repr__(self):
+        return f'<VideoMeta {self.aweme_id}>'
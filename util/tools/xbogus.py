@@ -0,0 +1,77 @@
+import base64
+import hashlib
+import time
+
+__all__ = ['sign']
+
+# X-Bogus 使用的自定义base64字母表
+_ALPHABET = b"Dkdpgh4ZKsQB80/Mfvw36XI1R25-WUAlEi7NLboqYTOPuzmFjJnryx9HVGcaStCe="
+_STD_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+_TRANSLATION = bytes.maketrans(_STD_ALPHABET, _ALPHABET)
+
+# 在Node中执行 X-Bogus.js 时没有浏览器环境，环境标记位与canvas指纹都为0
+_ENV_FLAGS = (0, 0)
+_CANVAS = 0
+_UA_KEY = bytes((0,) + _ENV_FLAGS)  # 对User-Agent做RC4时使用的密钥
+
+# GET请求没有body，对应 md5(md5(''))
+_EMPTY_BODY_HASH = hashlib.md5(hashlib.md5(b'').digest()).digest()
+
+_ua_cache = {}
+
+
+def _rc4(key: bytes, data: bytes):
+    s = list(range(256))
+    j = 0
+    key_len = len(key)
+    for i in range(256):
+        j = (j + s[i] + key[i % key_len]) & 0xff
+        s[i], s[j] = s[j], s[i]
+    out = bytearray(len(data))
+    i = j = 0
+    for k, byte in enumerate(data):
+        i = (i + 1) & 0xff
+        j = (j + s[i]) & 0xff
+        s[i], s[j] = s[j], s[i]
+        out[k] = byte ^ s[(s[i] + s[j]) & 0xff]
+    return bytes(out)
+
+
+def _ua_hash(user_agent: str):
+    """
+    User-Agent 的摘要只与UA有关，同一个UA只计算一次
+    """
+    digest = _ua_cache.get(user_agent)
+    if digest is None:
+        encrypted = _rc4(_UA_KEY, user_agent.encode('latin-1'))
+        digest = hashlib.md5(base64.b64encode(encrypted)).digest()
+        _ua_cache[user_agent] = digest
+    return digest
+
+
+def sign(query: str, user_agent: str, timestamp: int = None):
+    """
+    纯Python实现的X-Bogus签名，结果与 X-Bogus.js 的 sign(query, user_agent) 一致
+    :param query: url的query字符串
+    :param user_agent: 请求使用的User-Agent
+    :param timestamp: 秒级时间戳，默认为当前时间
+    :return: X-Bogus
+    """
+    if timestamp is None:
+        timestamp = int(time.time())
+    query_hash = hashlib.md5(hashlib.md5(query.encode('utf-8')).digest()).digest()
+    ua_hash = _ua_hash(user_agent)
+    values = [
+        64, 0, _ENV_FLAGS[0], _ENV_FLAGS[1],
+        query_hash[14], query_hash[15],
+        _EMPTY_BODY_HASH[14], _EMPTY_BODY_HASH[15],
+        ua_hash[14], ua_hash[15],
+        (timestamp >> 24) & 0xff, (timestamp >> 16) & 0xff, (timestamp >> 8) & 0xff, timestamp & 0xff,
+        (_CANVAS >> 24) & 0xff, (_CANVAS >> 16) & 0xff, (_CANVAS >> 8) & 0xff, _CANVAS & 0xff,
+    ]
+    checksum = 0
+    for value in values:
+        checksum ^= value
+    values.append(checksum)
+    garbled = b'\x02\xff' + _rc4(b'\xff', bytes(values))
+    return base64.b64encode(garbled).translate(_TRANSLATION).decode('ascii')